@@ -1,3 +1,38 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+
+from courses.models import Category, Course, CourseProgress, Enrollment, Lesson
+
+
+class DashboardTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='testpass123')
+        self.client.force_login(self.user)
+        category = Category.objects.create(name='Programming')
+        for title, lesson_count, completed in [('First Course', 4, 1), ('Second Course', 2, 2)]:
+            course = Course.objects.create(
+                title=title,
+                description='Description',
+                category=category,
+                instructor=self.user,
+                price=Decimal('0.00'),
+                duration='1 hour',
+                is_published=True
+            )
+            lessons = Lesson.objects.bulk_create(
+                Lesson(course=course, title=f'Lesson {i}', duration=5, order=i) for i in range(lesson_count)
+            )
+            for lesson in lessons[:completed]:
+                CourseProgress.objects.create(student=self.user, lesson=lesson, completed=True)
+            Enrollment.objects.create(student=self.user, course=course)
 
-# Create your tests here.
+    def test_dashboard_shows_progress(self):
+        """Test that the dashboard shows per-course and total lesson progress"""
+        response = self.client.get(reverse('accounts:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['completed_lessons_count'], 3)
+        self.assertContains(response, '1/4')
+        self.assertContains(response, '2/2')
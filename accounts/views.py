@@ -3,6 +3,8 @@ from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
+from courses.models import Enrollment
+from courses.progress_buffer import progress_buffer
 from .models import UserProfile
 from .forms import UserProfileForm, UserRegistrationForm
 
@@ -48,8 +50,14 @@ def profile(request):
 @login_required
 def dashboard(request):
     """User dashboard"""
-    # Get user's enrolled courses with optimization
-    enrollments = request.user.enrollments.filter(is_active=True).select_related('course', 'course__category', 'course__instructor').order_by('-enrolled_at')
+    # Get user's enrolled courses; progress counters are stored on them
+    enrollments = list(
+        Enrollment.objects.filter(student=request.user, is_active=True)
+        .select_related('course', 'course__category', 'course__instructor')
+        .order_by('-enrolled_at')
+    )
+    for enrollment in enrollments:
+        progress_buffer.apply_overlay(enrollment)
     
     # Get user's recent payments with optimization
     payments = request.user.payments.all().select_related('course', 'payment_method').order_by('-created_at')[:5]
@@ -59,7 +67,11 @@ def dashboard(request):
     
     context = {
         'enrollments': enrollments,
+        'enrolled_courses': enrollments,
+        'completed_lessons_count': sum(e.completed_lessons for e in enrollments),
         'payments': payments,
+        'recent_payments': payments,
         'reviews': reviews,
+        'reviews_count': request.user.reviews.count(),
     }
     return render(request, 'accounts/dashboard.html', context)
@@ -80,6 +80,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'courses.context_processors.global_discount',
                 'courses.context_processors.site_settings',
+                'courses.context_processors.pricing',
             ],
         },
     },
@@ -113,6 +114,15 @@ CACHES = {
     }
 }
 
+# Share the cache between gunicorn workers when Redis is available, so
+# generation bumps from admin edits are seen by every worker immediately
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+        'TIMEOUT': 300,
+    }
+
 # Static files configuration
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
@@ -179,6 +189,13 @@ MAX_UPLOAD_SIZE = 524288000  # 500MB in bytes
 ALLOWED_VIDEO_EXTENSIONS = ['mp4', 'webm', 'avi', 'mov', 'mkv']
 MAX_VIDEO_SIZE = 524288000  # 500MB in bytes
 
+# Lesson progress write-behind buffer (courses.progress_buffer)
+# Events are held in the worker process: a killed worker loses up to this much
+PROGRESS_FLUSH_INTERVAL = 2  # seconds; 0 writes every event immediately
+
+# Payment screenshot recompression and thumbnails (payment_system.screenshots)
+SCREENSHOT_WORKERS = 2  # background threads; 0 processes during the request
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
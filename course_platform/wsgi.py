@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'course_platform.settings')
 
 application = get_wsgi_application()
+
+# Build the per-process autocomplete index before the first request arrives
+from courses.autocomplete import course_index  # noqa: E402
+
+course_index.warm()
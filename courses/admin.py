@@ -3,6 +3,11 @@ from django.utils.html import format_html
 from django import forms
 from django.db import models
 from .models import Category, Course, Lesson, Enrollment, Review, CourseProgress, GlobalDiscount, SiteSettings, Banner
+from .autocomplete import course_index
+from .caching import CATALOG, bump_generation
+from .pricing import invalidate_pricing_caches, refresh_effective_prices
+from .ratings import invalidate_rating_stats
+from . import moderation
 from django.utils import timezone
 
 @admin.register(GlobalDiscount)
@@ -47,10 +52,14 @@ class GlobalDiscountAdmin(admin.ModelAdmin):
     
     def activate_discounts(self, request, queryset):
         queryset.update(is_active=True)
+        refresh_effective_prices()
+        invalidate_pricing_caches()
     activate_discounts.short_description = "Activate selected global discounts"
     
     def deactivate_discounts(self, request, queryset):
         queryset.update(is_active=False)
+        refresh_effective_prices()
+        invalidate_pricing_caches()
     deactivate_discounts.short_description = "Deactivate selected global discounts"
 
 @admin.register(Category)
@@ -73,7 +82,7 @@ class CourseAdmin(admin.ModelAdmin):
         if search_term:
             queryset |= self.model.objects.filter(title__icontains=search_term)
         return queryset, use_distinct
-    readonly_fields = ['students_enrolled', 'rating', 'total_ratings', 'created_at', 'updated_at', 'published_at', 'video_player', 'discount_status']
+    readonly_fields = ['students_enrolled', 'rating', 'total_ratings', 'effective_price', 'effective_discount_percentage', 'created_at', 'updated_at', 'published_at', 'video_player', 'discount_status']
     fieldsets = (
         ('Basic Information', {
             'fields': ('title', 'slug', 'description', 'short_description', 'category', 'instructor')
@@ -82,7 +91,7 @@ class CourseAdmin(admin.ModelAdmin):
             'fields': ('price', 'duration', 'difficulty', 'language')
         }),
         ('Discount Settings', {
-            'fields': ('discount_price', 'discount_start_date', 'discount_end_date', 'is_discount_active', 'discount_status'),
+            'fields': ('discount_price', 'discount_start_date', 'discount_end_date', 'is_discount_active', 'discount_status', 'effective_price', 'effective_discount_percentage'),
             'description': 'Set up time-limited discounts for this course. The discount will be automatically activated/deactivated based on the date range.'
         }),
         ('Media Content', {
@@ -164,28 +173,37 @@ class CourseAdmin(admin.ModelAdmin):
         return format_html('<p style="color: #999; font-style: italic;">No video uploaded yet.</p>')
     video_player.short_description = 'Video Player'
     
+    def _update_courses(self, queryset, refresh_prices=False, **fields):
+        """Bulk-update courses and expire the caches save() would have"""
+        # Course cards are keyed on updated_at, catalog pages and facets on CATALOG
+        queryset.update(updated_at=timezone.now(), **fields)
+        if refresh_prices:
+            refresh_effective_prices(queryset)
+        bump_generation(CATALOG)
+        course_index.update_courses(queryset)
+    
     def publish_courses(self, request, queryset):
-        queryset.update(is_published=True)
+        self._update_courses(queryset, is_published=True)
     publish_courses.short_description = "Publish selected courses"
     
     def unpublish_courses(self, request, queryset):
-        queryset.update(is_published=False)
+        self._update_courses(queryset, is_published=False)
     unpublish_courses.short_description = "Unpublish selected courses"
     
     def feature_courses(self, request, queryset):
-        queryset.update(is_featured=True)
+        self._update_courses(queryset, is_featured=True)
     feature_courses.short_description = "Feature selected courses"
     
     def unfeature_courses(self, request, queryset):
-        queryset.update(is_featured=False)
+        self._update_courses(queryset, is_featured=False)
     unfeature_courses.short_description = "Unfeature selected courses"
     
     def activate_discounts(self, request, queryset):
-        queryset.update(is_discount_active=True)
+        self._update_courses(queryset, refresh_prices=True, is_discount_active=True)
     activate_discounts.short_description = "Activate discounts for selected courses"
     
     def deactivate_discounts(self, request, queryset):
-        queryset.update(is_discount_active=False)
+        self._update_courses(queryset, refresh_prices=True, is_discount_active=False)
     deactivate_discounts.short_description = "Deactivate discounts for selected courses"
 
 class LessonAdminForm(forms.ModelForm):
@@ -294,10 +312,10 @@ class LessonAdmin(admin.ModelAdmin):
 
 @admin.register(Enrollment)
 class EnrollmentAdmin(admin.ModelAdmin):
-    list_display = ['student', 'course', 'enrolled_at', 'completed_at', 'is_active']
+    list_display = ['student', 'course', 'enrolled_at', 'completed_lessons', 'total_lessons', 'completed_at', 'is_active']
     list_filter = ['is_active', 'enrolled_at', 'completed_at', 'course']
     search_fields = ['student__username', 'student__first_name', 'student__last_name', 'course__title']
-    readonly_fields = ['enrolled_at']
+    readonly_fields = ['enrolled_at', 'completed_lessons', 'total_lessons', 'last_lesson']
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
@@ -326,20 +344,23 @@ class ReviewAdmin(admin.ModelAdmin):
     )
     
     def approve_reviews(self, request, queryset):
-        from django.utils import timezone
-        queryset.update(is_moderated=True, moderated_by=request.user, moderated_at=timezone.now())
+        approved = moderation.approve_reviews(queryset, request.user)
+        self.message_user(request, f"Approved {approved} reviews.")
     approve_reviews.short_description = "Approve selected reviews"
     
     def reject_reviews(self, request, queryset):
-        queryset.delete()
+        rejected = moderation.reject_reviews(queryset)
+        self.message_user(request, f"Rejected {rejected} reviews.")
     reject_reviews.short_description = "Reject selected reviews"
     
     def mark_helpful(self, request, queryset):
         queryset.update(is_helpful=True)
+        invalidate_rating_stats(*set(queryset.values_list('course_id', flat=True)))
     mark_helpful.short_description = "Mark selected reviews as helpful"
     
     def mark_unhelpful(self, request, queryset):
         queryset.update(is_helpful=False)
+        invalidate_rating_stats(*set(queryset.values_list('course_id', flat=True)))
     mark_unhelpful.short_description = "Mark selected reviews as not helpful"
 
 @admin.register(CourseProgress)
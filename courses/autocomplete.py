@@ -0,0 +1,275 @@
+"""In-memory typeahead index of published courses.
+
+Each process keeps the words of every published course title, category and
+instructor name in a sorted vocabulary (for prefix lookups) and a trigram map
+(for typo tolerance), so suggestions are answered without a database query.
+Course, category and instructor saves update the index in place; other
+processes notice the bumped generation counter and rebuild.
+"""
+import re
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter, namedtuple
+from heapq import nlargest
+
+from django.db import DatabaseError
+from django.urls import reverse
+
+from .caching import AUTOCOMPLETE, bump_generation, get_generation
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TOKENS = 6
+MIN_FUZZY_LENGTH = 3
+FUZZY_THRESHOLD = 0.3
+# Above this many matches, walking the popularity order beats sorting the matches
+WALK_THRESHOLD = 500
+# How often a process checks whether another process changed the catalog
+STALE_CHECK_SECONDS = 5
+
+
+class Suggestion(namedtuple('Suggestion', [
+    'id', 'title', 'slug', 'category', 'instructor', 'popularity', 'title_key', 'words',
+])):
+    __slots__ = ()
+
+    @property
+    def url(self):
+        return reverse('courses:course_detail', kwargs={'slug': self.slug})
+
+
+def normalize(text):
+    """Lowercase text and strip accents"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def trigrams(word):
+    padded = f'${word}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def instructor_name(first_name, last_name, username):
+    return f'{first_name} {last_name}'.strip() or username
+
+
+class AutocompleteIndex:
+    """Prefix and trigram index of course suggestions"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """Forget everything; the next lookup rebuilds from the database"""
+        with self._lock:
+            self._entries = {}
+            self._postings = {}
+            self._words = []
+            self._trigrams = {}
+            self._titles = []
+            self._ranked = []
+            self.is_built = False
+            self.generation = None
+            self._checked_at = 0.0
+
+    def build(self):
+        """Load every published course from the database"""
+        from .models import Course
+
+        rows = Course.objects.filter(is_published=True).values_list(
+            'id', 'title', 'slug', 'category__name', 'instructor__first_name',
+            'instructor__last_name', 'instructor__username', 'students_enrolled',
+        )
+        with self._lock:
+            generation = get_generation(AUTOCOMPLETE)
+            self.clear()
+            for pk, title, slug, category, first_name, last_name, username, popularity in rows:
+                instructor = instructor_name(first_name, last_name, username)
+                self._add(Suggestion(pk, title, slug, category, instructor, popularity, None, None), keep_sorted=False)
+            # Sort once instead of inserting in order
+            self._words = sorted(self._postings)
+            self._titles.sort()
+            self._ranked.sort()
+            self.is_built = True
+            self.generation = generation
+            self._checked_at = time.monotonic()
+
+    def warm(self):
+        """Build at process startup, leaving it to the first lookup if the DB is not ready"""
+        try:
+            self.build()
+        except DatabaseError:
+            self.clear()
+
+    def ensure_fresh(self):
+        """Rebuild if never built or another process changed the catalog"""
+        if self.is_built and time.monotonic() - self._checked_at < STALE_CHECK_SECONDS:
+            return
+        if not self.is_built or get_generation(AUTOCOMPLETE) != self.generation:
+            self.build()
+        self._checked_at = time.monotonic()
+
+    def update_course(self, course):
+        """Add, refresh or drop one course after it was saved"""
+        if not self.is_built:
+            return
+        with self._lock:
+            self._remove(course.pk)
+            if course.is_published:
+                instructor = course.instructor
+                self._add(Suggestion(
+                    course.pk, course.title, course.slug, course.category.name,
+                    instructor_name(instructor.first_name, instructor.last_name, instructor.username),
+                    course.students_enrolled, None, None,
+                ))
+            self._bump()
+
+    def update_courses(self, queryset):
+        """Refresh several courses, e.g. after a category was renamed"""
+        if not self.is_built:
+            return
+        with self._lock:
+            for course in queryset.select_related('category', 'instructor'):
+                self.update_course(course)
+
+    def remove_course(self, course_id):
+        """Drop a deleted course"""
+        if not self.is_built:
+            return
+        with self._lock:
+            self._remove(course_id)
+            self._bump()
+
+    def search(self, query, limit=8):
+        """Top ``limit`` suggestions for a partially typed query
+
+        Courses whose title starts with the query come first, then the rest
+        of the matches; both groups are ordered by enrollment.
+        """
+        query_key = ' '.join(WORD_RE.findall(normalize(query)))
+        tokens = query_key.split()[:MAX_TOKENS]
+        if not tokens or limit <= 0:
+            return []
+
+        self.ensure_fresh()
+        with self._lock:
+            candidates = None
+            # Longest tokens first: they are the most selective
+            for token in sorted(tokens, key=len, reverse=True):
+                matches = self._prefix_matches(token) or self._fuzzy_matches(token)
+                candidates = matches if candidates is None else candidates & matches
+                if not candidates:
+                    return []
+
+            top = self._title_matches(query_key, limit)
+            if len(top) < limit:
+                top += self._most_popular(candidates, limit - len(top), exclude=set(top))
+            return [self._entries[pk] for pk in top]
+
+    def _most_popular(self, pks, limit, exclude=()):
+        if len(pks) <= WALK_THRESHOLD:
+            entries = self._entries
+            return nlargest(
+                limit, (pk for pk in pks if pk not in exclude),
+                key=lambda pk: (entries[pk].popularity, -pk),
+            )
+        return self._walk(lambda pk: pk in pks and pk not in exclude, limit)
+
+    def _walk(self, predicate, limit):
+        """First ``limit`` courses in popularity order that satisfy predicate"""
+        top = []
+        for _, pk in self._ranked:
+            if predicate(pk):
+                top.append(pk)
+                if len(top) == limit:
+                    break
+        return top
+
+    def _title_matches(self, query_key, limit):
+        titles = self._titles
+        start = bisect_left(titles, (query_key,))
+        end = bisect_left(titles, (query_key + chr(sys.maxunicode),))
+        if end - start <= WALK_THRESHOLD:
+            return self._most_popular({pk for _, pk in titles[start:end]}, limit)
+
+        entries = self._entries
+        return self._walk(lambda pk: entries[pk].title_key.startswith(query_key), limit)
+
+    def _bump(self):
+        # Keep our own generation in step unless another process bumped in between
+        previous = self.generation
+        self.generation = bump_generation(AUTOCOMPLETE)
+        if previous is None or self.generation != previous + 1:
+            self.is_built = False
+
+    def _add(self, entry, keep_sorted=True):
+        title_words = WORD_RE.findall(normalize(entry.title))
+        words = frozenset(title_words).union(WORD_RE.findall(normalize(f'{entry.category} {entry.instructor}')))
+        entry = self._entries[entry.id] = entry._replace(title_key=' '.join(title_words), words=words)
+
+        add = insort if keep_sorted else list.append
+        add(self._titles, (entry.title_key, entry.id))
+        add(self._ranked, (-entry.popularity, entry.id))
+        for word in words:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = set()
+                if keep_sorted:
+                    insort(self._words, word)
+                # Numbers are only ever typed exactly, so skip typo matching for them
+                if not word.isdigit():
+                    for gram in trigrams(word):
+                        self._trigrams.setdefault(gram, set()).add(word)
+            postings.add(entry.id)
+
+    def _remove(self, pk):
+        entry = self._entries.pop(pk, None)
+        if entry is None:
+            return
+        del self._titles[bisect_left(self._titles, (entry.title_key, pk))]
+        del self._ranked[bisect_left(self._ranked, (-entry.popularity, pk))]
+
+        for word in entry.words:
+            postings = self._postings[word]
+            postings.discard(pk)
+            if postings:
+                continue
+            del self._postings[word]
+            del self._words[bisect_left(self._words, word)]
+            if not word.isdigit():
+                for gram in trigrams(word):
+                    words = self._trigrams[gram]
+                    words.discard(word)
+                    if not words:
+                        del self._trigrams[gram]
+
+    def _prefix_matches(self, token):
+        words = self._words
+        start = bisect_left(words, token)
+        end = bisect_left(words, token + chr(sys.maxunicode))
+        if end - start == 1:
+            # Shared, not copied: callers only read the result
+            return self._postings[words[start]]
+        return set().union(*(self._postings[word] for word in words[start:end]))
+
+    def _fuzzy_matches(self, token):
+        """Courses containing a word that looks like a misspelling of token"""
+        matches = set()
+        if len(token) < MIN_FUZZY_LENGTH:
+            return matches
+
+        grams = trigrams(token)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._trigrams.get(gram, ()))
+        for word, count in shared.items():
+            # Jaccard similarity of the two trigram sets
+            if count / (len(grams) + len(word) - count) >= FUZZY_THRESHOLD:
+                matches |= self._postings[word]
+        return matches
+
+
+course_index = AutocompleteIndex()
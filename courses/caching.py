@@ -0,0 +1,63 @@
+"""Generation-counter cache keys.
+
+Each group of cached data (pricing, site settings, banners, the autocomplete
+index, catalog facets) has a generation number stored in the shared cache.
+Cache keys embed the current generation, so bumping it from a model signal
+makes every worker miss on its next lookup without having to know which
+individual keys exist.
+"""
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+PRICING = 'pricing'
+SITE_SETTINGS = 'site_settings'
+BANNERS = 'banners'
+AUTOCOMPLETE = 'autocomplete'
+CATALOG = 'catalog'
+
+# How long entries that rely on invalidation may live in a per-process cache
+LOCAL_CACHE_TIMEOUT = 300
+
+
+def _generation_key(name):
+    return f'generation:{name}'
+
+
+def get_generation(name):
+    """Get the current generation number for ``name``"""
+    key = _generation_key(name)
+    generation = cache.get(key)
+    if generation is None:
+        # Seed from the clock so a counter lost to eviction never goes backwards
+        cache.add(key, time.time_ns() // 1000, None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(name):
+    """Invalidate every key built from the current generation of ``name``"""
+    key = _generation_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        get_generation(name)
+        return cache.incr(key)
+
+
+def versioned_key(prefix, *names):
+    """Build a cache key that changes whenever any of ``names`` is bumped"""
+    generations = ':'.join(str(get_generation(name)) for name in names)
+    return f'{prefix}:{generations}'
+
+
+def invalidated_timeout(timeout):
+    """Cap ``timeout`` for entries kept fresh by invalidation unless workers share the cache
+
+    With LocMemCache a generation bump or delete only reaches the worker that
+    made it; every other worker serves its copy until the entry expires.
+    """
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+        return min(timeout, LOCAL_CACHE_TIMEOUT)
+    return timeout
@@ -2,10 +2,23 @@ from .models import GlobalDiscount, SiteSettings, Banner
 from django.db.models import Q
 from django.utils import timezone
 from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from .caching import PRICING, SITE_SETTINGS, invalidated_timeout, versioned_key
+from .pricing import get_pricing_context
 
-def global_discount(request):
-    """Add global discount information to all templates"""
-    cache_key = 'global_discount_context'
+# Keys are invalidated by model signals, so entries can live for hours when
+# the cache is shared; see invalidated_timeout()
+CONTEXT_CACHE_TIMEOUT = 60 * 60 * 6
+
+def _memoize_on_request(request, attr, loader):
+    """Run loader at most once per request"""
+    if not hasattr(request, attr):
+        setattr(request, attr, loader())
+    return getattr(request, attr)
+
+def _load_global_discount():
+    """Get the global discount context from cache or the database"""
+    cache_key = versioned_key('global_discount_context', PRICING)
     cached_data = cache.get(cache_key)
     
     if cached_data is not None:
@@ -17,19 +30,21 @@ def global_discount(request):
             show_banner=True
         ).first()
         
+        timeout = invalidated_timeout(CONTEXT_CACHE_TIMEOUT)
         if global_discount and global_discount.is_currently_active():
             result = {
                 'global_discount': global_discount,
                 'global_discount_active': True,
             }
+            # Never serve the banner past the end of the discount
+            timeout = min(timeout, global_discount.get_remaining_time())
         else:
             result = {
                 'global_discount': None,
                 'global_discount_active': False,
             }
         
-        # Cache for 5 minutes
-        cache.set(cache_key, result, 300)
+        cache.set(cache_key, result, timeout)
         return result
     except:
         result = {
@@ -39,9 +54,9 @@ def global_discount(request):
         cache.set(cache_key, result, 300)
         return result
 
-def site_settings(request):
-    """Add site settings to all templates"""
-    cache_key = 'site_settings_context'
+def _load_site_settings():
+    """Get the site settings context from cache or the database"""
+    cache_key = versioned_key('site_settings_context', SITE_SETTINGS)
     cached_data = cache.get(cache_key)
     
     if cached_data is not None:
@@ -64,8 +79,35 @@ def site_settings(request):
             }
         }
     
-    # Cache for 10 minutes
-    cache.set(cache_key, result, 600)
+    cache.set(cache_key, result, invalidated_timeout(CONTEXT_CACHE_TIMEOUT))
     return result
 
+def global_discount(request):
+    """Add global discount information to all templates
+    
+    Values are lazy, so renders that never read them skip the cache lookup.
+    """
+    def load(key):
+        return _memoize_on_request(request, '_global_discount_context', _load_global_discount)[key]
+    
+    return {
+        'global_discount': SimpleLazyObject(lambda: load('global_discount')),
+        'global_discount_active': SimpleLazyObject(lambda: load('global_discount_active')),
+    }
+
+def site_settings(request):
+    """Add site settings to all templates
+    
+    The value is lazy, so renders that never read it skip the cache lookup.
+    """
+    return {
+        'site_settings': SimpleLazyObject(
+            lambda: _memoize_on_request(request, '_site_settings_context', _load_site_settings)['site_settings']
+        ),
+    }
 
+def pricing(request):
+    """Share one lazily resolved pricing context with every template"""
+    return {
+        'pricing': get_pricing_context(request),
+    }
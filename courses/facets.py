@@ -0,0 +1,146 @@
+"""Faceted counts for the course list filters.
+
+All category, difficulty and price bucket counts come from one GROUP BY over
+the searched catalog. Each facet ignores its own selection but respects the
+others, so picking "Beginner" still shows how many beginner courses every
+other category has. Results are cached per normalized filter state.
+"""
+import hashlib
+from collections import Counter, namedtuple
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Q, Value, When
+
+from .caching import CATALOG, PRICING, invalidated_timeout, versioned_key
+
+# Invalidated by catalog and pricing generation bumps
+FACET_CACHE_TIMEOUT = 60 * 30
+MAX_CATEGORY_FACETS = 10
+
+# Buckets partition the catalog; "paid" is offered too, as the union of the paid ones.
+# Prices are in PKR: most paid courses sell for a few thousand rupees
+PRICE_BUCKETS = {
+    'free': ('Free', Q(effective_price=0)),
+    'under_2000': ('Under PKR 2,000', Q(effective_price__gt=0, effective_price__lt=2000)),
+    '2000_to_5000': ('PKR 2,000 - 5,000', Q(effective_price__gte=2000, effective_price__lte=5000)),
+    'over_5000': ('Over PKR 5,000', Q(effective_price__gt=5000)),
+}
+PRICE_FILTERS = {
+    'paid': Q(effective_price__gt=0),
+    **{key: q for key, (_, q) in PRICE_BUCKETS.items()},
+}
+
+FacetValue = namedtuple('FacetValue', ['value', 'label', 'count', 'selected'])
+
+
+def facet_selection(params):
+    """The category, difficulty and price the user picked, normalized"""
+    from .models import Course
+
+    category = params.get('category', '')
+    difficulty = params.get('difficulty', '')
+    price = params.get('price', '')
+    return {
+        'category': int(category) if category.isdigit() else None,
+        'difficulty': difficulty if difficulty in dict(Course.DIFFICULTY_CHOICES) else None,
+        'price': price if price in PRICE_FILTERS else None,
+    }
+
+
+def facet_cache_key(params, selection):
+    """Cache key for a filter state; parameters that do not change counts are dropped"""
+    state = {
+        'q': ' '.join(params.get('q', '').lower().split()),
+        'price_min': params.get('price_min', ''),
+        'price_max': params.get('price_max', ''),
+        **{name: value or '' for name, value in selection.items()},
+    }
+    digest = hashlib.md5(urlencode(sorted(state.items())).encode()).hexdigest()
+    return versioned_key(f'course_facets:{digest}', CATALOG, PRICING)
+
+
+def _price_matches(bucket, price):
+    if price is None:
+        return True
+    if price == 'paid':
+        return bucket != 'free'
+    return bucket == price
+
+
+def count_facets(queryset, selection):
+    """Count queryset by category, difficulty and price bucket in one query"""
+    price_bucket = Case(
+        *[When(q, then=Value(key)) for key, (_, q) in PRICE_BUCKETS.items()],
+        output_field=CharField(),
+    )
+    rows = (
+        queryset.order_by()
+        .annotate(price_bucket=price_bucket)
+        .values('category_id', 'category__name', 'difficulty', 'price_bucket')
+        .annotate(count=Count('pk'))
+        .values_list('category_id', 'category__name', 'difficulty', 'price_bucket', 'count')
+    )
+
+    categories, difficulties, prices = Counter(), Counter(), Counter()
+    category_names = {}
+    for category, category_name, difficulty, bucket, count in rows:
+        category_names[category] = category_name
+        category_ok = selection['category'] in (None, category)
+        difficulty_ok = selection['difficulty'] in (None, difficulty)
+        price_ok = _price_matches(bucket, selection['price'])
+        if difficulty_ok and price_ok:
+            categories[category] += count
+        if category_ok and price_ok:
+            difficulties[difficulty] += count
+        if category_ok and difficulty_ok:
+            prices[bucket] += count
+    return categories, difficulties, prices, category_names
+
+
+def course_facets(queryset, params):
+    """Facet values with counts for the course list filters
+
+    ``queryset`` must already be searched and price-range filtered, but not
+    filtered on category, difficulty or price bucket.
+    """
+    from .models import Category, Course
+
+    selection = facet_selection(params)
+    cache_key = facet_cache_key(params, selection)
+    facets = cache.get(cache_key)
+    if facets is not None:
+        return facets
+
+    categories, difficulties, prices, category_names = count_facets(queryset, selection)
+
+    shown = [pk for pk, count in categories.most_common(MAX_CATEGORY_FACETS) if count]
+    selected = selection['category']
+    if selected is not None and selected not in shown:
+        # Keep the user's choice listed even when nothing matches it any more
+        if selected not in category_names:
+            category_names[selected] = Category.objects.filter(pk=selected).values_list('name', flat=True).first()
+        if category_names[selected] is not None:
+            shown.append(selected)
+    category_facets = sorted(
+        (FacetValue(pk, category_names[pk], categories[pk], pk == selected) for pk in shown),
+        key=lambda facet: (-facet.count, facet.label),
+    )
+
+    price_labels = [('free', 'Free'), ('paid', 'Paid')] + [
+        (key, label) for key, (label, _) in PRICE_BUCKETS.items() if key != 'free'
+    ]
+    prices['paid'] = sum(count for bucket, count in prices.items() if bucket != 'free')
+    facets = {
+        'categories': category_facets,
+        'difficulties': [
+            FacetValue(value, label, difficulties[value], value == selection['difficulty'])
+            for value, label in Course.DIFFICULTY_CHOICES
+        ],
+        'prices': [
+            FacetValue(value, label, prices[value], value == selection['price'])
+            for value, label in price_labels
+        ],
+    }
+    cache.set(cache_key, facets, invalidated_timeout(FACET_CACHE_TIMEOUT))
+    return facets
@@ -2,7 +2,7 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from .models import Review, Course
-from django.db import models
+from .ratings import get_rating_stats
 
 class ReviewForm(forms.ModelForm):
     """Enhanced review form with better validation and UI"""
@@ -137,32 +137,4 @@ class CourseRatingForm(forms.Form):
     
     def get_rating_stats(self):
         """Get comprehensive rating statistics"""
-        reviews = self.course.reviews.filter(is_moderated=True)
-        
-        if not reviews.exists():
-            return {
-                'total_reviews': 0,
-                'average_rating': 0,
-                'rating_distribution': {},
-                'verified_reviews': 0,
-                'helpful_reviews': 0,
-            }
-        
-        # Basic stats
-        total_reviews = reviews.count()
-        average_rating = reviews.aggregate(avg=models.Avg('rating'))['avg']
-        
-        # Rating distribution
-        distribution = self.course.get_rating_distribution()
-        
-        # Additional stats
-        verified_reviews = reviews.filter(is_verified_purchase=True).count()
-        helpful_reviews = reviews.filter(is_helpful=True).count()
-        
-        return {
-            'total_reviews': total_reviews,
-            'average_rating': round(average_rating, 2) if average_rating else 0,
-            'rating_distribution': distribution,
-            'verified_reviews': verified_reviews,
-            'helpful_reviews': helpful_reviews,
-        }
+        return get_rating_stats(self.course)
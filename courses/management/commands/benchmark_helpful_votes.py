@@ -0,0 +1,88 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from courses.models import Category, Course, Review
+
+
+class Command(BaseCommand):
+    help = 'Time helpful-vote toggles on a review with many votes (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--votes',
+            type=int,
+            default=100000,
+            help='Number of existing helpful votes on the review (default: 100000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Toggles timed per approach (default: 20)'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            review = self.generate_votes(options['votes'])
+            voters = list(User.objects.filter(username__startswith='benchmark-voter-')[:options['repeat']])
+
+            legacy_ms = self.time_toggles(lambda user: self.legacy_toggle(review.pk, user), voters)
+            toggle_ms = self.time_toggles(
+                lambda user: Review.objects.only('id').get(pk=review.pk).toggle_helpful_vote(user), voters
+            )
+            self.stdout.write(f'{"approach":<28}{"ms per toggle":>14}')
+            self.stdout.write(f'{"load voters + count + save":<28}{legacy_ms:>14.2f}')
+            self.stdout.write(f'{"indexed toggle + F()":<28}{toggle_ms:>14.2f}')
+            self.stdout.write(self.style.SUCCESS(f'Speedup: {legacy_ms / max(toggle_ms, 0.001):.1f}x'))
+
+            # Leave the database exactly as it was
+            transaction.set_rollback(True)
+
+    def generate_votes(self, count):
+        started = time.perf_counter()
+        author = User.objects.create(username='benchmark-author')
+        course = Course.objects.create(
+            title='Benchmark Helpful Votes',
+            description='Benchmark course',
+            category=Category.objects.create(name='Benchmark'),
+            instructor=author,
+            price=0,
+            duration='1 hour',
+            is_published=True,
+        )
+        review = Review.objects.create(student=author, course=course, rating=5, comment='Viral review')
+
+        User.objects.bulk_create(
+            [User(username=f'benchmark-voter-{i}') for i in range(count)], batch_size=5000
+        )
+        voter_ids = User.objects.filter(username__startswith='benchmark-voter-').values_list('id', flat=True)
+        Vote = Review.helpful_votes.through
+        Vote.objects.bulk_create(
+            [Vote(review_id=review.pk, user_id=user_id) for user_id in voter_ids.iterator()], batch_size=5000
+        )
+        Review.objects.filter(pk=review.pk).update(helpful_count=count)
+
+        self.stdout.write(f'Generated {count} votes in {time.perf_counter() - started:.1f}s')
+        return review
+
+    def legacy_toggle(self, review_id, user):
+        """The previous implementation of mark_review_helpful"""
+        review = Review.objects.get(pk=review_id)
+        if user in review.helpful_votes.all():
+            review.helpful_votes.remove(user)
+        else:
+            review.helpful_votes.add(user)
+        review.helpful_count = review.helpful_votes.count()
+        review.save()
+
+    def time_toggles(self, toggle, voters):
+        """Average time of withdrawing and re-adding each voter's vote"""
+        timings = []
+        for user in voters:
+            for _ in range(2):
+                started = time.perf_counter()
+                toggle(user)
+                timings.append((time.perf_counter() - started) * 1000)
+        return sum(timings) / len(timings)
@@ -0,0 +1,99 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from courses.models import Category, Course
+from courses.search import get_backend, icontains_search, rebuild_index, search_courses
+
+WORDS = [
+    'python', 'machine', 'learning', 'neural', 'network', 'vision', 'language', 'model',
+    'data', 'science', 'statistics', 'pandas', 'deep', 'reinforcement', 'robotics', 'cloud',
+    'deployment', 'transformer', 'regression', 'clustering', 'ethics', 'prompt', 'agents', 'sql',
+]
+# Filler vocabulary so topic words are selective, as in a real catalog
+FILLER = [f'lorem{i}' for i in range(5000)]
+
+
+class Command(BaseCommand):
+    help = 'Compare full-text index search with the icontains scan on a generated catalog (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--courses',
+            type=int,
+            default=100000,
+            help='Number of courses to generate (default: 100000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Times each query is run (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        if get_backend() is None:
+            self.stdout.write(self.style.ERROR('No full-text index on this database; run migrate first.'))
+            return
+
+        with transaction.atomic():
+            self.generate_catalog(options['courses'])
+            self.run_benchmark(options['repeat'])
+            # Leave the database exactly as it was
+            transaction.set_rollback(True)
+
+    def generate_catalog(self, count):
+        started = time.perf_counter()
+        rng = random.Random(42)
+        instructor = User.objects.create(username='benchmark-instructor', first_name='Bench', last_name='Mark')
+        categories = Category.objects.bulk_create(
+            [Category(name=f'Benchmark {word.title()}') for word in WORDS]
+        )
+
+        batch = []
+        for i in range(count):
+            words = rng.sample(WORDS, 3)
+            batch.append(Course(
+                title=f'{words[0].title()} {words[1].title()} {i}',
+                slug=f'benchmark-course-{i}',
+                short_description=' '.join([words[2]] + rng.sample(FILLER, 8)),
+                description=' '.join(rng.choices(FILLER, k=200)),
+                category=rng.choice(categories),
+                instructor=instructor,
+                price=rng.randint(0, 200) * 100,
+                duration='10 hours',
+                is_published=True,
+            ))
+            if len(batch) == 5000:
+                Course.objects.bulk_create(batch)
+                batch = []
+        Course.objects.bulk_create(batch)
+        rebuild_index()
+
+        self.stdout.write(f'Generated {count} courses in {time.perf_counter() - started:.1f}s')
+
+    def run_benchmark(self, repeat):
+        base = Course.objects.filter(is_published=True)
+        queries = ['neural', 'machine learning', 'robotics ethics', 'benchmark vision', 'transformer 4242']
+
+        self.stdout.write(f'{"query":<22}{"icontains ms":>14}{"index ms":>12}{"speedup":>10}{"hits":>10}')
+        for query in queries:
+            scan_ms, scan_hits = self.time_query(lambda: icontains_search(base, query), repeat)
+            index_ms, index_hits = self.time_query(lambda: search_courses(base, query), repeat)
+            self.stdout.write(
+                f'{query:<22}{scan_ms:>14.1f}{index_ms:>12.1f}{scan_ms / max(index_ms, 0.001):>9.1f}x'
+                f'{index_hits:>10}'
+            )
+
+    def time_query(self, build, repeat):
+        """Average time to count matches and fetch the first page"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset = build()
+            hits = queryset.count()
+            list(queryset[:8])
+            timings.append((time.perf_counter() - started) * 1000)
+        return sum(timings) / len(timings), hits
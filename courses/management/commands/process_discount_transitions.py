@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from courses.scheduler import DiscountScheduler
+
+
+class Command(BaseCommand):
+    help = 'Activate and expire course and global discounts whose start/end time has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--worker',
+            action='store_true',
+            help='Keep running and process each discount boundary as it is reached'
+        )
+        parser.add_argument(
+            '--refresh',
+            type=int,
+            default=60,
+            help='Seconds between reloads of upcoming boundaries in worker mode (default: 60)'
+        )
+        parser.add_argument(
+            '--lookback-hours',
+            type=int,
+            default=24,
+            help='How far back to look for started discounts on the first run (default: 24)'
+        )
+
+    def handle(self, *args, **options):
+        scheduler = DiscountScheduler(lookback=timedelta(hours=options['lookback_hours']))
+        
+        if options['worker']:
+            self.stdout.write(self.style.SUCCESS('Discount scheduler started, waiting for boundaries...'))
+            try:
+                scheduler.run(refresh_interval=options['refresh'], on_transitions=self.report)
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('Discount scheduler stopped'))
+            return
+        
+        self.report(scheduler.process_due(force=True))
+
+    def report(self, transitions):
+        for course_id in transitions.courses_activated:
+            self.stdout.write(self.style.SUCCESS(f'✓ Activated discount for course #{course_id}'))
+        for course_id in transitions.courses_expired:
+            self.stdout.write(self.style.WARNING(f'⚠ Deactivated discount for course #{course_id}'))
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully processed {len(transitions.courses_activated) + len(transitions.courses_expired)} '
+                f'course discount(s) and {transitions.globals_activated + transitions.globals_expired} '
+                f'global discount(s)'
+            )
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from courses.models import Enrollment
+
+
+class Command(BaseCommand):
+    help = 'Recompute the lesson progress counters stored on enrollments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course',
+            help='Only recount enrollments of the course with this slug'
+        )
+
+    def handle(self, *args, **options):
+        enrollments = Enrollment.objects.all()
+        if options['course']:
+            enrollments = enrollments.filter(course__slug=options['course'])
+        
+        updated = enrollments.recount_progress()
+        self.stdout.write(self.style.SUCCESS(f'Successfully recounted progress for {updated} enrollments'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from courses.caching import CATALOG, bump_generation
+from courses.models import Course, Review
+from courses.ratings import rating_recount_updates
+
+
+class Command(BaseCommand):
+    help = 'Recompute the rating aggregates stored on courses from their moderated reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course',
+            help='Only recount the course with this slug'
+        )
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options['course']:
+            courses = courses.filter(slug=options['course'])
+        
+        updated = courses.update(**rating_recount_updates(Review), updated_at=timezone.now())
+        bump_generation(CATALOG)
+        self.stdout.write(self.style.SUCCESS(f'Successfully recounted ratings for {updated} courses'))
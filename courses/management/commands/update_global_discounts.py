@@ -1,42 +1,10 @@
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from courses.models import GlobalDiscount
 
 
 class Command(BaseCommand):
-    help = 'Update global discount status based on current time'
+    help = 'Update global discount status based on current time (alias of process_discount_transitions)'
 
     def handle(self, *args, **options):
-        now = timezone.now()
-        updated_count = 0
-        
-        # Get all global discounts
-        global_discounts = GlobalDiscount.objects.all()
-        
-        for discount in global_discounts:
-            old_status = discount.is_active
-            new_status = discount.is_currently_active()
-            
-            if old_status != new_status:
-                discount.is_active = new_status
-                discount.save()
-                updated_count += 1
-                
-                if new_status:
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'✓ Activated global discount: "{discount.title}" ({discount.discount_percentage}% off)'
-                        )
-                    )
-                else:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'⚠ Deactivated global discount: "{discount.title}" (expired: {discount.end_date})'
-                        )
-                    )
-        
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'Successfully updated {updated_count} global discount(s)'
-            )
-        )
+        # Course and global discounts are both handled by the discount scheduler
+        call_command('process_discount_transitions', stdout=self.stdout, stderr=self.stderr)
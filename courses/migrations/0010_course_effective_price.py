@@ -0,0 +1,75 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:14
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
+
+
+def populate_effective_prices(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    GlobalDiscount = apps.get_model('courses', 'GlobalDiscount')
+
+    now = timezone.now()
+    global_discount = GlobalDiscount.objects.filter(
+        is_active=True,
+        end_date__gte=now,
+    ).filter(
+        Q(start_date__isnull=True) | Q(start_date__lte=now)
+    ).first()
+
+    if global_discount is None:
+        fallback_price = F('price')
+        fallback_percentage = Value(0)
+    else:
+        multiplier = Decimal(100 - global_discount.discount_percentage) / 100
+        fallback_price = Round(F('price') * Value(multiplier), 2)
+        fallback_percentage = Value(global_discount.discount_percentage)
+
+    active = (
+        Q(is_discount_active=True, discount_price__gt=0, discount_end_date__gte=now) &
+        (Q(discount_start_date__isnull=True) | Q(discount_start_date__lte=now))
+    )
+    Course.objects.update(
+        effective_price=Case(
+            When(active, then=F('discount_price')),
+            default=fallback_price,
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+        effective_discount_percentage=Case(
+            When(active, then=Case(
+                When(price=0, then=Value(0)),
+                default=Round((F('price') - F('discount_price')) * 100 / F('price')),
+                output_field=models.IntegerField(),
+            )),
+            default=fallback_percentage,
+            output_field=models.IntegerField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_alter_banner_banner_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='effective_discount_percentage',
+            field=models.IntegerField(default=0, editable=False, help_text='Discount percentage currently applied'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0.0, editable=False, help_text='Price customers currently pay, including discounts', max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['is_published', 'effective_price'], name='course_pub_effective_price'),
+        ),
+        migrations.RunPython(populate_effective_prices, migrations.RunPython.noop),
+    ]
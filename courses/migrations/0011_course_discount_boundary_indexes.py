@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_course_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['is_discount_active', 'discount_end_date'], name='course_discount_end'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['discount_start_date'], name='course_discount_start'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from courses import search
+
+    backend_class = search.BACKENDS.get(schema_editor.connection.vendor)
+    if backend_class is None:
+        return
+
+    backend = backend_class()
+    with schema_editor.connection.cursor() as cursor:
+        backend.create(cursor)
+        backend.reindex(cursor, '1 = 1')
+    search._available.pop(schema_editor.connection.alias, None)
+
+
+def drop_search_index(apps, schema_editor):
+    from courses import search
+
+    backend_class = search.BACKENDS.get(schema_editor.connection.vendor)
+    if backend_class is None:
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        backend_class().drop(cursor)
+    search._available.pop(schema_editor.connection.alias, None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_course_discount_boundary_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
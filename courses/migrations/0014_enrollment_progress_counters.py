@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:51
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def populate_progress_counters(apps, schema_editor):
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    Lesson = apps.get_model('courses', 'Lesson')
+    CourseProgress = apps.get_model('courses', 'CourseProgress')
+
+    def count(queryset, group_by):
+        counts = queryset.order_by().values(group_by).annotate(count=Count('pk')).values('count')
+        return Coalesce(Subquery(counts, output_field=models.IntegerField()), Value(0))
+
+    completions = CourseProgress.objects.filter(
+        student=OuterRef('student'), lesson__course=OuterRef('course'), completed=True
+    )
+    total = count(Lesson.objects.filter(course=OuterRef('course')), 'course')
+    completed = count(completions, 'student')
+    Enrollment.objects.update(
+        total_lessons=total,
+        completed_lessons=completed,
+        last_lesson=Subquery(completions.order_by('-completed_at', '-pk').values('lesson')[:1]),
+        completed_at=Case(
+            When(GreaterThan(total, 0) & GreaterThanOrEqual(completed, total),
+                 then=Coalesce(F('completed_at'), Value(timezone.now()))),
+            default=None,
+            output_field=models.DateTimeField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_course_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_lessons',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='last_lesson',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courses.lesson'),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='total_lessons',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_progress_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:52
+
+from django.db import migrations, models
+
+
+def delete_incomplete_progress(apps, schema_editor):
+    # Rows for lessons that were only viewed carry no information
+    CourseProgress = apps.get_model('courses', 'CourseProgress')
+    CourseProgress.objects.filter(completed=False).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_enrollment_progress_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='courseprogress',
+            name='completed',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(delete_incomplete_progress, migrations.RunPython.noop),
+    ]
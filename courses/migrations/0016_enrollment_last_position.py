@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_courseprogress_completions_only'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='last_position',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Seconds into last_lesson the student stopped watching'),
+        ),
+    ]
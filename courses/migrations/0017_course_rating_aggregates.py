@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:56
+
+from django.db import migrations, models
+from django.db.models import Case, Count, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Round
+from django.db.models.lookups import GreaterThan
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Review = apps.get_model('courses', 'Review')
+
+    def aggregate(expression, **filters):
+        values = (
+            Review.objects.filter(course=OuterRef('pk'), is_moderated=True, **filters)
+            .order_by().values('course').annotate(value=expression).values('value')
+        )
+        return Coalesce(Subquery(values, output_field=models.IntegerField()), Value(0))
+
+    total = aggregate(Count('pk'))
+    rating_sum = aggregate(Sum('rating'))
+    Course.objects.update(
+        total_ratings=total,
+        rating_sum=rating_sum,
+        rating=Case(
+            When(GreaterThan(total, 0), then=Round(Cast(rating_sum, models.FloatField()) / total, 2)),
+            default=Value(0),
+            output_field=models.DecimalField(max_digits=3, decimal_places=2),
+        ),
+        **{f'rating_count_{star}': aggregate(Count('pk'), rating=star) for star in range(1, 6)},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0016_enrollment_last_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='rating_count_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_count_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_count_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_count_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_count_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_rating_aggregates, migrations.RunPython.noop),
+    ]
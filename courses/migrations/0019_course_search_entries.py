@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:49
+
+import courses.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0018_discount_scheduler_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostgresCourseSearchEntry',
+            fields=[
+                ('course', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='courses.course')),
+                ('document', courses.search.SearchDocumentField()),
+            ],
+            options={
+                'db_table': 'courses_course_search',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SQLiteCourseSearchEntry',
+            fields=[
+                ('course', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='fts_entry', serialize=False, to='courses.course')),
+                ('document', courses.search.SearchDocumentField(db_column='courses_course_fts')),
+            ],
+            options={
+                'db_table': 'courses_course_fts',
+                'managed': False,
+            },
+        ),
+    ]
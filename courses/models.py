@@ -1,12 +1,27 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.urls import reverse
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError
-from django.db.models import Avg
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from collections import Counter, defaultdict
+from decimal import Decimal
+from .caching import BANNERS, CATALOG, SITE_SETTINGS, bump_generation
+from .pricing import PricingContext, invalidate_pricing_caches, refresh_effective_prices
+from . import search
+from .autocomplete import course_index
+from .progress import lesson_added, progress_counter_updates
+from .ratings import STAR_FIELDS, apply_rating_deltas, invalidate_rating_stats, rating_recount_updates
 import os
 
+def is_mobile_request(request):
+    """Check if request comes from a phone, judging by its user agent"""
+    user_agent = request.META.get('HTTP_USER_AGENT', '').lower()
+    return 'mobile' in user_agent or 'android' in user_agent or 'iphone' in user_agent
+
 def validate_video_file(value):
     """Validate video file upload"""
     ext = os.path.splitext(value.name)[1].lower()
@@ -88,6 +103,21 @@ class GlobalDiscount(models.Model):
         self.is_active = self.is_currently_active()
         super().save(*args, **kwargs)
 
+class DiscountSchedulerState(models.Model):
+    """Time up to which courses.scheduler has applied discount boundaries"""
+    watermark = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Discount boundaries applied up to {self.watermark}"
+
+@receiver(post_save, sender=GlobalDiscount)
+@receiver(post_delete, sender=GlobalDiscount)
+def reprice_courses_on_global_discount_change(sender, instance, **kwargs):
+    """Recompute materialized course prices when a global discount changes"""
+    refresh_effective_prices()
+    invalidate_pricing_caches()
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -145,6 +175,19 @@ class Course(models.Model):
     students_enrolled = models.PositiveIntegerField(default=0)
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
     total_ratings = models.PositiveIntegerField(default=0)
+    # Moderated review aggregates (maintained from reviews, see courses.ratings)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_5 = models.PositiveIntegerField(default=0, editable=False)
+    
+    # Materialized pricing (maintained from discounts, see courses.pricing)
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, editable=False,
+                                        help_text="Price customers currently pay, including discounts")
+    effective_discount_percentage = models.IntegerField(default=0, editable=False,
+                                                        help_text="Discount percentage currently applied")
     
     # Status
     is_published = models.BooleanField(default=False)
@@ -157,6 +200,14 @@ class Course(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_published', 'effective_price'], name='course_pub_effective_price'),
+            models.Index(fields=['is_published', 'created_at'], name='course_pub_created'),
+            models.Index(fields=['is_published', 'rating'], name='course_pub_rating'),
+            models.Index(fields=['is_published', 'students_enrolled'], name='course_pub_students'),
+            models.Index(fields=['is_discount_active', 'discount_end_date'], name='course_discount_end'),
+            models.Index(fields=['discount_start_date'], name='course_discount_start'),
+        ]
     
     def __str__(self):
         return self.title
@@ -176,49 +227,23 @@ class Course(models.Model):
         now = timezone.now()
         return (self.discount_start_date is None or now >= self.discount_start_date) and now <= self.discount_end_date
     
-    def has_any_discount(self):
+    def has_any_discount(self, pricing=None):
         """Check if course has any active discount (individual or global)"""
-        # Check individual discount first
-        if self.has_active_discount():
-            return True
-        
-        # Check global discount
-        from .models import GlobalDiscount
-        global_discount = GlobalDiscount.objects.filter(is_active=True).first()
-        return global_discount and global_discount.is_currently_active()
+        if pricing is None:
+            pricing = PricingContext()
+        return pricing.has_any_discount(self)
     
-    def get_current_price(self):
+    def get_current_price(self, pricing=None):
         """Get the current price (discounted if active, otherwise regular price)"""
-        # Check for individual course discount first
-        if self.has_active_discount():
-            return self.discount_price
-        
-        # Check for global discount
-        from .models import GlobalDiscount
-        global_discount = GlobalDiscount.objects.filter(is_active=True).first()
-        if global_discount and global_discount.is_currently_active():
-            return global_discount.apply_to_price(self.price)
-        
-        return self.price
+        if pricing is None:
+            pricing = PricingContext()
+        return pricing.get_current_price(self)
     
-    def get_discount_percentage(self):
+    def get_discount_percentage(self, pricing=None):
         """Calculate discount percentage"""
-        # Check for individual course discount first
-        if self.has_active_discount():
-            if self.price == 0:
-                return 0
-            
-            discount_amount = self.price - self.discount_price
-            percentage = (discount_amount / self.price) * 100
-            return round(percentage, 0)
-        
-        # Check for global discount
-        from .models import GlobalDiscount
-        global_discount = GlobalDiscount.objects.filter(is_active=True).first()
-        if global_discount and global_discount.is_currently_active():
-            return global_discount.discount_percentage
-        
-        return 0
+        if pricing is None:
+            pricing = PricingContext()
+        return pricing.get_discount_percentage(self)
     
     def get_discount_remaining_time(self):
         """Get remaining time for discount in seconds"""
@@ -257,33 +282,19 @@ class Course(models.Model):
     
     def get_rating_distribution(self):
         """Get rating distribution for analytics"""
-        from django.db.models import Count
-        distribution = self.reviews.filter(is_moderated=True).values('rating').annotate(
-            count=Count('rating')
-        ).order_by('rating')
-        
-        # Create a complete distribution (1-5 stars)
-        complete_distribution = {}
-        for i in range(1, 6):
-            complete_distribution[i] = 0
-        
-        for item in distribution:
-            complete_distribution[item['rating']] = item['count']
-        
-        return complete_distribution
+        return {star: getattr(self, field) for star, field in STAR_FIELDS.items()}
     
     def get_rating_percentage(self, rating):
         """Get percentage of a specific rating"""
-        total_reviews = self.reviews.filter(is_moderated=True).count()
-        if total_reviews == 0:
+        if not self.total_ratings:
             return 0
         
-        rating_count = self.reviews.filter(is_moderated=True, rating=rating).count()
-        return round((rating_count / total_reviews) * 100, 1)
+        rating_count = getattr(self, STAR_FIELDS[rating])
+        return round((rating_count / self.total_ratings) * 100, 1)
     
     def get_recent_reviews(self, limit=5):
         """Get recent reviews"""
-        return self.reviews.filter(is_moderated=True).order_by('-created_at')[:limit]
+        return self.reviews.filter(is_moderated=True).select_related('student').order_by('-created_at')[:limit]
     
     def get_verified_reviews(self):
         """Get reviews from verified purchases"""
@@ -310,8 +321,34 @@ class Course(models.Model):
         if self.discount_price and self.discount_end_date:
             self.is_discount_active = self.has_active_discount()
         
+        # Materialize the customer-facing price so listings can sort on it in SQL
+        pricing = PricingContext()
+        self.effective_price = Decimal(pricing.get_current_price(self)).quantize(Decimal('0.01'))
+        self.effective_discount_percentage = int(pricing.get_discount_percentage(self))
+        
         super().save(*args, **kwargs)
 
+class SQLiteCourseSearchEntry(models.Model):
+    """Row of the SQLite FTS5 search index (created by migration 0012, filled by courses.search)"""
+    course = models.OneToOneField(Course, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+                                  db_constraint=False, related_name='fts_entry')
+    # FTS5's hidden column named after the table, which MATCH and bm25 take
+    document = search.SearchDocumentField(db_column='courses_course_fts')
+    
+    class Meta:
+        managed = False
+        db_table = 'courses_course_fts'
+
+class PostgresCourseSearchEntry(models.Model):
+    """Row of the PostgreSQL tsvector search index (created by migration 0012, filled by courses.search)"""
+    course = models.OneToOneField(Course, on_delete=models.DO_NOTHING, primary_key=True,
+                                  db_constraint=False, related_name='search_entry')
+    document = search.SearchDocumentField()
+    
+    class Meta:
+        managed = False
+        db_table = 'courses_course_search'
+
 class Lesson(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='lessons')
     title = models.CharField(max_length=200)
@@ -369,16 +406,46 @@ class Lesson(models.Model):
         except:
             return None
 
+class EnrollmentQuerySet(models.QuerySet):
+    def recount_progress(self):
+        """Recompute the progress counters from CourseProgress in one UPDATE"""
+        return self.update(**progress_counter_updates(Lesson, CourseProgress))
+
 class Enrollment(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='enrollments')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
     enrolled_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # Maintained by courses.progress; repair with `manage.py recount_progress`
+    total_lessons = models.PositiveIntegerField(default=0, editable=False)
+    completed_lessons = models.PositiveIntegerField(default=0, editable=False)
+    last_lesson = models.ForeignKey('Lesson', on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='+', editable=False)
+    last_position = models.PositiveIntegerField(default=0, editable=False,
+                                                help_text="Seconds into last_lesson the student stopped watching")
+    
+    objects = EnrollmentQuerySet.as_manager()
     
     class Meta:
         unique_together = ['student', 'course']
     
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            # Start from the progress the student may already have
+            self.total_lessons = Lesson.objects.filter(course_id=self.course_id).count()
+            self.completed_lessons = CourseProgress.objects.filter(
+                student_id=self.student_id, lesson__course_id=self.course_id, completed=True
+            ).count()
+        super().save(*args, **kwargs)
+    
+    @property
+    def progress_percentage(self):
+        """Percentage of lessons completed"""
+        if not self.total_lessons:
+            return 0
+        return round(self.completed_lessons / self.total_lessons * 100, 1)
+    
     def __str__(self):
         return f"{self.student.username} - {self.course.title}"
 
@@ -437,6 +504,19 @@ class Review(models.Model):
                 stars += '<i class="far fa-star text-muted"></i>'
         return stars
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What this review currently contributes to its course's rating aggregates
+        instance._counted_rating = instance._rating_contribution()
+        return instance
+    
+    def _rating_contribution(self):
+        """(course_id, rating) if this review counts towards the course rating"""
+        if {'course_id', 'rating', 'is_moderated'} & self.get_deferred_fields():
+            return None
+        return (self.course_id, self.rating) if self.is_moderated else None
+    
     def save(self, *args, **kwargs):
         # Check if this is a verified purchase
         if not self.is_verified_purchase:
@@ -448,26 +528,41 @@ class Review(models.Model):
             ).exists()
         
         super().save(*args, **kwargs)
-        
-        # Update course rating statistics
-        self.update_course_rating()
+    
+    def toggle_helpful_vote(self, user):
+        """Add or withdraw user's helpful vote; returns (helpful, helpful_count)
+
+        Costs an indexed delete or insert on the votes table and an F()
+        update of helpful_count, however many votes the review has.
+        """
+        votes = Review.helpful_votes.through.objects
+        with transaction.atomic():
+            withdrawn, _ = votes.filter(review_id=self.pk, user_id=user.pk).delete()
+            if withdrawn:
+                helpful = False
+                Review.objects.filter(pk=self.pk, helpful_count__gt=0).update(helpful_count=F('helpful_count') - 1)
+            else:
+                helpful = True
+                try:
+                    with transaction.atomic():
+                        votes.create(review_id=self.pk, user_id=user.pk)
+                except IntegrityError:
+                    # A concurrent request of the same user voted first
+                    pass
+                else:
+                    Review.objects.filter(pk=self.pk).update(helpful_count=F('helpful_count') + 1)
+            self.helpful_count = Review.objects.values_list('helpful_count', flat=True).get(pk=self.pk)
+        return helpful, self.helpful_count
     
     def update_course_rating(self):
-        """Update course rating statistics"""
-        reviews = self.course.reviews.filter(is_moderated=True)
-        if reviews.exists():
-            avg_rating = reviews.aggregate(Avg('rating'))['rating__avg']
-            self.course.rating = round(avg_rating, 2)
-            self.course.total_ratings = reviews.count()
-        else:
-            self.course.rating = 0.00
-            self.course.total_ratings = 0
-        self.course.save()
+        """Recompute the course rating statistics from scratch"""
+        Course.objects.filter(pk=self.course_id).update(**rating_recount_updates(Review))
 
 class CourseProgress(models.Model):
+    """A lesson a student completed; lessons not yet completed have no row"""
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='course_progress')
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='progress')
-    completed = models.BooleanField(default=False)
+    completed = models.BooleanField(default=True)
     completed_at = models.DateTimeField(blank=True, null=True)
     
     class Meta:
@@ -614,11 +709,9 @@ class Banner(models.Model):
     
     def get_image_url(self, request=None):
         """Get appropriate image URL based on device"""
-        if request and hasattr(request, 'META'):
-            user_agent = request.META.get('HTTP_USER_AGENT', '').lower()
-            if 'mobile' in user_agent or 'android' in user_agent or 'iphone' in user_agent:
-                if self.mobile_image:
-                    return self.mobile_image.url
+        if request and hasattr(request, 'META') and is_mobile_request(request):
+            if self.mobile_image:
+                return self.mobile_image.url
         
         return self.image.url
     
@@ -632,3 +725,92 @@ class Banner(models.Model):
             'flip': 'animate__animated animate__flipInX',
         }
         return animation_classes.get(self.animation_type, 'animate__animated animate__fadeIn')
+
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+def invalidate_site_settings_cache(sender, instance, **kwargs):
+    """Expire cached site settings on every worker"""
+    bump_generation(SITE_SETTINGS)
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def invalidate_banner_cache(sender, instance, **kwargs):
+    """Expire cached banners on every worker"""
+    bump_generation(BANNERS)
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    """Expire cached facet counts and catalog pages on every worker"""
+    bump_generation(CATALOG)
+
+@receiver(post_save, sender=Lesson)
+def count_new_lesson(sender, instance, created, raw=False, **kwargs):
+    """Add a new lesson to the progress counters of the course's students"""
+    if created and not raw:
+        lesson_added(instance)
+
+@receiver(post_delete, sender=Lesson)
+def recount_progress_after_lesson_delete(sender, instance, **kwargs):
+    """Drop a deleted lesson, and its completions, from the progress counters"""
+    Enrollment.objects.filter(course_id=instance.course_id).recount_progress()
+
+@receiver(post_save, sender=Review)
+def adjust_course_rating(sender, instance, created, raw=False, **kwargs):
+    """Move the review's contribution in the course rating aggregates and statistics"""
+    if raw:
+        return
+    old = None if created else getattr(instance, '_counted_rating', None)
+    new = instance._rating_contribution()
+    invalidate_rating_stats(instance.course_id, *(old[:1] if old else ()))
+    if old != new:
+        deltas = defaultdict(Counter)
+        if old is not None:
+            deltas[old[0]][old[1]] -= 1
+        if new is not None:
+            deltas[new[0]][new[1]] += 1
+        apply_rating_deltas(deltas)
+    instance._counted_rating = new
+
+@receiver(post_delete, sender=Review)
+def remove_course_rating(sender, instance, **kwargs):
+    """Take a deleted review out of the course rating aggregates"""
+    invalidate_rating_stats(instance.course_id)
+    counted = getattr(instance, '_counted_rating', None)
+    if counted is not None:
+        apply_rating_deltas({counted[0]: Counter({counted[1]: -1})})
+
+@receiver(post_save, sender=Course)
+def index_course_for_search(sender, instance, raw=False, **kwargs):
+    """Keep the search and autocomplete entries of a course up to date"""
+    if not raw:
+        search.index_course(instance.pk)
+        course_index.update_course(instance)
+
+@receiver(post_delete, sender=Course)
+def remove_course_from_search(sender, instance, **kwargs):
+    """Drop a deleted course from the search and autocomplete indexes"""
+    search.remove_course(instance.pk)
+    course_index.remove_course(instance.pk)
+
+@receiver(post_save, sender=Category)
+def index_category_for_search(sender, instance, raw=False, created=False, **kwargs):
+    """Reindex courses whose category was renamed"""
+    if not raw and not created:
+        search.index_category_courses(instance.pk)
+        course_index.update_courses(instance.courses.all())
+
+@receiver(post_save, sender=User)
+def index_instructor_for_search(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    """Reindex courses whose instructor name changed"""
+    # Logins only touch last_login, skip them
+    if raw or created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    search.index_instructor_courses(instance.pk)
+    course_index.update_courses(instance.courses_taught.all())
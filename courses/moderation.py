@@ -0,0 +1,48 @@
+"""Bulk review moderation.
+
+Approving or rejecting a batch of reviews runs in one transaction: approvals
+are recorded with a single UPDATE and rejections with one batched DELETE, and
+the rating aggregates of each affected course are adjusted once for the whole
+batch rather than once per review. If another moderator approved some of the
+same reviews first, the affected courses are recounted instead.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .ratings import apply_rating_deltas, deferred_rating_updates, recount_ratings
+
+
+def approve_reviews(reviews, moderator):
+    """Approve the pending reviews among ``reviews``; returns how many were approved"""
+    with transaction.atomic():
+        # Locks the rows where the database supports it; SQLite does not, so
+        # the UPDATE below only takes reviews still pending when it runs
+        rows = list(
+            reviews.filter(is_moderated=False).select_for_update().order_by()
+            .values_list('pk', 'course_id', 'rating')
+        )
+        if not rows:
+            return 0
+        # update() skips the review signals, so count the newly approved ratings here
+        deltas = defaultdict(Counter)
+        for _, course_id, rating in rows:
+            deltas[course_id][rating] += 1
+        approved = reviews.model.objects.filter(pk__in=[pk for pk, _, _ in rows], is_moderated=False).update(
+            is_moderated=True, moderated_by=moderator, moderated_at=timezone.now()
+        )
+        if approved == len(rows):
+            apply_rating_deltas(deltas)
+        elif approved:
+            # Someone else approved part of the batch in between; which part is unknown
+            recount_ratings(list(deltas))
+    return approved
+
+
+def reject_reviews(reviews):
+    """Delete ``reviews``; returns how many were rejected"""
+    with transaction.atomic(), deferred_rating_updates():
+        # The per-review delete signals merge their rating deltas into one batch
+        _, deleted = reviews.delete()
+    return deleted.get(reviews.model._meta.label, 0)
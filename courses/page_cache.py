@@ -0,0 +1,119 @@
+"""Full-page cache for anonymous visitors.
+
+Logged-out GET requests for the landing and catalog pages are answered from
+the cache. Entries are keyed on path, query string and device class, and
+remember the content generations they were rendered under; after an admin
+edit or a soft expiry one worker re-renders the page while the others keep
+serving the stale copy, so a popular page never stampedes the database. On a
+cold miss there is no copy to serve, so the other workers wait briefly for the
+one rendering the page, then render it themselves without caching.
+"""
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .caching import BANNERS, CATALOG, PRICING, SITE_SETTINGS, versioned_key
+from .models import is_mobile_request
+
+# Serve without re-rendering for this long
+PAGE_FRESH_SECONDS = 60 * 5
+# Keep stale copies around this long to serve while a page is rebuilt
+PAGE_STALE_SECONDS = 60 * 60 * 24
+REBUILD_LOCK_SECONDS = 30
+# How long a cold miss waits for another worker's render, and how often it looks
+COLD_MISS_WAIT_SECONDS = 2
+COLD_MISS_POLL_SECONDS = 0.05
+PAGE_GENERATIONS = (PRICING, BANNERS, SITE_SETTINGS, CATALOG)
+
+
+def _is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return False
+    # Flash messages are per visitor
+    return not len(get_messages(request))
+
+
+def _is_cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # A page that rendered a CSRF token belongs to one visitor
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def page_cache_key(request):
+    """Key on path, normalized query string and device class"""
+    device = 'mobile' if is_mobile_request(request) else 'desktop'
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    digest = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'anonymous_page:{device}:{digest}'
+
+
+def _restore(entry, state):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    response['X-Page-Cache'] = state
+    return response
+
+
+def _wait_for_entry(cache_key, version):
+    """The entry another worker is rendering, once it lands, or None on timeout"""
+    deadline = time.monotonic() + COLD_MISS_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(COLD_MISS_POLL_SECONDS)
+        entry = cache.get(cache_key)
+        if entry is not None and entry['version'] == version:
+            return entry
+    return None
+
+
+def cache_anonymous_page(view):
+    """Serve anonymous GETs of ``view`` from the page cache"""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable_request(request):
+            return view(request, *args, **kwargs)
+
+        cache_key = page_cache_key(request)
+        lock_key = f'{cache_key}:rebuild'
+        version = versioned_key('page', *PAGE_GENERATIONS)
+        entry = cache.get(cache_key)
+        if entry is not None and entry['version'] == version and entry['fresh_until'] > time.time():
+            return _restore(entry, 'HIT')
+
+        # Only the worker that takes the lock renders for the cache
+        if not cache.add(lock_key, 1, REBUILD_LOCK_SECONDS):
+            if entry is not None:
+                return _restore(entry, 'STALE')
+            entry = _wait_for_entry(cache_key, version)
+            if entry is not None:
+                return _restore(entry, 'HIT')
+            response = view(request, *args, **kwargs)
+            response['X-Page-Cache'] = 'BYPASS'
+            return response
+
+        try:
+            response = view(request, *args, **kwargs)
+            if _is_cacheable_response(request, response):
+                cache.set(cache_key, {
+                    'version': version,
+                    'fresh_until': time.time() + PAGE_FRESH_SECONDS,
+                    'content': response.content,
+                    'status': response.status_code,
+                    'headers': list(response.items()),
+                }, PAGE_STALE_SECONDS)
+                response['X-Page-Cache'] = 'MISS'
+        finally:
+            cache.delete(lock_key)
+        return response
+
+    return wrapper
@@ -0,0 +1,123 @@
+"""Keyset (cursor) pagination for infinite scroll.
+
+Instead of ``OFFSET n`` and a ``COUNT(*)`` per page, each page remembers the
+sort key of its last row in an opaque signed cursor, and the next page asks
+for the rows that sort after it. The cost of a page therefore does not grow
+with how far the client has scrolled.
+"""
+from collections.abc import Sequence
+from functools import reduce
+from operator import or_
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+
+CURSOR_SALT = 'courses.pagination'
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPage(Sequence):
+    """One page of results plus the cursor of the next one"""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class CursorPaginator:
+    """Paginate queryset by ``ordering``, whose last field must be unique
+
+    With ``ordering=None`` the queryset keeps its own order (e.g. search
+    relevance, which has no column to seek on) and the cursor holds a plain
+    offset instead; pages still never run a COUNT.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering) if ordering else None
+        self.per_page = per_page
+
+    def page(self, cursor=None):
+        """Fetch the page that starts at cursor (the first page by default)"""
+        queryset = self.queryset
+        offset = 0
+        if self.ordering:
+            queryset = queryset.order_by(*self.ordering)
+            if cursor:
+                queryset = queryset.filter(self._after(self._decode(cursor)))
+        elif cursor:
+            offset = self._decode(cursor)
+
+        # One extra row tells whether there is a next page
+        rows = list(queryset[offset:offset + self.per_page + 1])
+        if len(rows) <= self.per_page:
+            return CursorPage(rows, None)
+
+        rows = rows[:self.per_page]
+        return CursorPage(rows, self.cursor_after(rows[-1], offset + self.per_page))
+
+    def cursor_after(self, obj, position):
+        """Cursor of the rows following ``obj``, which is row ``position`` (1-based)"""
+        if not self.ordering:
+            return self._encode(position)
+        return self._encode([
+            self._field(name).value_to_string(obj) for name, _ in self._fields()
+        ])
+
+    def _fields(self):
+        return [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def _field(self, name):
+        return self.queryset.model._meta.get_field(name)
+
+    def _after(self, values):
+        # (a, b) > (x, y) spelled as: a > x OR (a = x AND b > y)
+        fields = self._fields()
+        conditions = []
+        for i, (name, descending) in enumerate(fields):
+            equal = {field: value for (field, _), value in zip(fields[:i], values)}
+            equal[f'{name}__{"lt" if descending else "gt"}'] = values[i]
+            conditions.append(Q(**equal))
+        return reduce(or_, conditions)
+
+    def _encode(self, position):
+        return signing.dumps({'o': self.ordering, 'p': position}, salt=CURSOR_SALT, compress=True)
+
+    def _decode(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            raise InvalidCursor('Invalid cursor')
+
+        # A cursor is only meaningful for the ordering it was issued for
+        ordering = tuple(data['o']) if data.get('o') else None
+        if ordering != self.ordering:
+            raise InvalidCursor('Cursor does not match the current sort')
+
+        position = data['p']
+        if not self.ordering:
+            if not isinstance(position, int) or position < 0:
+                raise InvalidCursor('Invalid cursor')
+            return position
+
+        fields = self._fields()
+        if not isinstance(position, list) or len(position) != len(fields):
+            raise InvalidCursor('Invalid cursor')
+        try:
+            return [self._field(name).to_python(value) for (name, _), value in zip(fields, position)]
+        except ValidationError:
+            raise InvalidCursor('Invalid cursor')
@@ -0,0 +1,148 @@
+from decimal import Decimal
+
+from django.db import models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .caching import PRICING, bump_generation
+
+
+class PricingContext:
+    """Site-wide discount state shared by every price lookup in a request
+
+    The active GlobalDiscount is fetched lazily on first use and then reused,
+    so rendering a page full of course cards costs at most one discount query.
+    """
+
+    @cached_property
+    def global_discount(self):
+        """The currently running global discount, or None"""
+        return get_active_global_discount()
+
+    def global_discount_active(self):
+        """Check if a global discount applies right now"""
+        return self.global_discount is not None and self.global_discount.is_currently_active()
+
+    def has_any_discount(self, course):
+        """Check if course has any active discount (individual or global)"""
+        if course.has_active_discount():
+            return True
+        return self.global_discount_active()
+
+    def get_current_price(self, course):
+        """Get the price the customer pays for course right now"""
+        if course.has_active_discount():
+            return course.discount_price
+
+        if self.global_discount_active():
+            return self.global_discount.apply_to_price(course.price)
+
+        return course.price
+
+    def get_discount_percentage(self, course):
+        """Get the discount percentage shown for course"""
+        if course.has_active_discount():
+            if course.price == 0:
+                return 0
+
+            discount_amount = course.price - course.discount_price
+            percentage = (discount_amount / course.price) * 100
+            return round(percentage, 0)
+
+        if self.global_discount_active():
+            return self.global_discount.discount_percentage
+
+        return 0
+
+
+def get_pricing_context(request=None):
+    """Get the pricing context for a request, creating it on first use"""
+    if request is None:
+        return PricingContext()
+
+    pricing = getattr(request, '_pricing_context', None)
+    if pricing is None:
+        pricing = PricingContext()
+        request._pricing_context = pricing
+    return pricing
+
+
+def get_active_global_discount(now=None):
+    """Get the global discount whose window is open at ``now``"""
+    from .models import GlobalDiscount
+
+    if now is None:
+        now = timezone.now()
+    return GlobalDiscount.objects.filter(
+        is_active=True,
+        end_date__gte=now,
+    ).filter(
+        Q(start_date__isnull=True) | Q(start_date__lte=now)
+    ).first()
+
+
+def invalidate_pricing_caches():
+    """Drop cached data that depends on which discounts are active"""
+    bump_generation(PRICING)
+
+
+def individual_discount_q(now=None):
+    """Q matching courses whose own discount window is open at ``now``"""
+    if now is None:
+        now = timezone.now()
+    return (
+        Q(is_discount_active=True, discount_price__gt=0, discount_end_date__gte=now) &
+        (Q(discount_start_date__isnull=True) | Q(discount_start_date__lte=now))
+    )
+
+
+def effective_price_updates(global_discount_percentage=None, now=None):
+    """Build the update() kwargs that materialize effective price columns
+
+    Mirrors PricingContext.get_current_price and get_discount_percentage as
+    SQL, so the whole catalog can be repriced with a single UPDATE.
+    """
+    individual_price = F('discount_price')
+    individual_percentage = Case(
+        When(price=0, then=Value(0)),
+        default=Round((F('price') - F('discount_price')) * 100 / F('price')),
+        output_field=models.IntegerField(),
+    )
+
+    if global_discount_percentage is None:
+        fallback_price = F('price')
+        fallback_percentage = Value(0)
+    else:
+        multiplier = Decimal(100 - global_discount_percentage) / 100
+        fallback_price = Round(F('price') * Value(multiplier), 2)
+        fallback_percentage = Value(global_discount_percentage)
+
+    active = individual_discount_q(now)
+    return {
+        'effective_price': Case(
+            When(active, then=individual_price),
+            default=fallback_price,
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+        'effective_discount_percentage': Case(
+            When(active, then=individual_percentage),
+            default=fallback_percentage,
+            output_field=models.IntegerField(),
+        ),
+    }
+
+
+def refresh_effective_prices(queryset=None, now=None):
+    """Recompute effective_price for queryset (all courses by default)"""
+    from .models import Course
+
+    if queryset is None:
+        queryset = Course.objects.all()
+    if now is None:
+        now = timezone.now()
+
+    global_discount = get_active_global_discount(now)
+    percentage = global_discount.discount_percentage if global_discount else None
+    return queryset.update(**effective_price_updates(percentage, now))
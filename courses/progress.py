@@ -0,0 +1,81 @@
+"""Per-enrollment lesson progress counters.
+
+Enrollment carries total_lessons and completed_lessons so that dashboards read
+progress without counting CourseProgress rows. Adding a lesson and completing
+lessons (flushed in batches by courses.progress_buffer) bump the counters with
+F() expressions; lesson deletions and repairs recount them with one UPDATE.
+"""
+from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Least
+from django.db.models.lookups import Exact, GreaterThan, GreaterThanOrEqual
+from django.utils import timezone
+
+
+def _count(queryset, group_by):
+    counts = queryset.order_by().values(group_by).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), Value(0))
+
+
+def progress_counter_updates(lesson_model, progress_model, now=None):
+    """Build the update() kwargs that recount Enrollment progress counters"""
+    now = now or timezone.now()
+    completions = progress_model.objects.filter(
+        student=OuterRef('student'), lesson__course=OuterRef('course'), completed=True
+    )
+    total = _count(lesson_model.objects.filter(course=OuterRef('course')), 'course')
+    completed = _count(completions, 'student')
+    finished = GreaterThan(total, 0) & GreaterThanOrEqual(completed, total)
+    last_lesson = Subquery(completions.order_by('-completed_at', '-pk').values('lesson')[:1])
+    return {
+        'total_lessons': total,
+        'completed_lessons': completed,
+        'last_lesson': last_lesson,
+        # The saved position belongs to the old last_lesson; resume a new one from the start
+        'last_position': Case(
+            When(Exact(F('last_lesson'), last_lesson), then=F('last_position')),
+            default=Value(0),
+            output_field=models.PositiveIntegerField(),
+        ),
+        # Keep the original completion time of courses that stay finished
+        'completed_at': Case(
+            When(finished, then=Coalesce(F('completed_at'), Value(now))),
+            default=None,
+            output_field=models.DateTimeField(),
+        ),
+    }
+
+
+def lesson_added(lesson):
+    """Count a new lesson in every enrollment of its course"""
+    from .models import Enrollment
+
+    Enrollment.objects.filter(course_id=lesson.course_id).update(
+        total_lessons=F('total_lessons') + 1,
+        completed_at=None,
+    )
+
+
+
+def lessons_completed(student_id, course_id, count, last_lesson_id, now=None):
+    """Count count newly completed lessons, the latest being last_lesson_id, in one enrollment"""
+    from .models import Enrollment
+
+    now = now or timezone.now()
+    completed = F('completed_lessons') + count
+    finished = GreaterThan(F('total_lessons'), 0) & GreaterThanOrEqual(completed, F('total_lessons'))
+    Enrollment.objects.filter(student_id=student_id, course_id=course_id).update(
+        # Completions racing in from another worker can overshoot; recount_progress repairs the rest
+        completed_lessons=Least(completed, F('total_lessons')),
+        last_lesson_id=last_lesson_id,
+        last_position=Case(
+            When(Exact(F('last_lesson'), last_lesson_id), then=F('last_position')),
+            default=Value(0),
+            output_field=models.PositiveIntegerField(),
+        ),
+        completed_at=Case(
+            When(finished, then=Coalesce(F('completed_at'), Value(now))),
+            default=F('completed_at'),
+            output_field=models.DateTimeField(),
+        ),
+    )
@@ -0,0 +1,266 @@
+"""Write-behind buffer for lesson progress events.
+
+Lesson completions and playback-position heartbeats are collected in memory,
+coalesced per (student, lesson), and written in one transaction every
+``PROGRESS_FLUSH_INTERVAL`` seconds. Bursts of events then cost one short
+write transaction instead of one per request, which matters most on SQLite's
+single writer. Until a flush lands, views read the student's own pending
+events through the overlay methods so the UI never goes backwards.
+
+The buffer lives in the worker process. Its pending events are flushed by the
+timer and at interpreter exit, so a graceful restart loses nothing, but a
+worker that is killed outright (gunicorn's SIGKILL after a timeout, the OOM
+killer) drops up to ``PROGRESS_FLUSH_INTERVAL`` seconds of events, and other
+workers only see a student's events once they are flushed. Set the interval
+to 0 to write every event during its request.
+
+When a batch fails, its events are retried one by one so a single bad event
+cannot hold back everybody else's; an event that keeps failing is dropped
+after ``MAX_FLUSH_ATTEMPTS`` flushes.
+"""
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .progress import lessons_completed
+
+logger = logging.getLogger(__name__)
+
+# Largest playback position stored, in seconds; fits every database's integer
+MAX_POSITION = 2 ** 31 - 1
+MAX_FLUSH_ATTEMPTS = 5
+
+
+@dataclass
+class ProgressEvent:
+    """Everything still unwritten about one student's progress on one lesson"""
+    course_id: int
+    completed: bool = False
+    completed_at: Optional[datetime] = None
+    position: Optional[int] = None
+    seen: float = 0.0
+    failures: int = 0
+
+
+class ProgressBuffer:
+    """Coalesce progress events in memory and flush them in batches"""
+
+    def __init__(self, flush_interval=None):
+        self._lock = threading.Lock()
+        self._pending = {}
+        # Events being written by a flush stay readable until it commits
+        self._flushing = {}
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._flush_interval = flush_interval
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return getattr(settings, 'PROGRESS_FLUSH_INTERVAL', 0)
+
+    def record_completion(self, student_id, lesson):
+        """Queue a lesson completion"""
+        with self._lock:
+            event = self._event(student_id, lesson)
+            if not event.completed:
+                event.completed = True
+                event.completed_at = timezone.now()
+        self._schedule()
+
+    def record_position(self, student_id, lesson, position):
+        """Queue a playback position heartbeat, in seconds; the latest one wins"""
+        with self._lock:
+            event = self._event(student_id, lesson)
+            event.position = min(max(int(position), 0), MAX_POSITION)
+            event.seen = time.monotonic()
+        self._schedule()
+
+    def pending_completions(self, student_id, course_id):
+        """Ids of lessons in course the student completed but are not written yet"""
+        with self._lock:
+            return {
+                lesson_id
+                for events in (self._flushing, self._pending)
+                for (student, lesson_id), event in events.items()
+                if student == student_id and event.course_id == course_id and event.completed
+            }
+
+    def pending_position(self, student_id, course_id):
+        """(lesson_id, position) of the student's latest unwritten heartbeat in course, or None"""
+        latest = None
+        with self._lock:
+            for events in (self._flushing, self._pending):
+                for (student, lesson_id), event in events.items():
+                    if (student == student_id and event.course_id == course_id and event.position is not None
+                            and (latest is None or event.seen >= latest[0])):
+                        latest = (event.seen, lesson_id, event.position)
+        return latest and latest[1:]
+
+    def apply_overlay(self, enrollment):
+        """Add the student's unwritten events to enrollment's progress fields
+
+        Returns the ids of lessons completed but not written yet. Only runs a
+        query when the student has pending completions in the course.
+        """
+        from .models import CourseProgress
+
+        unwritten = self.pending_completions(enrollment.student_id, enrollment.course_id)
+        if unwritten:
+            unwritten -= set(CourseProgress.objects.filter(
+                student_id=enrollment.student_id, lesson_id__in=unwritten,
+            ).values_list('lesson_id', flat=True))
+            enrollment.completed_lessons += len(unwritten)
+
+        position = self.pending_position(enrollment.student_id, enrollment.course_id)
+        if position is not None:
+            enrollment.last_lesson_id, enrollment.last_position = position
+        return unwritten
+
+    def flush(self):
+        """Write every pending event in one transaction; returns how many were written"""
+        with self._flush_lock:
+            with self._lock:
+                self._timer = None
+                events, self._pending = self._pending, {}
+                self._flushing = events
+            if not events:
+                return 0
+            written, failed = len(events), {}
+            try:
+                self._write(events)
+            except Exception:
+                logger.exception('Failed to flush %d lesson progress events, writing them one by one', len(events))
+                written, failed = self._write_each(events)
+            with self._lock:
+                # Put failed events back under any newer ones and retry them later
+                for key, event in failed.items():
+                    self._requeue(key, event)
+                self._flushing = {}
+            if failed:
+                self._schedule(force_timer=True)
+            return written
+
+    def cancel(self):
+        """Stop the flush timer, leaving pending events in place"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _event(self, student_id, lesson):
+        key = (student_id, lesson.pk)
+        event = self._pending.get(key)
+        if event is None:
+            event = self._pending[key] = ProgressEvent(course_id=lesson.course_id)
+        return event
+
+    def _requeue(self, key, event):
+        newer = self._pending.get(key)
+        if newer is None:
+            self._pending[key] = event
+            return
+        if event.completed and not newer.completed:
+            newer.completed, newer.completed_at = True, event.completed_at
+        if newer.position is None:
+            newer.position, newer.seen = event.position, event.seen
+        newer.failures = max(newer.failures, event.failures)
+
+    def _schedule(self, force_timer=False):
+        interval = self.flush_interval
+        if interval <= 0 and not force_timer:
+            # Write-through mode
+            self.flush()
+            return
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(max(interval, 1), self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_in_background(self):
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+    def _write_each(self, events):
+        """Write events in separate transactions; returns (how many were written, events to retry)"""
+        written, failed = 0, {}
+        for key, event in events.items():
+            try:
+                self._write({key: event})
+                written += 1
+            except Exception:
+                event.failures += 1
+                if event.failures >= MAX_FLUSH_ATTEMPTS:
+                    logger.exception('Dropping lesson progress event %s after %d failed flushes', key, event.failures)
+                else:
+                    failed[key] = event
+        return written, failed
+
+    def _write(self, events):
+        from .models import CourseProgress, Enrollment, Lesson
+
+        # Lessons and enrollments deleted since the events were queued
+        lessons = dict(Lesson.objects.filter(
+            pk__in={lesson_id for _, lesson_id in events},
+        ).values_list('pk', 'course_id'))
+        enrolled = set(Enrollment.objects.filter(
+            student_id__in={student_id for student_id, _ in events},
+            course_id__in=set(lessons.values()),
+        ).values_list('student_id', 'course_id'))
+        events = {
+            (student_id, lesson_id): event for (student_id, lesson_id), event in events.items()
+            if (student_id, lessons.get(lesson_id)) in enrolled
+        }
+
+        completions = {key: event for key, event in events.items() if event.completed}
+        positions = {}
+        for (student_id, lesson_id), event in events.items():
+            if event.position is None:
+                continue
+            # Resume from the lesson the student watched last in each course
+            enrollment_key = (student_id, event.course_id)
+            if enrollment_key not in positions or event.seen >= positions[enrollment_key][0]:
+                positions[enrollment_key] = (event.seen, lesson_id, event.position)
+
+        with transaction.atomic():
+            if completions:
+                existing = set(CourseProgress.objects.filter(
+                    student_id__in={student_id for student_id, _ in completions},
+                    lesson_id__in={lesson_id for _, lesson_id in completions},
+                ).values_list('student_id', 'lesson_id'))
+                new = {key: event for key, event in completions.items() if key not in existing}
+                CourseProgress.objects.bulk_create([
+                    CourseProgress(student_id=student_id, lesson_id=lesson_id,
+                                   completed=True, completed_at=event.completed_at)
+                    for (student_id, lesson_id), event in new.items()
+                ], ignore_conflicts=True)
+                touched = {}
+                for (student_id, lesson_id), event in new.items():
+                    count, latest = touched.get((student_id, event.course_id), (0, None))
+                    if latest is None or event.completed_at >= latest[0]:
+                        latest = (event.completed_at, lesson_id)
+                    touched[student_id, event.course_id] = (count + 1, latest)
+                for (student_id, course_id), (count, (_, lesson_id)) in touched.items():
+                    lessons_completed(student_id, course_id, count, lesson_id)
+
+            for (student_id, course_id), (_, lesson_id, position) in positions.items():
+                Enrollment.objects.filter(student_id=student_id, course_id=course_id).update(
+                    last_lesson_id=lesson_id, last_position=position,
+                )
+
+
+progress_buffer = ProgressBuffer()
+atexit.register(progress_buffer.flush)
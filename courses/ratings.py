@@ -0,0 +1,179 @@
+"""Materialized course rating aggregates and cached rating statistics.
+
+Course keeps the sum, count and per-star histogram of its moderated reviews,
+plus the average derived from them. Review changes adjust these columns with
+F() expressions in a single UPDATE per course instead of re-aggregating every
+review, and pages read the histogram straight from the course row.
+
+Inside ``deferred_rating_updates()`` the deltas of every review touched are
+merged instead, and applied once per course when the block exits, so bulk
+moderation costs one UPDATE per affected course.
+
+The fuller statistics of the detail and analytics pages (verified and helpful
+counts too) come from one conditional-aggregation query, cached per course
+until one of its reviews changes.
+"""
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import models
+from django.db.models import Avg, Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Round
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .caching import CATALOG, bump_generation, invalidated_timeout
+
+STARS = (1, 2, 3, 4, 5)
+STAR_FIELDS = {star: f'rating_count_{star}' for star in STARS}
+# Invalidated explicitly whenever a review of the course changes
+RATING_STATS_TIMEOUT = 60 * 60 * 24
+
+_deferred = threading.local()
+
+
+def _average(rating_sum, total):
+    return Case(
+        When(GreaterThan(total, 0), then=Round(Cast(rating_sum, models.FloatField()) / total, 2)),
+        default=Value(0),
+        output_field=models.DecimalField(max_digits=3, decimal_places=2),
+    )
+
+
+def rating_delta_updates(stars):
+    """Build the update() kwargs that add ``stars`` (a Counter of star -> +/-n)"""
+    count = sum(stars.values())
+    rating_sum = sum(star * n for star, n in stars.items())
+    updates = {
+        STAR_FIELDS[star]: F(STAR_FIELDS[star]) + n for star, n in stars.items() if n
+    }
+    new_total = F('total_ratings') + count
+    new_sum = F('rating_sum') + rating_sum
+    updates.update(
+        total_ratings=new_total,
+        rating_sum=new_sum,
+        rating=_average(new_sum, new_total),
+        # Cached course cards are keyed on updated_at
+        updated_at=timezone.now(),
+    )
+    return updates
+
+
+def apply_rating_deltas(deltas):
+    """Apply {course_id: Counter(star -> +/-n)} with one UPDATE per course"""
+    from .models import Course
+
+    pending = getattr(_deferred, 'deltas', None)
+    if pending is not None:
+        for course_id, stars in deltas.items():
+            pending[course_id].update(stars)
+        return
+
+    changed = False
+    for course_id, stars in deltas.items():
+        stars = Counter({star: n for star, n in stars.items() if n})
+        if stars:
+            changed |= bool(Course.objects.filter(pk=course_id).update(**rating_delta_updates(stars)))
+    if changed:
+        # The courses were updated without save(), which would expire these
+        bump_generation(CATALOG)
+        invalidate_rating_stats(*deltas)
+
+
+@contextmanager
+def deferred_rating_updates():
+    """Merge the rating deltas applied inside the block and apply them on exit
+
+    Statistics invalidations are collected the same way. Nested blocks join the outermost one. Nothing is applied if the block
+    raises, so wrap it in the transaction whose writes it accounts for.
+    """
+    if getattr(_deferred, 'deltas', None) is not None:
+        yield
+        return
+    _deferred.deltas, _deferred.stale = defaultdict(Counter), set()
+    try:
+        yield
+        deltas, stale = _deferred.deltas, _deferred.stale
+    finally:
+        _deferred.deltas = _deferred.stale = None
+    apply_rating_deltas(deltas)
+    invalidate_rating_stats(*stale)
+
+
+def rating_recount_updates(review_model):
+    """Build the update() kwargs that recompute Course rating columns from scratch"""
+    def aggregate(expression, **filters):
+        values = (
+            review_model.objects.filter(course=OuterRef('pk'), is_moderated=True, **filters)
+            .order_by().values('course').annotate(value=expression).values('value')
+        )
+        return Coalesce(Subquery(values, output_field=models.IntegerField()), Value(0))
+
+    total = aggregate(Count('pk'))
+    rating_sum = aggregate(Sum('rating'))
+    updates = {STAR_FIELDS[star]: aggregate(Count('pk'), rating=star) for star in STARS}
+    updates.update(
+        total_ratings=total,
+        rating_sum=rating_sum,
+        rating=_average(rating_sum, total),
+    )
+    return updates
+
+
+def recount_ratings(course_ids):
+    """Recompute the rating columns of the given courses from their reviews"""
+    from .models import Course, Review
+
+    if Course.objects.filter(pk__in=course_ids).update(**rating_recount_updates(Review), updated_at=timezone.now()):
+        bump_generation(CATALOG)
+        invalidate_rating_stats(*course_ids)
+
+
+def rating_stats_key(course_id):
+    return f'rating_stats:{course_id}'
+
+
+def invalidate_rating_stats(*course_ids):
+    stale = getattr(_deferred, 'stale', None)
+    if stale is not None:
+        stale.update(course_ids)
+        return
+    cache.delete_many([rating_stats_key(course_id) for course_id in course_ids])
+
+
+def get_rating_stats(course):
+    """Rating statistics of course's moderated reviews, from one cached query"""
+    from .models import Review
+
+    cache_key = rating_stats_key(course.pk)
+    stats = cache.get(cache_key)
+    if stats is not None:
+        return stats
+
+    figures = Review.objects.filter(course=course, is_moderated=True).aggregate(
+        total=Count('pk'),
+        average=Avg('rating'),
+        verified=Count('pk', filter=Q(is_verified_purchase=True)),
+        helpful=Count('pk', filter=Q(is_helpful=True)),
+        **{f'stars_{star}': Count('pk', filter=Q(rating=star)) for star in STARS},
+    )
+    total = figures['total']
+    distribution = {star: figures[f'stars_{star}'] for star in STARS}
+    stats = {
+        'total_reviews': total,
+        'average_rating': round(figures['average'], 2) if figures['average'] else 0,
+        'rating_distribution': distribution,
+        'rating_distribution_with_percentages': {
+            star: {
+                'count': count,
+                'percentage': round(count / total * 100, 1) if total else 0,
+            }
+            for star, count in distribution.items()
+        },
+        'verified_reviews': figures['verified'],
+        'helpful_reviews': figures['helpful'],
+    }
+    cache.set(cache_key, stats, invalidated_timeout(RATING_STATS_TIMEOUT))
+    return stats
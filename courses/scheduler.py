@@ -0,0 +1,167 @@
+"""Event-driven activation and expiry of course and global discounts.
+
+Instead of scanning every discounted course on a timer, the scheduler keeps a
+priority queue of upcoming discount start/end boundaries and only touches the
+rows whose state changes when a boundary is reached.
+"""
+import heapq
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import CATALOG, bump_generation
+from .models import Course, DiscountSchedulerState, GlobalDiscount
+from .pricing import invalidate_pricing_caches, refresh_effective_prices
+
+DEFAULT_LOOKBACK = timedelta(days=1)
+
+DiscountTransitions = namedtuple(
+    'DiscountTransitions',
+    ['courses_activated', 'courses_expired', 'globals_activated', 'globals_expired'],
+)
+
+
+def apply_discount_transitions(since, now):
+    """Flip discount flags for every boundary crossed in (since, now]
+
+    Activation only considers discounts that started inside the window, so a
+    discount an admin switched off by hand is not turned back on. Expiry is
+    idempotent and catches anything that ended at or before ``now``.
+    """
+    with transaction.atomic():
+        activated = list(Course.objects.filter(
+            is_discount_active=False,
+            discount_price__gt=0,
+            discount_start_date__gt=since,
+            discount_start_date__lte=now,
+            discount_end_date__gt=now,
+        ).values_list('pk', flat=True))
+        expired = list(Course.objects.filter(
+            is_discount_active=True,
+            discount_end_date__lte=now,
+        ).values_list('pk', flat=True))
+
+        if activated:
+            Course.objects.filter(pk__in=activated).update(is_discount_active=True, updated_at=now)
+        if expired:
+            Course.objects.filter(pk__in=expired).update(is_discount_active=False, updated_at=now)
+
+        globals_activated = GlobalDiscount.objects.filter(
+            is_active=False,
+            start_date__gt=since,
+            start_date__lte=now,
+            end_date__gt=now,
+        ).update(is_active=True, updated_at=now)
+        globals_expired = GlobalDiscount.objects.filter(
+            is_active=True,
+            end_date__lte=now,
+        ).update(is_active=False, updated_at=now)
+
+        if globals_activated or globals_expired:
+            refresh_effective_prices(now=now)
+        elif activated or expired:
+            refresh_effective_prices(Course.objects.filter(pk__in=activated + expired), now=now)
+
+    transitions = DiscountTransitions(activated, expired, globals_activated, globals_expired)
+    if globals_activated or globals_expired:
+        invalidate_pricing_caches()
+    elif activated or expired:
+        # Course cards are keyed on updated_at, so only facet counts need expiring
+        bump_generation(CATALOG)
+    return transitions
+
+
+class DiscountScheduler:
+    """Priority queue of upcoming discount boundaries"""
+
+    def __init__(self, lookback=DEFAULT_LOOKBACK):
+        self.lookback = lookback
+        self._queue = []
+        self._queued = set()
+
+    def get_watermark(self, now):
+        """Time up to which boundaries have already been processed"""
+        # Kept in the database so one-shot runs from cron see the previous run
+        watermark = DiscountSchedulerState.objects.filter(pk=1).values_list('watermark', flat=True).first()
+        if watermark is None or watermark > now:
+            watermark = now - self.lookback
+        return watermark
+
+    def set_watermark(self, now):
+        """Record that boundaries up to ``now`` have been processed"""
+        DiscountSchedulerState.objects.update_or_create(pk=1, defaults={'watermark': now})
+
+    def schedule(self, when):
+        """Add a boundary to the queue (duplicates are ignored)"""
+        if when is not None and when not in self._queued:
+            self._queued.add(when)
+            heapq.heappush(self._queue, when)
+
+    def load(self, now=None):
+        """Queue every future start/end boundary known to the database"""
+        if now is None:
+            now = timezone.now()
+
+        boundaries = [
+            Course.objects.filter(discount_price__gt=0, discount_start_date__gt=now)
+            .values_list('discount_start_date', flat=True),
+            Course.objects.filter(discount_price__gt=0, discount_end_date__gt=now)
+            .values_list('discount_end_date', flat=True),
+            GlobalDiscount.objects.filter(start_date__gt=now).values_list('start_date', flat=True),
+            GlobalDiscount.objects.filter(end_date__gt=now).values_list('end_date', flat=True),
+        ]
+        for queryset in boundaries:
+            for when in queryset.distinct().order_by():
+                self.schedule(when)
+
+    def next_boundary(self):
+        """Earliest queued boundary, or None when the queue is empty"""
+        return self._queue[0] if self._queue else None
+
+    def process_due(self, now=None, force=False):
+        """Apply transitions for boundaries that have been reached
+
+        With ``force`` the database is reconciled even if no queued boundary
+        is due, which is what the one-shot command does.
+        """
+        if now is None:
+            now = timezone.now()
+
+        due = False
+        while self._queue and self._queue[0] <= now:
+            self._queued.discard(heapq.heappop(self._queue))
+            due = True
+
+        if not (due or force):
+            return None
+
+        transitions = apply_discount_transitions(self.get_watermark(now), now)
+        self.set_watermark(now)
+        return transitions
+
+    def run(self, refresh_interval=60, on_transitions=None, sleep=time.sleep):
+        """Process boundaries as they come due until interrupted
+
+        The queue is reloaded every ``refresh_interval`` seconds so that
+        discounts created or edited in the admin are picked up.
+        """
+        next_refresh = timezone.now()
+        force = True
+        while True:
+            now = timezone.now()
+            if now >= next_refresh:
+                self.load(now)
+                next_refresh = now + timedelta(seconds=refresh_interval)
+
+            transitions = self.process_due(now, force=force)
+            force = False
+            if transitions is not None and on_transitions is not None:
+                on_transitions(transitions)
+
+            wake_at = next_refresh
+            if self.next_boundary() is not None:
+                wake_at = min(wake_at, self.next_boundary())
+            sleep(max(0, (wake_at - timezone.now()).total_seconds()))
@@ -0,0 +1,231 @@
+"""Full-text search over the course catalog.
+
+Course title, short description, description, category name and instructor
+name are copied into a search index table that is kept up to date from model
+signals. SQLite uses an FTS5 virtual table ranked with bm25; PostgreSQL uses a
+weighted tsvector column with a GIN index ranked with ts_rank. Other databases
+fall back to the old ``icontains`` scan. The index tables are created by
+migration 0012 and mapped by the unmanaged CourseSearchEntry models, so queries
+join them through the ORM.
+"""
+import re
+import time
+
+from django.db import connection, models
+from django.db.models import F, FloatField, Func, Lookup, Q, Value
+
+# Columns copied into the index, joined from the course, category and instructor
+INDEX_SOURCE_SQL = """
+    FROM courses_course c
+    JOIN courses_category cat ON cat.id = c.category_id
+    JOIN auth_user u ON u.id = c.instructor_id
+    WHERE {where}
+"""
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    """Split a user query into plain word tokens (drops search syntax)"""
+    return TOKEN_RE.findall(query.lower())[:10]
+
+
+class SearchDocumentField(models.TextField):
+    """The indexed document of a search entry; query it with the ``match`` lookup"""
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    """Full-text match of a document against a backend query string"""
+    lookup_name = 'match'
+
+    def as_sqlite(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} @@ to_tsquery('english'::regconfig, {rhs})", lhs_params + rhs_params
+
+
+class TSQuery(Func):
+    function = 'to_tsquery'
+    template = "%(function)s('english'::regconfig, %(expressions)s)"
+
+
+class SQLiteSearchBackend:
+    table = 'courses_course_fts'
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            "title, short_description, description, category, instructor, "
+            "tokenize='porter unicode61 remove_diacritics 2')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def reindex(self, cursor, where, params=()):
+        cursor.execute(
+            f"DELETE FROM {self.table} WHERE rowid IN (SELECT c.id " + INDEX_SOURCE_SQL.format(where=where) + ")",
+            params,
+        )
+        cursor.execute(
+            f"INSERT INTO {self.table} (rowid, title, short_description, description, category, instructor) "
+            "SELECT c.id, c.title, c.short_description, c.description, cat.name, "
+            "u.first_name || ' ' || u.last_name || ' ' || u.username "
+            + INDEX_SOURCE_SQL.format(where=where),
+            params,
+        )
+
+    def remove(self, cursor, course_id):
+        cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [course_id])
+
+    def filter(self, queryset, tokens):
+        # Every token must match, as a prefix so partially typed words still hit
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        # The document column is FTS5's hidden table column, which bm25 takes
+        # too; weights follow the column order above, lower is better
+        rank = Func(
+            F('fts_entry__document'), *(Value(weight) for weight in (10.0, 5.0, 1.0, 3.0, 3.0)),
+            function='bm25', output_field=FloatField(),
+        )
+        return (
+            queryset.filter(fts_entry__document__match=match)
+            .annotate(search_rank=rank).order_by('search_rank')
+        )
+
+
+class PostgresSearchBackend:
+    table = 'courses_course_search'
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "course_id bigint PRIMARY KEY REFERENCES courses_course (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_document ON {self.table} USING GIN (document)")
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def reindex(self, cursor, where, params=()):
+        cursor.execute(
+            f"INSERT INTO {self.table} (course_id, document) SELECT c.id, "
+            "setweight(to_tsvector('english', coalesce(c.title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(c.short_description, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(cat.name, '')), 'B') || "
+            "setweight(to_tsvector('simple', u.first_name || ' ' || u.last_name || ' ' || u.username), 'B') || "
+            "setweight(to_tsvector('english', coalesce(c.description, '')), 'C') "
+            + INDEX_SOURCE_SQL.format(where=where) +
+            " ON CONFLICT (course_id) DO UPDATE SET document = EXCLUDED.document",
+            params,
+        )
+
+    def remove(self, cursor, course_id):
+        cursor.execute(f"DELETE FROM {self.table} WHERE course_id = %s", [course_id])
+
+    def filter(self, queryset, tokens):
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        rank = Func(
+            F('search_entry__document'), TSQuery(Value(tsquery)),
+            function='ts_rank', output_field=FloatField(),
+        )
+        return (
+            queryset.filter(search_entry__document__match=tsquery)
+            .annotate(search_rank=rank).order_by('-search_rank')
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+# How long a missing index is remembered before looking for it again
+INDEX_RECHECK_SECONDS = 60
+
+# alias -> True once the index table was found, or when it was last found missing
+_available = {}
+
+
+def get_backend(conn=None):
+    """Get the search backend for a connection, or None if it has no index"""
+    conn = conn or connection
+    backend_class = BACKENDS.get(conn.vendor)
+    if backend_class is None:
+        return None
+
+    # Workers started before the index migration pick the table up once it exists
+    state = _available.get(conn.alias)
+    if state is not True and (state is None or time.monotonic() - state > INDEX_RECHECK_SECONDS):
+        found = backend_class.table in conn.introspection.table_names()
+        _available[conn.alias] = state = True if found else time.monotonic()
+    return backend_class() if state is True else None
+
+
+def icontains_search(queryset, query):
+    """Unindexed substring search (fallback and benchmark baseline)"""
+    return queryset.filter(
+        Q(title__icontains=query) |
+        Q(description__icontains=query) |
+        Q(category__name__icontains=query) |
+        Q(instructor__first_name__icontains=query) |
+        Q(instructor__last_name__icontains=query)
+    )
+
+
+def search_courses(queryset, query):
+    """Filter queryset to courses matching query, best matches first"""
+    backend = get_backend()
+    if backend is None:
+        return icontains_search(queryset, query)
+
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+    return backend.filter(queryset, tokens)
+
+
+def _reindex(where, params=()):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.reindex(cursor, where, params)
+
+
+def index_course(course_id):
+    """Refresh the index entry of one course"""
+    _reindex('c.id = %s', [course_id])
+
+
+def index_category_courses(category_id):
+    """Refresh the index entries of every course in a category"""
+    _reindex('c.category_id = %s', [category_id])
+
+
+def index_instructor_courses(user_id):
+    """Refresh the index entries of every course taught by a user"""
+    _reindex('c.instructor_id = %s', [user_id])
+
+
+def remove_course(course_id):
+    """Drop a deleted course from the index"""
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.remove(cursor, course_id)
+
+
+def rebuild_index(conn=None):
+    """Rebuild the whole index from the course table"""
+    conn = conn or connection
+    backend = get_backend(conn)
+    if backend is not None:
+        with conn.cursor() as cursor:
+            backend.reindex(cursor, '1 = 1')
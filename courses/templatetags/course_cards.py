@@ -0,0 +1,87 @@
+import hashlib
+
+from django import template
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from ..caching import PRICING, invalidated_timeout, versioned_key
+from ..models import Enrollment
+from ..pricing import get_pricing_context
+
+register = template.Library()
+
+# Cards change key when the course, its instructor's name or its category is
+# saved, or the pricing generation is bumped
+CARD_CACHE_TIMEOUT = 60 * 60 * 6
+
+
+def _viewer(request, course):
+    """Which footer the viewer gets: anonymous, student or enrolled"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return 'anonymous'
+
+    # One query per request for every card on the page
+    enrolled = getattr(request, '_enrolled_course_ids', None)
+    if enrolled is None:
+        enrolled = set(
+            Enrollment.objects.filter(student=user, is_active=True).values_list('course_id', flat=True)
+        )
+        request._enrolled_course_ids = enrolled
+    return 'enrolled' if course.pk in enrolled else 'student'
+
+
+def _related_digest(course):
+    """Digest of the instructor and category details a card shows"""
+    instructor, category = course.instructor, course.category
+    related = f'{instructor.pk}:{instructor.username}:{instructor.get_full_name()}:{category.pk}:{category.name}'
+    return hashlib.md5(related.encode()).hexdigest()
+
+
+def _key_prefix(request):
+    """Pricing-versioned key prefix, looked up once per request"""
+    prefix = getattr(request, '_course_card_prefix', None)
+    if prefix is None:
+        prefix = versioned_key('course_card', PRICING)
+        if request is not None:
+            request._course_card_prefix = prefix
+    return prefix
+
+
+def _card_timeout(course, pricing):
+    """Expire no later than the next time the card's price changes by itself"""
+    now = timezone.now()
+    boundaries = [course.discount_start_date, course.discount_end_date]
+    if pricing.global_discount is not None:
+        boundaries.append(pricing.global_discount.end_date)
+
+    timeout = invalidated_timeout(CARD_CACHE_TIMEOUT)
+    for boundary in boundaries:
+        if boundary is not None and boundary > now:
+            timeout = min(timeout, int((boundary - now).total_seconds()) + 1)
+    return timeout
+
+
+@register.simple_tag(takes_context=True)
+def course_card(context, course, actions=True):
+    """Usage: {% course_card course %} or {% course_card course actions=False %}"""
+    request = context.get('request')
+    viewer = _viewer(request, course)
+    cache_key = (
+        f'{_key_prefix(request)}:{course.pk}:{course.updated_at.timestamp()}:'
+        f'{_related_digest(course)}:{viewer}:{int(actions)}'
+    )
+
+    html = cache.get(cache_key)
+    if html is None:
+        pricing = context.get('pricing') or get_pricing_context(request)
+        html = get_template('courses/course_card.html').render({
+            'course': course,
+            'pricing': pricing,
+            'viewer': viewer,
+            'actions': actions,
+        })
+        cache.set(cache_key, html, _card_timeout(course, pricing))
+    return mark_safe(html)
@@ -0,0 +1,30 @@
+from django import template
+
+from ..pricing import PricingContext
+
+register = template.Library()
+
+
+def _pricing_or_default(pricing):
+    # Templates rendered without a request have no ``pricing`` variable
+    if isinstance(pricing, PricingContext):
+        return pricing
+    return PricingContext()
+
+
+@register.filter
+def current_price(course, pricing=None):
+    """Usage: {{ course|current_price:pricing }}"""
+    return course.get_current_price(_pricing_or_default(pricing))
+
+
+@register.filter
+def discount_percentage(course, pricing=None):
+    """Usage: {{ course|discount_percentage:pricing }}"""
+    return course.get_discount_percentage(_pricing_or_default(pricing))
+
+
+@register.filter
+def has_any_discount(course, pricing=None):
+    """Usage: {% if course|has_any_discount:pricing %}"""
+    return course.has_any_discount(_pricing_or_default(pricing))
@@ -1,9 +1,30 @@
-from django.test import TestCase
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
 from django.contrib.auth.models import User
 from django.utils import timezone
 from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.core.management import call_command
 from datetime import timedelta
-from .models import Category, Course, GlobalDiscount
+from io import StringIO
+import time
+from unittest import mock
+from .models import Category, Course, CourseProgress, Enrollment, GlobalDiscount, Lesson, Review, SiteSettings
+from . import context_processors
+from .caching import AUTOCOMPLETE, BANNERS, LOCAL_CACHE_TIMEOUT, PRICING, bump_generation, invalidated_timeout, versioned_key
+from .pricing import PricingContext
+from .scheduler import DiscountScheduler
+from .search import search_courses
+from .autocomplete import course_index
+from .pagination import CursorPaginator
+from .facets import course_facets
+from .page_cache import page_cache_key
+from .progress_buffer import MAX_FLUSH_ATTEMPTS, ProgressBuffer, ProgressEvent, progress_buffer
+from .ratings import get_rating_stats
+from .moderation import approve_reviews, reject_reviews
 
 
 class GlobalDiscountTestCase(TestCase):
@@ -270,3 +291,1397 @@ class DiscountTestCase(TestCase):
         
         self.assertEqual(self.course.get_discount_percentage(), 0)
         self.assertEqual(self.course.get_current_price(), Decimal('0.00'))
+
+
+class PricingContextTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(
+            name='Test Category',
+            description='Test category description'
+        )
+        for i in range(8):
+            Course.objects.create(
+                title=f'Test Course {i}',
+                description='Test course description',
+                short_description='Test short description',
+                category=self.category,
+                instructor=self.user,
+                price=Decimal('100.00'),
+                duration='10 hours',
+                is_published=True,
+                is_featured=i < 3
+            )
+        GlobalDiscount.objects.create(
+            title="Global Sale",
+            discount_percentage=20,
+            end_date=timezone.now() + timedelta(days=7),
+            is_active=True
+        )
+        cache.clear()
+
+    def count_discount_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return sum(1 for query in queries.captured_queries if 'courses_globaldiscount' in query['sql'])
+
+    def test_pricing_context_resolves_once(self):
+        """Test that the global discount is looked up once per context"""
+        pricing = PricingContext()
+        courses = list(Course.objects.all())
+        with self.assertNumQueries(1):
+            for course in courses:
+                self.assertTrue(course.has_any_discount(pricing))
+                self.assertEqual(course.get_current_price(pricing), Decimal('80.00'))
+                self.assertEqual(course.get_discount_percentage(pricing), 20)
+
+    def test_course_list_discount_queries(self):
+        """Test that course cards share one global discount lookup"""
+        # Signed-in requests skip the page cache, so every card is rendered
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('courses:course_list'))
+        self.assertNotIn('X-Page-Cache', response)
+        self.assertContains(response, 'PKR 80.00', count=8)
+        # Every card prices itself from the request's single lookup
+        self.assertEqual(sum(1 for query in queries.captured_queries if 'courses_globaldiscount' in query['sql']), 1)
+
+    def test_home_discount_queries(self):
+        """Test that home page cards share one global discount lookup"""
+        # One lookup for the banner context processor, one for card pricing
+        self.assertEqual(self.count_discount_queries(reverse('courses:home')), 2)
+
+
+class EffectivePriceTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(
+            name='Test Category',
+            description='Test category description'
+        )
+        self.cheap = self.create_course('Cheap Course', Decimal('50.00'))
+        self.expensive = self.create_course('Expensive Course', Decimal('100.00'))
+
+    def create_course(self, title, price):
+        return Course.objects.create(
+            title=title,
+            description='Test course description',
+            short_description='Test short description',
+            category=self.category,
+            instructor=self.user,
+            price=price,
+            duration='10 hours',
+            is_published=True
+        )
+
+    def test_effective_price_without_discount(self):
+        """Test that effective price matches the regular price"""
+        self.assertEqual(self.expensive.effective_price, Decimal('100.00'))
+        self.assertEqual(self.expensive.effective_discount_percentage, 0)
+
+    def test_effective_price_with_individual_discount(self):
+        """Test that saving a discounted course materializes its price"""
+        self.expensive.discount_price = Decimal('40.00')
+        self.expensive.discount_start_date = timezone.now() - timedelta(days=1)
+        self.expensive.discount_end_date = timezone.now() + timedelta(days=7)
+        self.expensive.is_discount_active = True
+        self.expensive.save()
+
+        self.expensive.refresh_from_db()
+        self.assertEqual(self.expensive.effective_price, Decimal('40.00'))
+        self.assertEqual(self.expensive.effective_discount_percentage, 60)
+
+    def test_global_discount_reprices_catalog(self):
+        """Test that saving and deleting a global discount reprices every course"""
+        discount = GlobalDiscount.objects.create(
+            title="Global Sale",
+            discount_percentage=30,
+            end_date=timezone.now() + timedelta(days=7),
+            is_active=True
+        )
+        self.cheap.refresh_from_db()
+        self.assertEqual(self.cheap.effective_price, Decimal('35.00'))
+        self.assertEqual(self.cheap.effective_discount_percentage, 30)
+
+        discount.delete()
+        self.cheap.refresh_from_db()
+        self.assertEqual(self.cheap.effective_price, Decimal('50.00'))
+        self.assertEqual(self.cheap.effective_discount_percentage, 0)
+
+    def test_price_sort_uses_discounted_price(self):
+        """Test that price_low sorting reflects course discounts"""
+        self.expensive.discount_price = Decimal('20.00')
+        self.expensive.discount_end_date = timezone.now() + timedelta(days=7)
+        self.expensive.is_discount_active = True
+        self.expensive.save()
+
+        response = self.client.get(reverse('courses:course_list'), {'sort': 'price_low'})
+        self.assertEqual(
+            [course.pk for course in response.context['page_obj']],
+            [self.expensive.pk, self.cheap.pk]
+        )
+
+        response = self.client.get(reverse('courses:course_list'), {'price_max': '30'})
+        self.assertEqual([course.pk for course in response.context['page_obj']], [self.expensive.pk])
+
+
+class DiscountSchedulerTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(
+            name='Test Category',
+            description='Test category description'
+        )
+        self.course = Course.objects.create(
+            title='Test Course',
+            description='Test course description',
+            short_description='Test short description',
+            category=self.category,
+            instructor=self.user,
+            price=Decimal('100.00'),
+            duration='10 hours',
+            discount_price=Decimal('60.00'),
+            discount_start_date=self.now + timedelta(hours=1),
+            discount_end_date=self.now + timedelta(hours=2),
+            is_published=True
+        )
+
+    def test_boundaries_are_queued_in_order(self):
+        """Test that upcoming start and end times are queued earliest first"""
+        scheduler = DiscountScheduler()
+        scheduler.load(self.now)
+        self.assertEqual(scheduler.next_boundary(), self.course.discount_start_date)
+        self.assertIsNone(scheduler.process_due(self.now))
+
+    def test_course_discount_window(self):
+        """Test that a course discount is activated and expired at its boundaries"""
+        scheduler = DiscountScheduler()
+        scheduler.load(self.now)
+        self.assertFalse(Course.objects.get(pk=self.course.pk).is_discount_active)
+
+        transitions = scheduler.process_due(self.now + timedelta(hours=1, seconds=1))
+        self.assertEqual(transitions.courses_activated, [self.course.pk])
+        course = Course.objects.get(pk=self.course.pk)
+        self.assertTrue(course.is_discount_active)
+        self.assertEqual(course.effective_price, Decimal('60.00'))
+        self.assertEqual(scheduler.next_boundary(), self.course.discount_end_date)
+
+        transitions = scheduler.process_due(self.now + timedelta(hours=2, seconds=1))
+        self.assertEqual(transitions.courses_expired, [self.course.pk])
+        course = Course.objects.get(pk=self.course.pk)
+        self.assertFalse(course.is_discount_active)
+        self.assertEqual(course.effective_price, Decimal('100.00'))
+
+    def test_manually_disabled_discount_stays_off(self):
+        """Test that catch-up runs do not re-enable discounts that already started"""
+        scheduler = DiscountScheduler()
+        scheduler.process_due(self.now + timedelta(hours=1, seconds=1), force=True)
+        Course.objects.filter(pk=self.course.pk).update(is_discount_active=False)
+
+        transitions = scheduler.process_due(self.now + timedelta(hours=1, seconds=2), force=True)
+        self.assertEqual(transitions.courses_activated, [])
+        self.assertFalse(Course.objects.get(pk=self.course.pk).is_discount_active)
+
+    def test_watermark_survives_between_runs(self):
+        """Test that a one-shot run picks up from the previous run even after the cache is lost"""
+        DiscountScheduler(lookback=timedelta(minutes=10)).process_due(self.now, force=True)
+        cache.clear()
+
+        transitions = DiscountScheduler(lookback=timedelta(minutes=10)).process_due(
+            self.now + timedelta(hours=1, minutes=30), force=True
+        )
+        self.assertEqual(transitions.courses_activated, [self.course.pk])
+
+    def test_discount_expires_exactly_at_its_end(self):
+        """Test that a run at the end time switches the discount off"""
+        scheduler = DiscountScheduler()
+        scheduler.load(self.now)
+        scheduler.process_due(self.course.discount_start_date)
+        self.assertTrue(Course.objects.get(pk=self.course.pk).is_discount_active)
+
+        transitions = scheduler.process_due(self.course.discount_end_date)
+        self.assertEqual(transitions.courses_expired, [self.course.pk])
+        self.assertFalse(Course.objects.get(pk=self.course.pk).is_discount_active)
+
+    def test_global_discount_window(self):
+        """Test that a scheduled global discount reprices the catalog when it starts"""
+        GlobalDiscount.objects.create(
+            title="Weekend Sale",
+            discount_percentage=50,
+            start_date=self.now + timedelta(minutes=30),
+            end_date=self.now + timedelta(minutes=45),
+            is_active=True
+        )
+        cache_key = versioned_key('global_discount_context', PRICING)
+        cache.set(cache_key, {'global_discount_active': False})
+        scheduler = DiscountScheduler()
+        scheduler.load(self.now)
+
+        transitions = scheduler.process_due(self.now + timedelta(minutes=31))
+        self.assertEqual(transitions.globals_activated, 1)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).effective_price, Decimal('50.00'))
+        self.assertNotEqual(versioned_key('global_discount_context', PRICING), cache_key)
+
+        transitions = scheduler.process_due(self.now + timedelta(minutes=46))
+        self.assertEqual(transitions.globals_expired, 1)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).effective_price, Decimal('100.00'))
+
+
+class ContextProcessorCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def test_global_discount_edit_is_visible_immediately(self):
+        """Test that editing a global discount invalidates the cached banner"""
+        self.assertFalse(context_processors.global_discount(self.factory.get('/'))['global_discount_active'])
+
+        discount = GlobalDiscount.objects.create(
+            title="Flash Sale",
+            discount_percentage=10,
+            end_date=timezone.now() + timedelta(days=1),
+            is_active=True
+        )
+        self.assertEqual(context_processors.global_discount(self.factory.get('/'))['global_discount'].title, "Flash Sale")
+
+        discount.title = "Mega Sale"
+        discount.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(context_processors.global_discount(self.factory.get('/'))['global_discount'].title, "Mega Sale")
+        with self.assertNumQueries(0):
+            context_processors.global_discount(self.factory.get('/'))
+
+    def test_site_settings_edit_is_visible_immediately(self):
+        """Test that saving site settings invalidates the cached context"""
+        settings = SiteSettings.get_settings()
+        self.assertEqual(context_processors.site_settings(self.factory.get('/'))['site_settings'].site_name, settings.site_name)
+
+        settings.site_name = "Renamed Platform"
+        settings.save()
+        self.assertEqual(context_processors.site_settings(self.factory.get('/'))['site_settings'].site_name, "Renamed Platform")
+
+    def test_processors_are_lazy(self):
+        """Test that processors only hit cache or database when a value is read"""
+        request = self.factory.get('/')
+        with self.assertNumQueries(0):
+            context = {}
+            context.update(context_processors.global_discount(request))
+            context.update(context_processors.site_settings(request))
+            context.update(context_processors.pricing(request))
+            Template('{{ pricing|yesno:"a,b" }}').render(Context(context))
+        self.assertFalse(hasattr(request, '_global_discount_context'))
+        self.assertFalse(hasattr(request, '_site_settings_context'))
+
+        Template('{{ site_settings.site_name }}').render(Context(context))
+        cache.clear()
+        with self.assertNumQueries(0):
+            Template('{{ site_settings.site_name }}{{ site_settings.site_tagline }}').render(Context(context))
+
+    def test_long_timeouts_need_a_shared_cache(self):
+        """Test that invalidated entries only outlive the local timeout when every worker shares the cache"""
+        long_timeout = context_processors.CONTEXT_CACHE_TIMEOUT
+        self.assertEqual(invalidated_timeout(long_timeout), LOCAL_CACHE_TIMEOUT)
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                                   'LOCATION': '/tmp/course-platform-test-cache'}}):
+            self.assertEqual(invalidated_timeout(long_timeout), long_timeout)
+
+
+class CourseSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='ateacher',
+            first_name='Ada',
+            last_name='Lovelace',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(name='Robotics')
+        self.title_match = self.create_course('Neural Networks Bootcamp', 'An introduction to deep learning.')
+        self.description_match = self.create_course('Data Science Basics', 'Covers statistics and neural networks.')
+        self.other = self.create_course('Web Development', 'HTML, CSS and JavaScript.')
+
+    def create_course(self, title, description):
+        return Course.objects.create(
+            title=title,
+            description=description,
+            short_description=description,
+            category=self.category,
+            instructor=self.user,
+            price=Decimal('10.00'),
+            duration='1 hour',
+            is_published=True
+        )
+
+    def search(self, query):
+        return list(search_courses(Course.objects.all(), query))
+
+    def test_results_are_ranked_by_relevance(self):
+        """Test that title matches rank above description matches"""
+        self.assertEqual(self.search('neural networks'), [self.title_match, self.description_match])
+
+    def test_prefix_and_stemmed_matches(self):
+        """Test that partially typed and inflected words match"""
+        self.assertEqual(self.search('bootc'), [self.title_match])
+        self.assertEqual(self.search('network'), [self.title_match, self.description_match])
+
+    def test_index_follows_related_changes(self):
+        """Test that category and instructor edits are reflected in the index"""
+        self.assertEqual(len(self.search('robotics')), 3)
+        self.category.name = 'Automation'
+        self.category.save()
+        self.assertEqual(self.search('robotics'), [])
+        self.assertEqual(len(self.search('automation')), 3)
+
+        self.user.last_name = 'Byron'
+        self.user.save()
+        self.assertEqual(len(self.search('byron')), 3)
+        self.assertEqual(self.search('lovelace'), [])
+
+    def test_deleted_course_leaves_index(self):
+        """Test that deleting a course removes it from search results"""
+        self.other.delete()
+        self.assertEqual(self.search('javascript'), [])
+
+    def test_search_syntax_is_ignored(self):
+        """Test that FTS operators in user input are treated as plain words"""
+        self.assertEqual(self.search('neural* "networks('), [self.title_match, self.description_match])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_course_list_uses_index(self):
+        """Test that the course list searches through the index"""
+        response = self.client.get(reverse('courses:course_list'), {'q': 'bootcamp'})
+        self.assertEqual(list(response.context['page_obj']), [self.title_match])
+
+    def test_missing_index_is_looked_up_again(self):
+        """Test that a worker that found no index notices it once the migration has run"""
+        from . import search
+        self.addCleanup(search._available.pop, connection.alias, None)
+        search._available[connection.alias] = time.monotonic()
+        self.assertIsNone(search.get_backend())
+        search._available[connection.alias] = time.monotonic() - search.INDEX_RECHECK_SECONDS - 1
+        self.assertIsNotNone(search.get_backend())
+        self.assertEqual(self.search('bootcamp'), [self.title_match])
+
+
+class AutocompleteTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        course_index.clear()
+        self.addCleanup(course_index.clear)
+        self.user = User.objects.create_user(
+            username='gvr',
+            first_name='Guido',
+            last_name='Rossum',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(name='Programming')
+        self.python = self.create_course('Python Fundamentals', students_enrolled=50)
+        self.pytorch = self.create_course('Deep Learning with PyTorch', students_enrolled=500)
+        self.create_course('Python Internals', is_published=False)
+        course_index.build()
+
+    def create_course(self, title, students_enrolled=0, is_published=True):
+        return Course.objects.create(
+            title=title,
+            description=title,
+            category=self.category,
+            instructor=self.user,
+            price=Decimal('10.00'),
+            duration='1 hour',
+            students_enrolled=students_enrolled,
+            is_published=is_published
+        )
+
+    def titles(self, query):
+        return [entry.title for entry in course_index.search(query)]
+
+    def test_prefix_matches_without_queries(self):
+        """Test that suggestions are answered without touching the database"""
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles('py'), ['Python Fundamentals', 'Deep Learning with PyTorch'])
+            self.assertEqual(self.titles('deep py'), ['Deep Learning with PyTorch'])
+            self.assertEqual(self.titles('rossum prog'), ['Deep Learning with PyTorch', 'Python Fundamentals'])
+
+    def test_typos_fall_back_to_trigrams(self):
+        """Test that misspelled words still find the course"""
+        self.assertEqual(self.titles('pythn'), ['Python Fundamentals'])
+
+    def test_index_follows_course_saves(self):
+        """Test that saving, unpublishing and deleting courses updates the index"""
+        rust = self.create_course('Rust for Pythonistas')
+        self.assertEqual(self.titles('rust'), ['Rust for Pythonistas'])
+
+        rust.is_published = False
+        rust.save()
+        self.assertEqual(self.titles('rust'), [])
+
+        self.python.delete()
+        self.assertEqual(self.titles('fundamentals'), [])
+
+    def test_rebuilds_after_change_in_another_process(self):
+        """Test that a bumped generation triggers a rebuild"""
+        Course.objects.filter(pk=self.python.pk).update(title='Python Cookbook')
+        bump_generation(AUTOCOMPLETE)
+        course_index._checked_at = 0
+        self.assertEqual(self.titles('cookbook'), ['Python Cookbook'])
+
+    def test_endpoint(self):
+        """Test that the endpoint returns JSON suggestions"""
+        response = self.client.get(reverse('courses:autocomplete'), {'q': 'pyt', 'limit': 1})
+        self.assertEqual(response.json(), {
+            'query': 'pyt',
+            'results': [{
+                'title': 'Python Fundamentals',
+                'url': self.python.get_absolute_url(),
+                'category': 'Programming',
+                'instructor': 'Guido Rossum',
+            }],
+        })
+
+
+class CursorPaginationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='instructor', password='testpass123')
+        self.category = Category.objects.create(name='Programming')
+        # Repeated prices, ratings and enrollments so ties must be broken by id
+        for i in range(20):
+            Course.objects.create(
+                title=f'Course {i}',
+                description='Description',
+                category=self.category,
+                instructor=self.user,
+                price=Decimal(10 * (i % 4)),
+                rating=Decimal(i % 3),
+                students_enrolled=i % 5,
+                duration='1 hour',
+                is_published=True
+            )
+
+    def lazy_load(self, **params):
+        return self.client.get(
+            reverse('courses:lazy_load_courses'), params, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+
+    def test_pages_cover_every_course_once(self):
+        """Test that walking the cursors returns every course once, in sort order"""
+        for ordering in [('-created_at', '-id'), ('effective_price', 'id'), ('-rating', '-id'), ('-students_enrolled', '-id')]:
+            paginator = CursorPaginator(Course.objects.all(), ordering, 6)
+            seen = []
+            cursor = None
+            while True:
+                page = paginator.page(cursor)
+                seen.extend(course.pk for course in page)
+                if not page.has_next():
+                    break
+                cursor = page.next_cursor
+            expected = list(Course.objects.order_by(*ordering).values_list('pk', flat=True))
+            self.assertEqual(seen, expected, ordering)
+
+    def test_lazy_load_never_counts(self):
+        """Test that cursor pages skip COUNT and keep a constant query count"""
+        cursor = None
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                data = self.lazy_load(sort='price_low', cursor=cursor or '').json()
+            self.assertNotIn('total_pages', data)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+            self.assertTrue(data['has_next'])
+            cursor = data['next_cursor']
+
+    def test_course_list_hands_over_to_cursor(self):
+        """Test that infinite scroll continues right after the rendered page"""
+        response = self.client.get(reverse('courses:course_list'), {'sort': 'students'})
+        rendered = [course.pk for course in response.context['page_obj']]
+        data = self.lazy_load(sort='students', cursor=response.context['next_cursor']).json()
+
+        expected = list(Course.objects.order_by('-students_enrolled', '-id').values_list('pk', flat=True))
+        self.assertEqual(rendered, expected[:8])
+        for pk in expected[8:16]:
+            self.assertIn(Course.objects.get(pk=pk).get_absolute_url(), data['html'])
+
+    def test_page_numbers_still_supported(self):
+        """Test that the older page parameter keeps working"""
+        data = self.lazy_load(page=3).json()
+        self.assertEqual((data['current_page'], data['total_pages'], data['has_next']), (3, 3, False))
+
+    def test_invalid_cursor(self):
+        """Test that tampered or mismatched cursors are rejected"""
+        self.assertEqual(self.lazy_load(cursor='garbage').status_code, 400)
+        cursor = self.lazy_load(sort='rating').json()['next_cursor']
+        self.assertEqual(self.lazy_load(sort='students', cursor=cursor).status_code, 400)
+
+
+class CourseFacetTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='instructor', password='testpass123')
+        self.ml = Category.objects.create(name='Machine Learning')
+        self.web = Category.objects.create(name='Web Development')
+        for category, difficulty, price in [
+            (self.ml, 'beginner', '0.00'),
+            (self.ml, 'beginner', '1500.00'),
+            (self.ml, 'advanced', '8000.00'),
+            (self.web, 'beginner', '3500.00'),
+            (self.web, 'intermediate', '0.00'),
+        ]:
+            self.create_course(category, difficulty, price)
+
+    def create_course(self, category, difficulty, price, title='Course'):
+        return Course.objects.create(
+            title=title,
+            description='Description',
+            category=category,
+            instructor=self.user,
+            price=Decimal(price),
+            difficulty=difficulty,
+            duration='1 hour',
+            is_published=True
+        )
+
+    def counts(self, facets, name):
+        return {facet.value: facet.count for facet in facets[name]}
+
+    def facets(self, **params):
+        return course_facets(Course.objects.filter(is_published=True), params)
+
+    def test_counts_in_one_query(self):
+        """Test that every facet is counted by a single grouped query"""
+        with self.assertNumQueries(1):
+            facets = self.facets()
+        self.assertEqual(self.counts(facets, 'categories'), {self.ml.pk: 3, self.web.pk: 2})
+        self.assertEqual(self.counts(facets, 'difficulties'), {'beginner': 3, 'intermediate': 1, 'advanced': 1})
+        self.assertEqual(
+            self.counts(facets, 'prices'),
+            {'free': 2, 'paid': 3, 'under_2000': 1, '2000_to_5000': 1, 'over_5000': 1}
+        )
+
+    def test_facets_ignore_their_own_selection(self):
+        """Test that each facet is narrowed by the other selections only"""
+        facets = self.facets(category=str(self.ml.pk), difficulty='beginner')
+        self.assertEqual(self.counts(facets, 'categories'), {self.ml.pk: 2, self.web.pk: 1})
+        self.assertEqual(self.counts(facets, 'difficulties'), {'beginner': 2, 'intermediate': 0, 'advanced': 1})
+        self.assertEqual(self.counts(facets, 'prices')['free'], 1)
+        self.assertTrue(facets['categories'][0].selected)
+
+    def test_cached_until_catalog_changes(self):
+        """Test that facets are cached per filter state and expire on course saves"""
+        self.facets(difficulty='beginner')
+        with self.assertNumQueries(0):
+            self.facets(difficulty='beginner', sort='rating')
+
+        self.create_course(self.web, 'beginner', '10.00')
+        facets = self.facets(difficulty='beginner')
+        self.assertEqual(self.counts(facets, 'categories'), {self.ml.pk: 2, self.web.pk: 2})
+
+    def test_local_cache_keeps_facets_briefly(self):
+        """Test that facets cached per worker expire as soon as other invalidated entries"""
+        with mock.patch('courses.facets.cache.set') as cache_set:
+            self.facets()
+        self.assertEqual(cache_set.call_args.args[2], LOCAL_CACHE_TIMEOUT)
+
+    def test_course_list_shows_counts(self):
+        """Test that the course list filters show facet counts"""
+        response = self.client.get(reverse('courses:course_list'), {'price': 'under_2000'})
+        self.assertContains(response, 'Machine Learning (1)')
+        self.assertContains(response, 'Free (2)')
+        self.assertContains(response, 'Under PKR 2,000 (1)')
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_facets_follow_search(self):
+        """Test that facet counts are limited to search results"""
+        self.create_course(self.web, 'advanced', '20.00', title='Django Deep Dive')
+        response = self.client.get(reverse('courses:course_list'), {'q': 'django'})
+        self.assertContains(response, 'Web Development (1)')
+        self.assertNotContains(response, 'Machine Learning (')
+
+
+class CourseCardCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='student', password='testpass123')
+        self.category = Category.objects.create(name='Programming')
+        self.courses = [
+            Course.objects.create(
+                title=f'Course {i}',
+                description='Description',
+                category=self.category,
+                instructor=self.user,
+                price=Decimal('50.00'),
+                duration='1 hour',
+                is_published=True
+            )
+            for i in range(3)
+        ]
+
+    def course_list(self):
+        return self.client.get(reverse('courses:course_list')).content.decode()
+
+    def test_cards_are_reused_until_the_course_changes(self):
+        """Test that only the saved course's card is rendered again"""
+        self.course_list()
+        first, second = self.courses[:2]
+        # Bypass save() so updated_at stays the same and the cached card is served
+        Course.objects.filter(pk=first.pk).update(title='Renamed quietly')
+        second.title = 'Renamed properly'
+        second.save()
+
+        html = self.course_list()
+        self.assertNotIn('Renamed quietly', html)
+        self.assertIn('Renamed properly', html)
+
+    def test_pricing_changes_invalidate_cards(self):
+        """Test that a new global discount re-renders every card"""
+        self.course_list()
+        GlobalDiscount.objects.create(
+            title='Sale',
+            discount_percentage=50,
+            end_date=timezone.now() + timedelta(days=1),
+            is_active=True
+        )
+        self.assertEqual(self.course_list().count('PKR 25.00'), 3)
+
+    def test_admin_discount_actions_refresh_cached_cards(self):
+        """Test that toggling course discounts from the admin shows the new price on cached pages"""
+        course = self.courses[0]
+        course.discount_price = Decimal('20.00')
+        course.discount_end_date = timezone.now() + timedelta(days=1)
+        course.save()
+        self.assertNotIn('PKR 20.00', self.course_list())
+
+        admin_user = User.objects.create_superuser(username='admin', password='testpass123')
+        admin_client = self.client_class()
+        admin_client.force_login(admin_user)
+        changelist = reverse('admin:courses_course_changelist')
+        admin_client.post(changelist, {'action': 'activate_discounts', '_selected_action': [course.pk]})
+        self.assertIn('PKR 20.00', self.course_list())
+
+        admin_client.post(changelist, {'action': 'deactivate_discounts', '_selected_action': [course.pk]})
+        self.assertNotIn('PKR 20.00', self.course_list())
+
+    def test_instructor_renames_refresh_cards(self):
+        """Test that cards show the instructor's new name without the course being saved"""
+        self.client.force_login(User.objects.create_user(username='viewer', password='testpass123'))
+        self.assertIn('by student', self.course_list())
+        self.user.first_name, self.user.last_name = 'Ada', 'Lovelace'
+        self.user.save()
+        html = self.course_list()
+        self.assertEqual(html.count('by Ada Lovelace'), 3)
+
+    def test_cards_vary_by_viewer(self):
+        """Test that anonymous, student and enrolled viewers get their own footer"""
+        payment_url = reverse('payment_system:payment_page', args=[self.courses[1].slug])
+        self.assertIn(f'?next={payment_url}', self.course_list())
+
+        self.client.force_login(self.user)
+        Enrollment.objects.create(student=self.user, course=self.courses[0])
+        html = self.course_list()
+        self.assertEqual(html.count('Continue Learning'), 1)
+        self.assertIn(f'href="{payment_url}"', html)
+
+    def test_lazy_load_uses_the_same_cards(self):
+        """Test that lazy-loaded cards come from the shared card cache"""
+        self.course_list()
+        Course.objects.filter(pk=self.courses[0].pk).update(title='Renamed quietly')
+        response = self.client.get(reverse('courses:lazy_load_courses'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertIn('Course 0', response.json()['html'])
+
+
+class AnonymousPageCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Creating the settings row on first render would bump its generation
+        SiteSettings.get_settings()
+        self.user = User.objects.create_user(username='student', password='testpass123')
+        self.category = Category.objects.create(name='Programming')
+        self.course = Course.objects.create(
+            title='Cached Course',
+            description='Description',
+            category=self.category,
+            instructor=self.user,
+            price=Decimal('50.00'),
+            duration='1 hour',
+            is_published=True
+        )
+
+    def test_second_visit_is_served_from_cache(self):
+        """Test that repeat anonymous visits run no queries"""
+        for name, args in [('courses:home', []), ('courses:course_list', []), ('courses:course_detail', [self.course.slug])]:
+            url = reverse(name, args=args)
+            self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertEqual(response['X-Page-Cache'], 'HIT')
+            self.assertContains(response, 'Cached Course')
+
+    def test_key_varies_by_query_and_device(self):
+        """Test that parameter order is normalized and phones get their own copy"""
+        factory = RequestFactory()
+        url = reverse('courses:course_list')
+        self.assertEqual(
+            page_cache_key(factory.get(url, {'a': 1, 'b': 2})),
+            page_cache_key(factory.get(f'{url}?b=2&a=1')),
+        )
+        self.assertNotEqual(
+            page_cache_key(factory.get(url)),
+            page_cache_key(factory.get(url, HTTP_USER_AGENT='Mozilla/5.0 (iPhone)')),
+        )
+
+    def test_logged_in_users_bypass_the_cache(self):
+        """Test that authenticated requests are never cached"""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('courses:home'))
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+    def test_stale_copy_served_while_another_worker_rebuilds(self):
+        """Test stampede protection after an invalidation"""
+        url = reverse('courses:course_list')
+        self.client.get(url)
+        bump_generation(BANNERS)
+
+        lock_key = f'{page_cache_key(RequestFactory().get(url))}:rebuild'
+        cache.add(lock_key, 1)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'STALE')
+
+        cache.delete(lock_key)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+
+    def test_cold_miss_waits_for_the_worker_rendering_it(self):
+        """Test that without a cached copy only the lock holder renders and the rest wait for it"""
+        url = reverse('courses:course_list')
+        cache_key = page_cache_key(RequestFactory().get(url))
+        self.client.get(url)
+        rendered = cache.get(cache_key)
+        cache.delete(cache_key)
+        cache.add(f'{cache_key}:rebuild', 1)
+
+        # The other worker finishes while this request waits
+        with mock.patch('courses.page_cache.time.sleep', side_effect=lambda _: cache.set(cache_key, rendered)):
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+
+        # It never finishes: render without touching the cache
+        cache.delete(cache_key)
+        with mock.patch('courses.page_cache.COLD_MISS_WAIT_SECONDS', 0.01):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'BYPASS')
+        self.assertContains(response, 'Cached Course')
+        self.assertIsNone(cache.get(cache_key))
+
+    def test_course_changes_expire_pages(self):
+        """Test that saving a course invalidates cached catalog pages"""
+        url = reverse('courses:course_list')
+        self.client.get(url)
+        self.course.title = 'Renamed Course'
+        self.course.save()
+        self.assertContains(self.client.get(url), 'Renamed Course')
+
+
+class LessonDetailTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        SiteSettings.get_settings()
+        self.user = User.objects.create_user(username='student', password='testpass123')
+        self.category = Category.objects.create(name='Programming')
+        self.client.force_login(self.user)
+
+    def _course_with_lessons(self, title, count):
+        course = Course.objects.create(
+            title=title,
+            description='Description',
+            category=self.category,
+            instructor=self.user,
+            price=Decimal('0.00'),
+            duration='1 hour',
+            is_published=True
+        )
+        Lesson.objects.bulk_create(
+            Lesson(course=course, title=f'Lesson {i}', duration=5, order=i) for i in range(count)
+        )
+        return course, list(course.lessons.order_by('order', 'id'))
+
+    def _lesson_queries(self, course, lesson):
+        url = reverse('courses:lesson_detail', args=[course.slug, lesson.id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_lessons(self):
+        """Test that a long course opens in as many queries as a short one"""
+        short_course, short_lessons = self._course_with_lessons('Short Course', 3)
+        long_course, long_lessons = self._course_with_lessons('Long Course', 200)
+        self.assertEqual(
+            self._lesson_queries(long_course, long_lessons[100]),
+            self._lesson_queries(short_course, short_lessons[1]),
+        )
+
+    def test_progress_and_navigation(self):
+        """Test that viewing writes no progress row and neighbours are linked"""
+        course, lessons = self._course_with_lessons('Navigation Course', 5)
+        CourseProgress.objects.create(student=self.user, lesson=lessons[0], completed=True)
+
+        response = self.client.get(reverse('courses:lesson_detail', args=[course.slug, lessons[2].id]))
+        self.assertEqual(response.context['prev_lesson'], lessons[1])
+        self.assertEqual(response.context['next_lesson'], lessons[3])
+        self.assertEqual(response.context['completed_lessons'], 1)
+        self.assertEqual(response.context['progress_percentage'], 20.0)
+        self.assertEqual(CourseProgress.objects.filter(student=self.user).count(), 1)
+
+    def test_lesson_of_another_course_is_not_found(self):
+        """Test that a lesson id from a different course returns 404"""
+        course, _ = self._course_with_lessons('First Course', 1)
+        _, other_lessons = self._course_with_lessons('Second Course', 1)
+        response = self.client.get(reverse('courses:lesson_detail', args=[course.slug, other_lessons[0].id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class MyCoursesProgressTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        SiteSettings.get_settings()
+        self.user = User.objects.create_user(username='student', password='testpass123')
+        self.category = Category.objects.create(name='Programming')
+        self.client.force_login(self.user)
+
+    def _enroll(self, title, lesson_count, completed=0):
+        course = Course.objects.create(
+            title=title,
+            description='Description',
+            category=self.category,
+            instructor=self.user,
+            price=Decimal('0.00'),
+            duration='1 hour',
+            is_published=True
+        )
+        lessons = Lesson.objects.bulk_create(
+            Lesson(course=course, title=f'Lesson {i}', duration=5, order=i) for i in range(lesson_count)
+        )
+        CourseProgress.objects.bulk_create(
+            CourseProgress(student=self.user, lesson=lesson, completed=True) for lesson in lessons[:completed]
+        )
+        return Enrollment.objects.create(student=self.user, course=course)
+
+    def _page_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('courses:my_courses'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_progress_counts(self):
+        """Test that completed and total lessons are counted per enrollment"""
+        self._enroll('Half Done', 4, completed=2)
+        self._enroll('Not Started', 3)
+        _, response = self._page_queries()
+
+        progress = {e.course.title: (e.completed_lessons, e.total_lessons, e.progress_percentage)
+                    for e in response.context['enrollments']}
+        self.assertEqual(progress, {'Half Done': (2, 4, 50.0), 'Not Started': (0, 3, 0)})
+        self.assertEqual(response.context['completed_lessons'], 2)
+        self.assertEqual(response.context['total_lessons'], 7)
+        # Viewing the page never writes empty progress rows
+        self.assertEqual(CourseProgress.objects.count(), 2)
+
+    def test_query_count_does_not_grow_with_enrollments(self):
+        """Test that the page costs the same with one course or many"""
+        self._enroll('First Course', 5, completed=1)
+        self._page_queries()
+        one_course, _ = self._page_queries()
+        for i in range(5):
+            self._enroll(f'Course {i}', 20, completed=i)
+        self.assertEqual(self._page_queries()[0], one_course)
+
+
+@override_settings(PROGRESS_FLUSH_INTERVAL=0)
+class ProgressCounterTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='testpass123')
+        self.client.force_login(self.user)
+        self.course = Course.objects.create(
+            title='Counted Course',
+            description='Description',
+            category=Category.objects.create(name='Programming'),
+            instructor=self.user,
+            price=Decimal('0.00'),
+            duration='1 hour',
+            is_published=True
+        )
+        self.lessons = [
+            Lesson.objects.create(course=self.course, title=f'Lesson {i}', duration=5, order=i) for i in range(2)
+        ]
+        self.enrollment = Enrollment.objects.create(student=self.user, course=self.course)
+
+    def _complete(self, lesson):
+        response = self.client.post(reverse('courses:mark_lesson_complete', args=[lesson.id]))
+        self.assertEqual(response.status_code, 200)
+        self.enrollment.refresh_from_db()
+
+    def test_completion_updates_counters(self):
+        """Test that completing lessons bumps the counters once and finishes the course"""
+        self.assertEqual(self.enrollment.total_lessons, 2)
+        self._complete(self.lessons[0])
+        self._complete(self.lessons[0])
+        self.assertEqual(self.enrollment.completed_lessons, 1)
+        self.assertEqual(self.enrollment.last_lesson, self.lessons[0])
+        self.assertIsNone(self.enrollment.completed_at)
+
+        self._complete(self.lessons[1])
+        self.assertEqual(self.enrollment.completed_lessons, 2)
+        self.assertIsNotNone(self.enrollment.completed_at)
+
+    def test_lesson_changes_update_counters(self):
+        """Test that adding and deleting lessons keeps the counters right"""
+        self._complete(self.lessons[0])
+        self._complete(self.lessons[1])
+
+        new_lesson = Lesson.objects.create(course=self.course, title='Bonus', duration=5, order=2)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.total_lessons, 3)
+        self.assertIsNone(self.enrollment.completed_at)
+
+        self.lessons[0].delete()
+        self.enrollment.refresh_from_db()
+        self.assertEqual((self.enrollment.completed_lessons, self.enrollment.total_lessons), (1, 2))
+
+        new_lesson.delete()
+        self.enrollment.refresh_from_db()
+        self.assertIsNotNone(self.enrollment.completed_at)
+
+    def test_recount_command_repairs_counters(self):
+        """Test that recount_progress fixes drifted counters"""
+        CourseProgress.objects.create(student=self.user, lesson=self.lessons[1], completed=True)
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(total_lessons=7, completed_lessons=5)
+
+        call_command('recount_progress', stdout=StringIO())
+        self.enrollment.refresh_from_db()
+        self.assertEqual((self.enrollment.completed_lessons, self.enrollment.total_lessons), (1, 2))
+        self.assertEqual(self.enrollment.last_lesson, self.lessons[1])
+
+
+class ProgressBufferTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', password='testpass123')
+        self.client.force_login(self.user)
+        self.course = Course.objects.create(
+            title='Buffered Course',
+            description='Description',
+            category=Category.objects.create(name='Programming'),
+            instructor=self.user,
+            price=Decimal('0.00'),
+            duration='1 hour',
+            is_published=True
+        )
+        self.lessons = [
+            Lesson.objects.create(course=self.course, title=f'Lesson {i}', duration=5, order=i) for i in range(3)
+        ]
+        self.enrollment = Enrollment.objects.create(student=self.user, course=self.course)
+        self.buffer = ProgressBuffer(flush_interval=60)
+
+    def tearDown(self):
+        self.buffer.cancel()
+        progress_buffer.cancel()
+        progress_buffer.flush()
+
+    def test_events_are_coalesced_and_flushed_in_one_batch(self):
+        """Test that repeated events collapse and a flush writes them with the counters"""
+        for _ in range(3):
+            self.buffer.record_completion(self.user.id, self.lessons[0])
+        self.buffer.record_completion(self.user.id, self.lessons[1])
+        self.buffer.record_position(self.user.id, self.lessons[1], 30)
+        self.buffer.record_position(self.user.id, self.lessons[2], 95)
+        self.assertFalse(CourseProgress.objects.exists())
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(CourseProgress.objects.filter(student=self.user).count(), 2)
+        self.assertEqual(self.enrollment.completed_lessons, 2)
+        self.assertEqual((self.enrollment.last_lesson, self.enrollment.last_position), (self.lessons[2], 95))
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_overlay_reads_own_unflushed_events(self):
+        """Test that pending events show up before they are written"""
+        CourseProgress.objects.create(student=self.user, lesson=self.lessons[0])
+        Enrollment.objects.filter(pk=self.enrollment.pk).recount_progress()
+        self.enrollment.refresh_from_db()
+        self.buffer.record_completion(self.user.id, self.lessons[0])
+        self.buffer.record_completion(self.user.id, self.lessons[1])
+        self.buffer.record_position(self.user.id, self.lessons[1], 42)
+
+        unwritten = self.buffer.apply_overlay(self.enrollment)
+        self.assertEqual(unwritten, {self.lessons[1].id})
+        self.assertEqual(self.enrollment.completed_lessons, 2)
+        self.assertEqual((self.enrollment.last_lesson_id, self.enrollment.last_position), (self.lessons[1].id, 42))
+
+    @override_settings(PROGRESS_FLUSH_INTERVAL=60)
+    def test_views_use_the_buffer(self):
+        """Test that completions and heartbeats are buffered but visible to the student"""
+        self.client.post(reverse('courses:mark_lesson_complete', args=[self.lessons[0].id]))
+        self.client.post(reverse('courses:lesson_heartbeat', args=[self.lessons[0].id]), {'position': '12.7'})
+        self.assertFalse(CourseProgress.objects.exists())
+
+        response = self.client.get(reverse('courses:lesson_detail', args=[self.course.slug, self.lessons[0].id]))
+        self.assertTrue(response.context['lesson_completed'])
+        self.assertEqual(response.context['completed_lessons'], 1)
+        self.assertEqual(response.context['resume_position'], 12)
+
+        progress_buffer.flush()
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_lessons, 1)
+        self.assertEqual(self.enrollment.last_position, 12)
+
+    def test_completion_does_not_resume_another_lessons_position(self):
+        """Test that completing a lesson after a heartbeat on another one resets the saved position"""
+        self.buffer.record_position(self.user.id, self.lessons[0], 42)
+        self.buffer.flush()
+        self.buffer.record_completion(self.user.id, self.lessons[1])
+        self.buffer.flush()
+
+        self.enrollment.refresh_from_db()
+        self.assertEqual((self.enrollment.last_lesson, self.enrollment.last_position), (self.lessons[1], 0))
+        response = self.client.get(reverse('courses:lesson_detail', args=[self.course.slug, self.lessons[1].id]))
+        self.assertEqual(response.context['resume_position'], 0)
+
+        # A heartbeat on the same lesson keeps its position through a recount
+        self.buffer.record_position(self.user.id, self.lessons[1], 30)
+        self.buffer.flush()
+        Enrollment.objects.filter(pk=self.enrollment.pk).recount_progress()
+        self.enrollment.refresh_from_db()
+        self.assertEqual((self.enrollment.last_lesson, self.enrollment.last_position), (self.lessons[1], 30))
+
+    def test_completions_increment_the_counters(self):
+        """Test that a flush adds to the stored counters and finishes the course"""
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(completed_lessons=1)
+        self.buffer.record_completion(self.user.id, self.lessons[0])
+        self.buffer.record_completion(self.user.id, self.lessons[2])
+        self.buffer.flush()
+
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_lessons, 3)
+        self.assertEqual(self.enrollment.last_lesson, self.lessons[2])
+        self.assertIsNotNone(self.enrollment.completed_at)
+
+    def test_heartbeat_rejects_invalid_position(self):
+        """Test that a non-numeric position is refused"""
+        response = self.client.post(reverse('courses:lesson_heartbeat', args=[self.lessons[0].id]), {'position': 'soon'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('courses:lesson_heartbeat', args=[self.lessons[0].id]), {'position': '-5'})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(PROGRESS_FLUSH_INTERVAL=60)
+    def test_heartbeat_position_is_capped_at_the_lesson_end(self):
+        """Test that a huge position is stored as the end of the lesson"""
+        response = self.client.post(reverse('courses:lesson_heartbeat', args=[self.lessons[0].id]), {'position': '1e30'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(progress_buffer.flush(), 1)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.last_position, 5 * 60)
+
+    def test_events_of_deleted_lessons_and_enrollments_are_dropped(self):
+        """Test that events whose lesson or enrollment is gone do not block the batch"""
+        other = User.objects.create_user(username='other', password='testpass123')
+        other_enrollment = Enrollment.objects.create(student=other, course=self.course)
+        self.buffer.record_completion(self.user.id, self.lessons[2])
+        self.buffer.record_position(self.user.id, self.lessons[2], 40)
+        self.buffer.record_completion(other.id, self.lessons[0])
+        self.buffer.record_completion(self.user.id, self.lessons[0])
+        self.lessons[2].delete()
+        other_enrollment.delete()
+
+        self.buffer.flush()
+        self.assertEqual(list(CourseProgress.objects.values_list('student', 'lesson')), [(self.user.id, self.lessons[0].id)])
+        self.assertEqual(self.buffer.pending_completions(self.user.id, self.course.id), set())
+
+    def test_failing_event_is_isolated_and_dropped(self):
+        """Test that an event the database refuses is retried alone and finally dropped"""
+        key = (self.user.id, self.lessons[0].id)
+        self.buffer._pending[key] = ProgressEvent(course_id=self.course.id, position=10 ** 30)
+        self.buffer.record_completion(self.user.id, self.lessons[1])
+
+        with self.assertLogs('courses.progress_buffer', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 1)
+        self.assertTrue(CourseProgress.objects.filter(lesson=self.lessons[1]).exists())
+        self.assertIn(key, self.buffer._pending)
+
+        with self.assertLogs('courses.progress_buffer', 'ERROR'):
+            for _ in range(MAX_FLUSH_ATTEMPTS - 1):
+                self.buffer.flush()
+        self.assertEqual(self.buffer._pending, {})
+
+
+class RatingAggregateTestCase(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='instructor', password='testpass123')
+        self.course = Course.objects.create(
+            title='Rated Course',
+            description='Description',
+            category=Category.objects.create(name='Programming'),
+            instructor=self.instructor,
+            price=Decimal('0.00'),
+            duration='1 hour',
+            is_published=True
+        )
+        self.students = [User.objects.create_user(username=f'student{i}', password='testpass123') for i in range(3)]
+
+    def _review(self, student, rating, **kwargs):
+        return Review.objects.create(student=student, course=self.course, rating=rating, comment='Comment', **kwargs)
+
+    def _aggregates(self):
+        self.course.refresh_from_db()
+        return self.course.total_ratings, self.course.rating_sum, self.course.rating, self.course.get_rating_distribution()
+
+    def test_reviews_adjust_aggregates(self):
+        """Test that creating, editing, hiding and deleting reviews move the counts"""
+        first = self._review(self.students[0], 5)
+        self._review(self.students[1], 4)
+        self._review(self.students[2], 1, is_moderated=False)
+        self.assertEqual(self._aggregates(), (2, 9, Decimal('4.50'), {1: 0, 2: 0, 3: 0, 4: 1, 5: 1}))
+
+        first = Review.objects.get(pk=first.pk)
+        first.rating = 2
+        first.save()
+        self.assertEqual(self._aggregates(), (2, 6, Decimal('3.00'), {1: 0, 2: 1, 3: 0, 4: 1, 5: 0}))
+
+        first.is_moderated = False
+        first.save()
+        self.assertEqual(self._aggregates()[:3], (1, 4, Decimal('4.00')))
+
+        Review.objects.filter(student=self.students[1]).delete()
+        self.assertEqual(self._aggregates()[:3], (0, 0, Decimal('0.00')))
+
+    def test_admin_approval_counts_reviews(self):
+        """Test that the bulk approve action updates the aggregates"""
+        from django.contrib.admin.sites import site
+        from .admin import ReviewAdmin
+
+        self._review(self.students[0], 3, is_moderated=False)
+        self._review(self.students[1], 5)
+        from django.contrib.messages.storage.cookie import CookieStorage
+
+        request = RequestFactory().post('/')
+        request.user = self.instructor
+        request._messages = CookieStorage(request)
+        ReviewAdmin(Review, site).approve_reviews(request, Review.objects.all())
+        self.assertEqual(self._aggregates()[:3], (2, 8, Decimal('4.00')))
+
+    def test_concurrent_approval_counts_reviews_once(self):
+        """Test that reviews another moderator approved first are not counted twice"""
+        first = self._review(self.students[0], 5, is_moderated=False)
+        self._review(self.students[1], 3, is_moderated=False)
+        now = timezone.now
+        raced = []
+
+        def other_moderator_first():
+            # Runs between reading the pending reviews and updating them
+            if not raced:
+                raced.append(True)
+                approve_reviews(Review.objects.filter(pk=first.pk), self.instructor)
+            return now()
+
+        with mock.patch('courses.moderation.timezone.now', side_effect=other_moderator_first):
+            self.assertEqual(approve_reviews(Review.objects.all(), self.instructor), 1)
+        self.assertEqual(self._aggregates()[:3], (2, 8, Decimal('4.00')))
+
+    def test_distribution_reads_no_queries(self):
+        """Test that the histogram and percentages come from the course row"""
+        self._review(self.students[0], 5)
+        self._review(self.students[1], 3)
+        self.course.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.course.get_rating_percentage(5), 50.0)
+            self.assertEqual(self.course.get_rating_distribution()[3], 1)
+
+    def test_recount_command_repairs_drift(self):
+        """Test that recount_ratings rebuilds the aggregates from reviews"""
+        self._review(self.students[0], 4)
+        Course.objects.filter(pk=self.course.pk).update(total_ratings=50, rating_sum=3, rating_count_4=0)
+        call_command('recount_ratings', stdout=StringIO())
+        self.assertEqual(self._aggregates(), (1, 4, Decimal('4.00'), {1: 0, 2: 0, 3: 0, 4: 1, 5: 0}))
+
+
+class RatingStatsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        SiteSettings.get_settings()
+        self.instructor = User.objects.create_user(username='instructor', password='testpass123')
+        self.category = Category.objects.create(name='Programming')
+        self.client.force_login(self.instructor)
+
+    def _course_with_reviews(self, title, count):
+        course = Course.objects.create(
+            title=title,
+            description='Description',
+            category=self.category,
+            instructor=self.instructor,
+            price=Decimal('0.00'),
+            duration='1 hour',
+            is_published=True
+        )
+        for i in range(count):
+            student = User.objects.create_user(username=f'{course.slug}-{i}', password='testpass123')
+            Review.objects.create(student=student, course=course, rating=i % 5 + 1, comment='Comment',
+                                  is_helpful=i % 2 == 0)
+        return course
+
+    def test_stats_come_from_one_cached_query(self):
+        """Test that every figure is computed in one query and then cached"""
+        course = self._course_with_reviews('Stats Course', 4)
+        with self.assertNumQueries(1):
+            stats = get_rating_stats(course)
+        with self.assertNumQueries(0):
+            get_rating_stats(course)
+
+        self.assertEqual(stats['total_reviews'], 4)
+        self.assertEqual(stats['average_rating'], 2.5)
+        self.assertEqual(stats['rating_distribution'], {1: 1, 2: 1, 3: 1, 4: 1, 5: 0})
+        self.assertEqual(stats['rating_distribution_with_percentages'][1], {'count': 1, 'percentage': 25.0})
+        self.assertEqual(stats['helpful_reviews'], 2)
+
+    def test_review_changes_invalidate_stats(self):
+        """Test that adding a review refreshes the cached statistics"""
+        course = self._course_with_reviews('Changing Course', 1)
+        get_rating_stats(course)
+        student = User.objects.create_user(username='late', password='testpass123')
+        Review.objects.create(student=student, course=course, rating=5, comment='Comment')
+        self.assertEqual(get_rating_stats(course)['total_reviews'], 2)
+
+    def test_views_do_not_query_per_review_or_star(self):
+        """Test that detail and analytics pages cost the same with few or many reviews"""
+        small = self._course_with_reviews('Small Course', 2)
+        large = self._course_with_reviews('Large Course', 25)
+        for name in ['courses:course_detail', 'courses:review_analytics']:
+            counts = []
+            for course in (small, large):
+                cache.clear()
+                SiteSettings.get_settings()
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(self.client.get(reverse(name, args=[course.slug])).status_code, 200)
+                counts.append(len(queries))
+                # Review list (and its count) plus the one statistics query
+                review_queries = [q for q in queries if 'FROM "courses_review"' in q['sql']]
+                self.assertLessEqual(len(review_queries), 3, name)
+            self.assertEqual(counts[0], counts[1], name)
+
+
+class HelpfulVoteTestCase(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='author', password='testpass123')
+        self.voter = User.objects.create_user(username='voter', password='testpass123')
+        self.course = Course.objects.create(
+            title='Voted Course',
+            description='Description',
+            category=Category.objects.create(name='Programming'),
+            instructor=author,
+            price=Decimal('0.00'),
+            duration='1 hour',
+            is_published=True
+        )
+        self.review = Review.objects.create(student=author, course=self.course, rating=4, comment='Comment')
+        self.client.force_login(self.voter)
+
+    def _toggle(self):
+        response = self.client.post(reverse('courses:mark_review_helpful', args=[self.review.id]))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_toggle_adds_and_withdraws_vote(self):
+        """Test that voting twice withdraws the vote and keeps the count in step"""
+        self.assertEqual(self._toggle(), {'success': True, 'helpful': True, 'count': 1})
+        self.assertTrue(self.review.helpful_votes.filter(pk=self.voter.pk).exists())
+        self.assertEqual(self._toggle(), {'success': True, 'helpful': False, 'count': 0})
+        self.assertFalse(self.review.helpful_votes.exists())
+
+    def test_toggle_leaves_rating_aggregates_alone(self):
+        """Test that a vote neither saves the review nor touches the course"""
+        updated_at = Course.objects.get(pk=self.course.pk).updated_at
+        with CaptureQueriesContext(connection) as queries:
+            self.review.toggle_helpful_vote(self.voter)
+        # Delete attempt, insert, counter update and re-read, besides savepoints
+        statements = [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(statements), 4)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).updated_at, updated_at)
+
+
+class ReviewModerationTestCase(TestCase):
+    def setUp(self):
+        self.moderator = User.objects.create_user(username='moderator', password='testpass123', is_staff=True)
+        category = Category.objects.create(name='Programming')
+        self.courses = [
+            Course.objects.create(
+                title=f'Moderated Course {i}',
+                description='Description',
+                category=category,
+                instructor=self.moderator,
+                price=Decimal('0.00'),
+                duration='1 hour',
+                is_published=True
+            )
+            for i in range(2)
+        ]
+        students = [User.objects.create_user(username=f'student{i}', password='testpass123') for i in range(3)]
+        for course in self.courses:
+            for rating, student in enumerate(students, start=3):
+                Review.objects.create(student=student, course=course, rating=rating, comment='Comment',
+                                      is_moderated=False)
+
+    def _course_updates(self, queries):
+        return [q['sql'] for q in queries if q['sql'].startswith('UPDATE "courses_course"')]
+
+    def test_approve_updates_each_course_once(self):
+        """Test that a bulk approval records the moderator and counts each course once"""
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(approve_reviews(Review.objects.all(), self.moderator), 6)
+        self.assertEqual(len(self._course_updates(queries)), 2)
+        self.assertFalse(Review.objects.exclude(moderated_by=self.moderator).exists())
+        self.assertFalse(Review.objects.filter(moderated_at__isnull=True).exists())
+        for course in self.courses:
+            course.refresh_from_db()
+            self.assertEqual((course.total_ratings, course.rating_sum, course.rating), (3, 12, Decimal('4.00')))
+
+        # Approving again changes nothing
+        self.assertEqual(approve_reviews(Review.objects.all(), self.moderator), 0)
+
+    def test_reject_updates_each_course_once(self):
+        """Test that rejecting approved reviews takes them out with one update per course"""
+        approve_reviews(Review.objects.all(), self.moderator)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(reject_reviews(Review.objects.filter(rating__gte=4)), 4)
+        self.assertEqual(len(self._course_updates(queries)), 2)
+        for course in self.courses:
+            course.refresh_from_db()
+            self.assertEqual((course.total_ratings, course.rating_sum), (1, 3))
+            self.assertEqual(course.get_rating_distribution(), {1: 0, 2: 0, 3: 1, 4: 0, 5: 0})
+
+    def test_moderation_page_handles_selected_reviews(self):
+        """Test that the moderation page approves and rejects every ticked review"""
+        self.client.force_login(self.moderator)
+        url = reverse('courses:moderate_reviews')
+        first, second = self.courses
+        response = self.client.post(url, {
+            'action': 'approve',
+            'review_ids': list(first.reviews.values_list('id', flat=True)),
+        })
+        self.assertRedirects(response, url)
+        response = self.client.post(url, {
+            'action': 'reject',
+            'review_ids': list(second.reviews.values_list('id', flat=True)),
+        })
+        self.assertRedirects(response, url)
+        self.assertEqual(Review.objects.filter(is_moderated=True).count(), 3)
+        self.assertFalse(second.reviews.exists())
+        first.refresh_from_db()
+        self.assertEqual(first.total_ratings, 3)
@@ -1,16 +1,67 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Avg, Count
+from django.db.models import Q, Avg, Count, Prefetch
 from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from django.contrib.admin.views.decorators import staff_member_required
+from decimal import Decimal, InvalidOperation
 from .models import Course, Category, Enrollment, Review, CourseProgress, Lesson, Banner
 from .forms import ReviewForm, ReviewFilterForm, CourseRatingForm
+from .search import search_courses
+from .autocomplete import course_index
+from .pagination import CursorPaginator, InvalidCursor
+from .facets import PRICE_FILTERS, course_facets
+from .page_cache import cache_anonymous_page
+from .progress_buffer import MAX_POSITION, progress_buffer
+from .moderation import approve_reviews, reject_reviews
 from payment_system.models import Payment, PaymentMethod, PaymentSettings
 
+def _filter_by_price_range(courses, params):
+    """Filter courses to a price_min/price_max range of the effective price"""
+    price_min = params.get('price_min')
+    price_max = params.get('price_max')
+    try:
+        if price_min:
+            courses = courses.filter(effective_price__gte=Decimal(price_min))
+        if price_max:
+            courses = courses.filter(effective_price__lte=Decimal(price_max))
+    except InvalidOperation:
+        pass
+    return courses
+
+def _filter_by_price_bucket(courses, params):
+    """Filter courses to a price facet (free, paid or a price bucket)"""
+    price = params.get('price')
+    if price in PRICE_FILTERS:
+        courses = courses.filter(PRICE_FILTERS[price])
+    return courses
+
+def _filter_by_price(courses, params):
+    """Filter courses on the discounted price customers actually pay"""
+    return _filter_by_price_bucket(_filter_by_price_range(courses, params), params)
+
+# Sort options, each ending in a unique column so keyset pagination is stable
+COURSE_ORDERINGS = {
+    'price_low': ('effective_price', 'id'),
+    'price_high': ('-effective_price', '-id'),
+    'rating': ('-rating', '-id'),
+    'students': ('-students_enrolled', '-id'),
+}
+DEFAULT_COURSE_ORDERING = ('-created_at', '-id')
+COURSES_PER_PAGE = 8
+
+def _course_ordering(sort_by, query):
+    """Ordering for a sort option, or None to keep search relevance order"""
+    if sort_by in COURSE_ORDERINGS:
+        return COURSE_ORDERINGS[sort_by]
+    if query:
+        return None
+    return DEFAULT_COURSE_ORDERING
+
+@cache_anonymous_page
 def home(request):
     """Landing page with featured courses"""
     # Load only essential courses initially for better performance
@@ -50,6 +101,7 @@ def home(request):
     }
     return render(request, 'courses/home.html', context)
 
+@cache_anonymous_page
 def course_list(request):
     """List all published courses with filtering and search"""
     # Base queryset with optimization
@@ -58,13 +110,11 @@ def course_list(request):
     # Search functionality
     query = request.GET.get('q')
     if query:
-        courses = courses.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(category__name__icontains=query) |
-            Q(instructor__first_name__icontains=query) |
-            Q(instructor__last_name__icontains=query)
-        )
+        courses = search_courses(courses, query)
+    courses = _filter_by_price_range(courses, request.GET)
+    
+    # Facet counts for the filters, before the facets themselves are applied
+    facets = course_facets(courses, request.GET)
     
     # Category filter
     category_id = request.GET.get('category')
@@ -77,40 +127,32 @@ def course_list(request):
         courses = courses.filter(difficulty=difficulty)
     
     # Price filter
-    price_min = request.GET.get('price_min')
-    price_max = request.GET.get('price_max')
-    if price_min:
-        courses = courses.filter(price__gte=price_min)
-    if price_max:
-        courses = courses.filter(price__lte=price_max)
-    
-    # Sorting
+    courses = _filter_by_price_bucket(courses, request.GET)
+    
+    # Sorting (search results otherwise keep their relevance order)
     sort_by = request.GET.get('sort', '-created_at')
-    if sort_by == 'price_low':
-        courses = courses.order_by('price')
-    elif sort_by == 'price_high':
-        courses = courses.order_by('-price')
-    elif sort_by == 'rating':
-        courses = courses.order_by('-rating')
-    elif sort_by == 'students':
-        courses = courses.order_by('-students_enrolled')
-    else:
-        courses = courses.order_by('-created_at')
+    ordering = _course_ordering(sort_by, query)
+    if ordering:
+        courses = courses.order_by(*ordering)
     
     # Optimized pagination - smaller page size for better performance
-    paginator = Paginator(courses, 8)  # Reduced from 12 to 8 for faster loading
+    paginator = Paginator(courses, COURSES_PER_PAGE)  # Reduced from 12 to 8 for faster loading
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Get categories for filter (limited for performance)
-    categories = Category.objects.all()[:10]  # Limited to 10 categories
+    # Infinite scroll continues from the last course on this page by cursor
+    next_cursor = None
+    if page_obj.has_next():
+        next_cursor = CursorPaginator(courses, ordering, COURSES_PER_PAGE).cursor_after(
+            page_obj[-1], page_obj.end_index()
+        )
     
     # Get total count for performance metrics
-    total_courses = courses.count()
+    total_courses = paginator.count
     
     context = {
         'page_obj': page_obj,
-        'categories': categories,
+        'facets': facets,
         'current_category': category_id,
         'current_difficulty': difficulty,
         'current_sort': sort_by,
@@ -118,13 +160,15 @@ def course_list(request):
         'total_courses': total_courses,
         'has_next': page_obj.has_next(),
         'has_previous': page_obj.has_previous(),
+        'next_cursor': next_cursor,
     }
     return render(request, 'courses/course_list.html', context)
 
+@cache_anonymous_page
 def course_detail(request, slug):
     """Course detail page"""
     course = get_object_or_404(
-        Course.objects.select_related('category', 'instructor').prefetch_related('reviews', 'lessons'),
+        Course.objects.select_related('category', 'instructor').prefetch_related('lessons'),
         slug=slug, 
         is_published=True
     )
@@ -153,7 +197,7 @@ def course_detail(request, slug):
     
     # Get reviews with filtering
     review_filter_form = ReviewFilterForm(request.GET)
-    reviews = course.reviews.filter(is_moderated=True)
+    reviews = course.reviews.filter(is_moderated=True).select_related('student')
     
     # Apply filters
     if review_filter_form.is_valid():
@@ -186,20 +230,20 @@ def course_detail(request, slug):
     review_page = request.GET.get('review_page')
     review_page_obj = review_paginator.get_page(review_page)
     
-    # Get rating statistics
+    # Which reviews on this page the user found helpful, in one query
+    voted = set()
+    if request.user.is_authenticated:
+        voted = set(Review.helpful_votes.through.objects.filter(
+            user=request.user,
+            review__in=[review.id for review in review_page_obj],
+        ).values_list('review_id', flat=True))
+    for review in review_page_obj:
+        review.user_found_helpful = review.id in voted
+    
+    # Get rating statistics (one cached query)
     rating_form = CourseRatingForm(course)
     rating_stats = rating_form.get_rating_stats()
     
-    # Calculate rating distribution with percentages for template
-    rating_distribution_with_percentages = {}
-    for rating in range(1, 6):
-        count = rating_stats['rating_distribution'].get(rating, 0)
-        percentage = course.get_rating_percentage(rating)
-        rating_distribution_with_percentages[rating] = {
-            'count': count,
-            'percentage': percentage
-        }
-    
     # Get related courses
     related_courses = Course.objects.filter(
         category=course.category,
@@ -215,7 +259,7 @@ def course_detail(request, slug):
         'reviews': review_page_obj,
         'review_filter_form': review_filter_form,
         'rating_stats': rating_stats,
-        'rating_distribution_with_percentages': rating_distribution_with_percentages,
+        'rating_distribution_with_percentages': rating_stats['rating_distribution_with_percentages'],
         'related_courses': related_courses,
         'user_has_access': user_has_access,
         'is_enrolled': is_enrolled,
@@ -265,11 +309,10 @@ def course_learn(request, slug):
     enrollment = Enrollment.objects.filter(student=request.user, course=course).first()
     
     # Get lessons with optimization
-    lessons = course.lessons.all().order_by('order')
+    lessons = list(course.lessons.all())
     
     # Get user's completed lessons using CourseProgress
     completed_lessons = []
-    completed_count = 0
     if enrollment and request.user.is_authenticated:
         completed_progress = CourseProgress.objects.filter(
             student=request.user,
@@ -277,20 +320,21 @@ def course_learn(request, slug):
             completed=True
         ).select_related('lesson')
         completed_lessons = [progress.lesson for progress in completed_progress]
-        completed_count = len(completed_lessons)
+        unwritten = progress_buffer.apply_overlay(enrollment)
+        completed_lessons += [lesson for lesson in lessons if lesson.id in unwritten]
     
-    # Calculate progress percentage
-    total_lessons = lessons.count()
-    progress_percentage = (completed_count / total_lessons * 100) if total_lessons > 0 else 0
+    # Progress counters are stored on the enrollment
+    total_lessons = enrollment.total_lessons if enrollment else len(lessons)
+    progress_percentage = enrollment.progress_percentage if enrollment else 0
     
     context = {
         'course': course,
         'lessons': lessons,
         'enrollment': enrollment,
         'completed_lessons': completed_lessons,
-        'completed_count': completed_count,
+        'completed_count': enrollment.completed_lessons if enrollment else 0,
         'total_lessons': total_lessons,
-        'progress_percentage': round(progress_percentage, 1),
+        'progress_percentage': progress_percentage,
     }
     return render(request, 'courses/course_learn.html', context)
 
@@ -298,10 +342,19 @@ def course_learn(request, slug):
 def lesson_detail(request, slug, lesson_id):
     """Individual lesson page"""
     course = get_object_or_404(
-        Course.objects.select_related('category', 'instructor').prefetch_related('lessons'),
+        Course.objects.select_related('category', 'instructor').prefetch_related(
+            Prefetch('lessons', queryset=Lesson.objects.order_by('order', 'id'))
+        ),
         slug=slug
     )
-    lesson = get_object_or_404(Lesson, id=lesson_id, course=course)
+    # Navigation and the sidebar share one ordered list of the course's lessons
+    lessons = list(course.lessons.all())
+    positions = {course_lesson.id: index for index, course_lesson in enumerate(lessons)}
+    if lesson_id not in positions:
+        raise Http404('No Lesson matches the given query.')
+    current_index = positions[lesson_id]
+    lesson = lessons[current_index]
+    lesson.course = course
     
     # Check if user has access to this lesson
     if not lesson.user_has_access(request.user):
@@ -323,47 +376,31 @@ def lesson_detail(request, slug, lesson_id):
         course.students_enrolled += 1
         course.save()
     
-    # Get or create progress for this lesson
-    progress, created = CourseProgress.objects.get_or_create(
-        student=request.user,
-        lesson=lesson,
-        defaults={'completed': False}
-    )
-    
-    # Get all lessons and calculate overall progress
-    lessons = course.lessons.all()
-    completed_lessons = 0
-    total_lessons = lessons.count()
+    # Viewing a lesson writes nothing; only completions are stored
+    progress = CourseProgress.objects.filter(student=request.user, lesson=lesson, completed=True).first()
+    # Show the student's own progress events that are not flushed yet
+    unwritten = progress_buffer.apply_overlay(enrollment)
     
-    for course_lesson in lessons:
-        lesson_progress, created = CourseProgress.objects.get_or_create(
-            student=request.user,
-            lesson=course_lesson,
-            defaults={'completed': False}
-        )
-        if lesson_progress.completed:
-            completed_lessons += 1
-    
-    # Calculate progress percentage
-    progress_percentage = (completed_lessons / total_lessons * 100) if total_lessons > 0 else 0
+    completed_lessons = enrollment.completed_lessons
+    total_lessons = enrollment.total_lessons
     
     # Get next and previous lessons
-    lessons_list = list(lessons)
-    current_index = lessons_list.index(lesson)
-    next_lesson = lessons_list[current_index + 1] if current_index < len(lessons_list) - 1 else None
-    prev_lesson = lessons_list[current_index - 1] if current_index > 0 else None
+    next_lesson = lessons[current_index + 1] if current_index < len(lessons) - 1 else None
+    prev_lesson = lessons[current_index - 1] if current_index > 0 else None
     
     context = {
         'course': course,
+        'lessons': lessons,
         'lesson': lesson,
         'current_lesson': lesson,
         'progress': progress,
-        'lesson_completed': progress.completed,
+        'lesson_completed': progress is not None or lesson.id in unwritten,
+        'resume_position': enrollment.last_position if enrollment.last_lesson_id == lesson.id else 0,
         'next_lesson': next_lesson,
         'prev_lesson': prev_lesson,
         'completed_lessons': completed_lessons,
         'total_lessons': total_lessons,
-        'progress_percentage': round(progress_percentage, 1),
+        'progress_percentage': enrollment.progress_percentage,
     }
     return render(request, 'courses/lesson_detail.html', context)
 
@@ -377,47 +414,39 @@ def mark_lesson_complete(request, lesson_id):
     if not Enrollment.objects.filter(student=request.user, course=lesson.course, is_active=True).exists():
         return JsonResponse({'error': 'Not enrolled in this course'}, status=403)
     
-    progress, created = CourseProgress.objects.get_or_create(
-        student=request.user,
-        lesson=lesson,
-        defaults={'completed': False}
-    )
-    
-    if not progress.completed:
-        progress.completed = True
-        progress.completed_at = timezone.now()
-        progress.save()
+    # Written in the next batch, together with the enrollment's counters
+    progress_buffer.record_completion(request.user.id, lesson)
     
     return JsonResponse({'success': True})
 
+@login_required
+@require_POST
+def lesson_heartbeat(request, lesson_id):
+    """Remember how far into a lesson video the student has watched"""
+    lesson = get_object_or_404(Lesson.objects.only('id', 'course_id', 'duration'), id=lesson_id)
+    try:
+        position = int(float(request.POST.get('position', '')))
+    except (ValueError, OverflowError):
+        return JsonResponse({'error': 'Invalid position'}, status=400)
+    if position < 0:
+        return JsonResponse({'error': 'Invalid position'}, status=400)
+    # Lesson durations are in minutes; a position past the end resumes at the end
+    position = min(position, lesson.duration * 60 or MAX_POSITION, MAX_POSITION)
+    
+    # Heartbeats of students not enrolled in the course update nothing when flushed
+    progress_buffer.record_position(request.user.id, lesson, position)
+    return JsonResponse({'success': True})
+
 @login_required
 def my_courses(request):
     """User's enrolled courses"""
-    enrollments = Enrollment.objects.filter(
+    # Progress counters are stored on the enrollments themselves
+    enrollments = list(Enrollment.objects.filter(
         student=request.user, 
         is_active=True
-    ).select_related('course', 'course__category', 'course__instructor').prefetch_related(
-        'course__lessons'
-    ).order_by('-enrolled_at')
-    
-    # Calculate progress for each enrollment
+    ).select_related('course', 'course__category', 'course__instructor').order_by('-enrolled_at'))
     for enrollment in enrollments:
-        lessons = enrollment.course.lessons.all()
-        completed_lessons = 0
-        total_lessons = lessons.count()
-        
-        for lesson in lessons:
-            progress, created = CourseProgress.objects.get_or_create(
-                student=request.user,
-                lesson=lesson,
-                defaults={'completed': False}
-            )
-            if progress.completed:
-                completed_lessons += 1
-        
-        enrollment.completed_lessons = completed_lessons
-        enrollment.total_lessons = total_lessons
-        enrollment.progress_percentage = (completed_lessons / total_lessons * 100) if total_lessons > 0 else 0
+        progress_buffer.apply_overlay(enrollment)
     
     # Calculate overall statistics
     completed_courses = sum(1 for e in enrollments if e.completed_lessons == e.total_lessons and e.total_lessons > 0)
@@ -459,9 +488,6 @@ def add_review(request, slug):
             review.student = request.user
             review.save()
             
-            # Update course rating
-            course.update_average_rating()
-            
             messages.success(request, "Your review has been added successfully!")
             return redirect('course_detail', slug=slug)
     else:
@@ -486,23 +512,19 @@ def category_courses(request, category_slug):
     # Apply search filter if provided
     search_query = request.GET.get('search', '')
     if search_query:
-        courses = courses.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(category__name__icontains=search_query)
-        )
+        courses = search_courses(courses, search_query)
     
     # Apply sorting
     sort_by = request.GET.get('sort', 'newest')
     if sort_by == 'price_low':
-        courses = courses.order_by('price')
+        courses = courses.order_by('effective_price')
     elif sort_by == 'price_high':
-        courses = courses.order_by('-price')
+        courses = courses.order_by('-effective_price')
     elif sort_by == 'rating':
         courses = courses.order_by('-average_rating')
     elif sort_by == 'popularity':
         courses = courses.order_by('-enrollment_count')
-    else:  # newest
+    elif not search_query:  # newest
         courses = courses.order_by('-created_at')
     
     # Pagination
@@ -522,19 +544,11 @@ def category_courses(request, category_slug):
 @require_POST
 def mark_review_helpful(request, review_id):
     """Mark a review as helpful"""
-    review = get_object_or_404(Review, id=review_id, is_moderated=True)
-    
-    # Check if user has already marked this review as helpful
-    if request.user in review.helpful_votes.all():
-        review.helpful_votes.remove(request.user)
-        review.helpful_count = review.helpful_votes.count()
-        review.save()
-        return JsonResponse({'success': True, 'helpful': False, 'count': review.helpful_count})
-    else:
-        review.helpful_votes.add(request.user)
-        review.helpful_count = review.helpful_votes.count()
-        review.save()
-        return JsonResponse({'success': True, 'helpful': True, 'count': review.helpful_count})
+    review = get_object_or_404(Review.objects.only('id'), id=review_id, is_moderated=True)
+    
+    # Votes for the review are never loaded, and its rating is left alone
+    helpful, count = review.toggle_helpful_vote(request.user)
+    return JsonResponse({'success': True, 'helpful': helpful, 'count': count})
 
 @login_required
 def edit_review(request, review_id):
@@ -589,21 +603,18 @@ def moderate_reviews(request):
     ).select_related('student', 'course', 'moderated_by').order_by('-created_at')
     
     if request.method == 'POST':
-        review_id = request.POST.get('review_id')
+        # One review from its own buttons, or every review ticked on the page
+        review_ids = request.POST.getlist('review_ids') or request.POST.getlist('review_id')
         action = request.POST.get('action')
+        selected = Review.objects.filter(id__in=[pk for pk in review_ids if pk.isdigit()])
         
-        if review_id and action:
-            review = get_object_or_404(Review, id=review_id)
-            
-            if action == 'approve':
-                review.is_moderated = True
-                review.moderated_by = request.user
-                review.moderated_at = timezone.now()
-                review.save()
-                messages.success(request, f'Review by {review.student.username} has been approved.')
-            elif action == 'reject':
-                review.delete()
-                messages.success(request, f'Review by {review.student.username} has been rejected.')
+        if review_ids and action == 'approve':
+            approved = approve_reviews(selected, request.user)
+            messages.success(request, f'{approved} review(s) approved.')
+        elif review_ids and action == 'reject':
+            rejected = reject_reviews(selected)
+            messages.success(request, f'{rejected} review(s) rejected.')
+        return redirect(request.get_full_path())
     
     # Pagination
     paginator = Paginator(reviews, 20)
@@ -619,31 +630,18 @@ def moderate_reviews(request):
 def review_analytics(request, slug):
     """Review analytics for a course"""
     course = get_object_or_404(
-        Course.objects.select_related('category', 'instructor').prefetch_related('reviews'),
+        Course.objects.select_related('category', 'instructor'),
         slug=slug, 
         is_published=True
     )
     
-    # Get rating statistics
+    # Get rating statistics (one cached query)
     rating_form = CourseRatingForm(course)
     rating_stats = rating_form.get_rating_stats()
     
     # Get recent reviews
     recent_reviews = course.get_recent_reviews(10)
     
-    # Get rating distribution
-    rating_distribution = course.get_rating_distribution()
-    
-    # Calculate rating distribution with percentages for template
-    rating_distribution_with_percentages = {}
-    for rating in range(1, 6):
-        count = rating_distribution.get(rating, 0)
-        percentage = course.get_rating_percentage(rating)
-        rating_distribution_with_percentages[rating] = {
-            'count': count,
-            'percentage': percentage
-        }
-    
     # Check user access for template
     user_has_access = False
     if request.user.is_authenticated:
@@ -653,16 +651,22 @@ def review_analytics(request, slug):
         'course': course,
         'rating_stats': rating_stats,
         'recent_reviews': recent_reviews,
-        'rating_distribution': rating_distribution,
-        'rating_distribution_with_percentages': rating_distribution_with_percentages,
+        'rating_distribution': rating_stats['rating_distribution'],
+        'rating_distribution_with_percentages': rating_stats['rating_distribution_with_percentages'],
         'user_has_access': user_has_access,
     }
     return render(request, 'courses/review_analytics.html', context)
 
 def lazy_load_courses(request):
-    """AJAX endpoint for lazy loading courses"""
+    """AJAX endpoint for lazy loading courses
+    
+    Pages are addressed by the opaque ``cursor`` returned as ``next_cursor``
+    (no COUNT, constant cost however deep the client scrolls). The older
+    ``page`` parameter is still accepted and answers with page numbers.
+    """
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        page = request.GET.get('page', 1)
+        page = request.GET.get('page')
+        cursor = request.GET.get('cursor')
         category_id = request.GET.get('category')
         difficulty = request.GET.get('difficulty')
         sort_by = request.GET.get('sort', '-created_at')
@@ -676,34 +680,42 @@ def lazy_load_courses(request):
             courses = courses.filter(category_id=category_id)
         if difficulty:
             courses = courses.filter(difficulty=difficulty)
+        courses = _filter_by_price(courses, request.GET)
         if query:
-            courses = courses.filter(
-                Q(title__icontains=query) |
-                Q(description__icontains=query) |
-                Q(category__name__icontains=query)
-            )
+            courses = search_courses(courses, query)
         
         # Apply sorting
-        if sort_by == 'price_low':
-            courses = courses.order_by('price')
-        elif sort_by == 'price_high':
-            courses = courses.order_by('-price')
-        elif sort_by == 'rating':
-            courses = courses.order_by('-rating')
-        elif sort_by == 'students':
-            courses = courses.order_by('-students_enrolled')
-        else:
-            courses = courses.order_by('-created_at')
+        ordering = _course_ordering(sort_by, query)
         
-        # Pagination
-        paginator = Paginator(courses, 8)
+        from django.template.loader import render_to_string
+        if page is not None:
+            if ordering:
+                courses = courses.order_by(*ordering)
+            paginator = Paginator(courses, COURSES_PER_PAGE)
+            try:
+                page_obj = paginator.page(page)
+            except:
+                return JsonResponse({'error': 'Invalid page'}, status=400)
+            
+            html = render_to_string('courses/course_cards_partial.html', {
+                'page_obj': page_obj,
+                'request': request
+            })
+            return JsonResponse({
+                'html': html,
+                'has_next': page_obj.has_next(),
+                'has_previous': page_obj.has_previous(),
+                'current_page': page_obj.number,
+                'total_pages': paginator.num_pages,
+            })
+        
+        # Keyset pagination
         try:
-            page_obj = paginator.page(page)
-        except:
-            return JsonResponse({'error': 'Invalid page'}, status=400)
+            page_obj = CursorPaginator(courses, ordering, COURSES_PER_PAGE).page(cursor)
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
         
         # Render course cards HTML
-        from django.template.loader import render_to_string
         html = render_to_string('courses/course_cards_partial.html', {
             'page_obj': page_obj,
             'request': request
@@ -712,9 +724,29 @@ def lazy_load_courses(request):
         return JsonResponse({
             'html': html,
             'has_next': page_obj.has_next(),
-            'has_previous': page_obj.has_previous(),
-            'current_page': page_obj.number,
-            'total_pages': paginator.num_pages,
+            'next_cursor': page_obj.next_cursor,
         })
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
+
+def autocomplete(request):
+    """Typeahead suggestions answered from the in-memory course index"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), 20)
+    except ValueError:
+        limit = 8
+
+    results = course_index.search(query, limit) if len(query) >= 2 else []
+    return JsonResponse({
+        'query': query,
+        'results': [
+            {
+                'title': entry.title,
+                'url': entry.url,
+                'category': entry.category,
+                'instructor': entry.instructor,
+            }
+            for entry in results
+        ],
+    })
@@ -2,7 +2,9 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import PaymentMethod, Payment, PaymentSettings
+from django.utils import timezone
+from .models import PaymentMethod, Payment, PaymentSettings, PaymentStatusCount
+from .approvals import approve_payments
 
 @admin.register(PaymentMethod)
 class PaymentMethodAdmin(admin.ModelAdmin):
@@ -44,20 +46,34 @@ class PaymentAdmin(admin.ModelAdmin):
     
     def screenshot_preview(self, obj):
         """Show a small preview of the screenshot in the list view"""
-        if obj.payment_screenshot:
+        if obj.screenshot_thumbnail:
             return format_html(
                 '<a href="{}" target="_blank">'
-                '<img src="{}" style="max-height: 50px; max-width: 50px; border-radius: 4px;" />'
+                '<img src="{}" loading="lazy" style="max-height: 50px; max-width: 50px; border-radius: 4px;" />'
                 '</a>',
                 obj.payment_screenshot.url,
-                obj.payment_screenshot.url
+                obj.screenshot_thumbnail.url
             )
+        if obj.screenshot_processing_failed:
+            return format_html('<a href="{}" target="_blank">View (no preview)</a>', obj.payment_screenshot.url)
+        if obj.payment_screenshot:
+            # Not processed yet; link to it rather than load the full upload into the list
+            return format_html('<a href="{}" target="_blank">Processing…</a>', obj.payment_screenshot.url)
         return format_html('<span style="color: #999;">No screenshot</span>')
     screenshot_preview.short_description = 'Screenshot'
     
     def screenshot_display(self, obj):
         """Display the screenshot in the detail view"""
         if obj.payment_screenshot:
+            original = ''
+            if obj.original_screenshot:
+                # The upload as submitted, before recompression
+                original = format_html(
+                    ' <a href="{}" target="_blank" class="button" style="padding: 8px 16px; text-decoration: none; border-radius: 4px;">'
+                    'View Original Upload'
+                    '</a>',
+                    obj.original_screenshot.url
+                )
             return format_html(
                 '<div style="margin: 10px 0;">'
                 '<h4>Payment Screenshot:</h4>'
@@ -66,24 +82,25 @@ class PaymentAdmin(admin.ModelAdmin):
                 '<br><br>'
                 '<a href="{}" target="_blank" class="button" style="background: #007cba; color: white; padding: 8px 16px; text-decoration: none; border-radius: 4px;">'
                 'View Full Size'
-                '</a>'
+                '</a>{}'
                 '</div>'
                 '</div>',
                 obj.payment_screenshot.url,
-                obj.payment_screenshot.url
+                obj.payment_screenshot.url,
+                original
             )
         return format_html('<p style="color: #999; font-style: italic;">No screenshot uploaded yet.</p>')
     screenshot_display.short_description = 'Screenshot Display'
     
     def approve_payments(self, request, queryset):
-        for payment in queryset.filter(status='pending'):
-            payment.approve_payment(request.user)
-        self.message_user(request, f"Approved {queryset.filter(status='pending').count()} payments.")
+        results = approve_payments(queryset.values_list('pk', flat=True), request.user)
+        self.message_user(request, f"Approved {sum(result.approved for result in results)} payments.")
     approve_payments.short_description = "Approve selected payments"
     
     def reject_payments(self, request, queryset):
-        queryset.filter(status='pending').update(status='rejected')
-        self.message_user(request, f"Rejected {queryset.filter(status='pending').count()} payments.")
+        rejected = queryset.filter(status='pending').update(status='rejected', updated_at=timezone.now())
+        PaymentStatusCount.adjust({'pending': -rejected, 'rejected': rejected})
+        self.message_user(request, f"Rejected {rejected} payments.")
     reject_payments.short_description = "Reject selected payments"
     
     def view_screenshots(self, request, queryset):
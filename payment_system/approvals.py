@@ -0,0 +1,174 @@
+"""Batch payment approval.
+
+Approving payments marks them approved, enrolls their students and counts the
+new students on each course. Doing that one payment at a time costs a handful
+of queries per payment and a read-modify-write of the course counter that
+loses increments under concurrent approvals. ``approve_payments`` does it for
+any number of payments in one transaction: one UPDATE per batch of payments,
+bulk-created enrollments and a single F() increment per course.
+"""
+from collections import Counter
+from dataclasses import dataclass
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from courses.autocomplete import course_index
+from courses.caching import CATALOG, bump_generation
+from courses.models import Course, CourseProgress, Enrollment, Lesson
+
+# Stay well below SQLite's limit on query parameters
+BATCH_SIZE = 500
+
+APPROVED = 'approved'
+NOT_PENDING = 'not_pending'
+NOT_FOUND = 'not_found'
+
+ENROLLMENT_CREATED = 'created'
+ENROLLMENT_REACTIVATED = 'reactivated'
+ENROLLMENT_EXISTING = 'existing'
+
+
+@dataclass
+class ApprovalResult:
+    """What approve_payments did with one payment"""
+    payment_id: int
+    outcome: str
+    enrollment: str = ''
+
+    @property
+    def approved(self):
+        return self.outcome == APPROVED
+
+
+def _batches(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def approve_payments(payment_ids, admin_user, notes=None):
+    """Approve the pending payments among ``payment_ids`` and enroll their students
+
+    Returns an ApprovalResult per payment id, in the order given. Payments
+    that are missing or no longer pending are reported and left untouched.
+    ``notes``, if given, replaces the admin notes of the approved payments.
+    """
+    from .models import Payment, PaymentStatusCount
+
+    payment_ids = list(dict.fromkeys(int(pk) for pk in payment_ids))
+    now = timezone.now()
+    results = {}
+    approved = {}
+    updates = {
+        'status': 'approved',
+        'screenshot_verified': True,
+        'verified_by': admin_user,
+        'verified_at': now,
+        'updated_at': now,
+    }
+    if notes is not None:
+        updates['admin_notes'] = notes
+
+    with transaction.atomic():
+        for batch in _batches(payment_ids):
+            rows = (
+                Payment.objects.select_for_update().filter(pk__in=batch).order_by()
+                .values_list('pk', 'status', 'student_id', 'course_id')
+            )
+            pending = {}
+            for pk, status, student_id, course_id in rows:
+                if status == 'pending':
+                    pending[pk] = (student_id, course_id)
+                else:
+                    results[pk] = ApprovalResult(pk, NOT_PENDING)
+            count = Payment.objects.filter(pk__in=pending, status='pending').update(**updates)
+            PaymentStatusCount.adjust({'pending': -count, 'approved': count})
+            if count < len(pending):
+                # Another approver got to some of them first; keep the ones this call moved
+                moved = set(Payment.objects.filter(
+                    pk__in=pending, status='approved', verified_by=admin_user, verified_at=now,
+                ).values_list('pk', flat=True))
+                for pk in pending.keys() - moved:
+                    results[pk] = ApprovalResult(pk, NOT_PENDING)
+                pending = {pk: pair for pk, pair in pending.items() if pk in moved}
+            approved.update(pending)
+
+        enrollments = _enroll(set(approved.values()))
+        if enrollments:
+            new_students = Counter(
+                course_id for (_, course_id), state in enrollments.items() if state == ENROLLMENT_CREATED
+            )
+            for course_id, count in new_students.items():
+                Course.objects.filter(pk=course_id).update(
+                    students_enrolled=F('students_enrolled') + count,
+                    # Cached course cards are keyed on updated_at
+                    updated_at=now,
+                )
+
+    if approved:
+        # The courses were updated without save(), which would refresh these
+        bump_generation(CATALOG)
+        course_index.update_courses(Course.objects.filter(pk__in={course_id for _, course_id in approved.values()}))
+
+    for pk, pair in approved.items():
+        results[pk] = ApprovalResult(pk, APPROVED, enrollments[pair])
+    return [results.get(pk) or ApprovalResult(pk, NOT_FOUND) for pk in payment_ids]
+
+
+def _enroll(pairs):
+    """Give every (student_id, course_id) an active enrollment
+
+    Returns {(student_id, course_id): ENROLLMENT_*} describing what was done.
+    """
+    states = {}
+    if not pairs:
+        return states
+
+    course_ids = {course_id for _, course_id in pairs}
+    inactive = []
+    for batch in _batches({student_id for student_id, _ in pairs}):
+        existing = Enrollment.objects.filter(student_id__in=batch, course_id__in=course_ids).values_list(
+            'pk', 'student_id', 'course_id', 'is_active'
+        )
+        for pk, student_id, course_id, is_active in existing:
+            if (student_id, course_id) not in pairs:
+                continue
+            if is_active:
+                states[student_id, course_id] = ENROLLMENT_EXISTING
+            else:
+                states[student_id, course_id] = ENROLLMENT_REACTIVATED
+                inactive.append(pk)
+    for batch in _batches(inactive):
+        Enrollment.objects.filter(pk__in=batch).update(is_active=True)
+
+    new = pairs - states.keys()
+    if new:
+        # What Enrollment.save() would have counted for each new enrollment
+        total_lessons = dict(
+            Lesson.objects.filter(course_id__in=course_ids).order_by()
+            .values('course_id').annotate(n=Count('pk')).values_list('course_id', 'n')
+        )
+        completed_lessons = {}
+        for batch in _batches({student_id for student_id, _ in new}):
+            completed_lessons.update({
+                (student_id, course_id): n
+                for student_id, course_id, n in CourseProgress.objects.filter(
+                    student_id__in=batch, lesson__course_id__in=course_ids, completed=True
+                ).order_by().values('student_id', 'lesson__course_id').annotate(n=Count('pk'))
+                .values_list('student_id', 'lesson__course_id', 'n')
+            })
+        Enrollment.objects.bulk_create([
+            Enrollment(
+                student_id=student_id,
+                course_id=course_id,
+                is_active=True,
+                total_lessons=total_lessons.get(course_id, 0),
+                completed_lessons=completed_lessons.get((student_id, course_id), 0),
+            )
+            for student_id, course_id in new
+        ], batch_size=BATCH_SIZE)
+        states.update(dict.fromkeys(new, ENROLLMENT_CREATED))
+    return states
@@ -0,0 +1,140 @@
+"""Rules for approving payments without waiting for staff.
+
+When ``PaymentSettings.auto_approve_payments`` is on, pending payments are
+checked against ``AUTO_APPROVAL_RULES`` as students submit them and by the
+``auto_approve_payments`` sweep. Payments that pass every rule are approved in
+batches through ``approvals.approve_payments``, the same path as manual
+approval; the rest stay in the queue with the reasons they were held.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+from courses.models import Enrollment
+from .approvals import BATCH_SIZE, approve_payments
+from .models import Payment, PaymentSettings, normalize_reference
+
+AUTO_APPROVAL_NOTE = 'Auto-approved'
+# Payments that no longer claim their transaction ID
+RELEASED_STATUSES = ('rejected', 'cancelled')
+
+
+@dataclass
+class RuleContext:
+    """What the rules need to know beyond the payment itself"""
+    settings: PaymentSettings
+    # Normalized transaction IDs claimed by payments outside the batch
+    taken_references: set
+    # How often each normalized transaction ID occurs inside the batch
+    batch_references: Counter
+    # (student_id, course_id) pairs that already have an active enrollment
+    enrolled: set
+
+
+def amount_within_limit(payment, context):
+    """Hold payments above the configured amount limit"""
+    if payment.amount > context.settings.auto_approve_amount_limit:
+        return f'Amount {payment.amount} is above the auto-approval limit'
+
+
+def transaction_id_matches_method(payment, context):
+    """Hold payments whose transaction ID is missing or not in the method's format"""
+    reference = normalize_reference(payment.transaction_id)
+    if not reference:
+        return 'No transaction ID'
+    pattern = payment.payment_method.transaction_id_pattern
+    if pattern and not re.fullmatch(pattern, reference, re.IGNORECASE):
+        return f'Transaction ID does not match the {payment.payment_method.get_name_display()} format'
+
+
+def has_screenshot(payment, context):
+    """Hold payments without a screenshot"""
+    if not payment.payment_screenshot:
+        return 'No payment screenshot'
+
+
+def not_duplicate(payment, context):
+    """Hold reused transaction IDs and payments for courses the student already has"""
+    reference = normalize_reference(payment.transaction_id)
+    if reference and (reference in context.taken_references or context.batch_references[reference] > 1):
+        return 'Transaction ID is used by another payment'
+    if (payment.student_id, payment.course_id) in context.enrolled:
+        return 'Student is already enrolled in the course'
+
+
+AUTO_APPROVAL_RULES = [amount_within_limit, transaction_id_matches_method, has_screenshot, not_duplicate]
+
+
+def evaluate_payments(payments, payment_settings):
+    """{payment_id: reasons the payment needs staff}; no reasons means it may be auto-approved
+
+    Runs two queries for the whole batch, so keep batches to BATCH_SIZE.
+    """
+    payments = list(payments)
+    if not payments:
+        return {}
+    batch_references = Counter(normalize_reference(payment.transaction_id) for payment in payments)
+    batch_references.pop('', None)
+
+    taken_references = set()
+    if batch_references:
+        taken_references = set(
+            Payment.objects.filter(transaction_key__in=list(batch_references))
+            .exclude(pk__in=[payment.pk for payment in payments])
+            .exclude(status__in=RELEASED_STATUSES)
+            .values_list('transaction_key', flat=True)
+        )
+    enrolled = set(Enrollment.objects.filter(
+        is_active=True,
+        student_id__in={payment.student_id for payment in payments},
+        course_id__in={payment.course_id for payment in payments},
+    ).values_list('student_id', 'course_id'))
+
+    context = RuleContext(payment_settings, taken_references, batch_references, enrolled)
+    return {
+        payment.pk: [reason for rule in AUTO_APPROVAL_RULES if (reason := rule(payment, context))]
+        for payment in payments
+    }
+
+
+def auto_approve(payments, payment_settings=None):
+    """Approve the pending payments among ``payments`` that pass every rule
+
+    Returns (approval results, {payment_id: reasons} of the payments held
+    back). Does nothing while auto-approval is switched off.
+    """
+    payment_settings = payment_settings or PaymentSettings.get_settings()
+    if not payment_settings.auto_approve_payments:
+        return [], {}
+
+    verdicts = evaluate_payments(
+        payments.filter(status='pending').select_related('payment_method'), payment_settings
+    )
+    eligible = [pk for pk, reasons in verdicts.items() if not reasons]
+    results = approve_payments(eligible, None, notes=AUTO_APPROVAL_NOTE) if eligible else []
+    return results, {pk: reasons for pk, reasons in verdicts.items() if reasons}
+
+
+def sweep_pending_payments(batch_size=BATCH_SIZE):
+    """Run auto-approval over every pending payment, a batch at a time
+
+    Returns (number approved, {payment_id: reasons} of the payments held back).
+    """
+    payment_settings = PaymentSettings.get_settings()
+    approved, held = 0, {}
+    if not payment_settings.auto_approve_payments:
+        return approved, held
+
+    last_pk = 0
+    while True:
+        batch = list(
+            Payment.objects.filter(status='pending', pk__gt=last_pk)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+        results, batch_held = auto_approve(Payment.objects.filter(pk__in=batch), payment_settings)
+        approved += sum(result.approved for result in results)
+        held.update(batch_held)
+        last_pk = batch[-1]
+    return approved, held
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from payment_system.auto_approval import sweep_pending_payments
+
+
+class Command(BaseCommand):
+    help = 'Approve pending payments that pass the auto-approval rules'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--worker',
+            action='store_true',
+            help='Keep running and sweep the pending payments periodically'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=30,
+            help='Seconds between sweeps in worker mode (default: 30)'
+        )
+        parser.add_argument(
+            '--show-held',
+            action='store_true',
+            help='List every payment left for staff with the reasons it was held'
+        )
+
+    def handle(self, *args, **options):
+        if not options['worker']:
+            self.sweep(options['show_held'])
+            return
+
+        self.stdout.write(self.style.SUCCESS('Auto-approval worker started...'))
+        try:
+            while True:
+                close_old_connections()
+                self.sweep(options['show_held'])
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Auto-approval worker stopped'))
+
+    def sweep(self, show_held):
+        approved, held = sweep_pending_payments()
+        if show_held:
+            for payment_id, reasons in held.items():
+                self.stdout.write(f'Payment #{payment_id} held: {"; ".join(reasons)}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Auto-approved {approved} payments, {len(held)} left for staff review')
+        )
@@ -0,0 +1,95 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from courses.models import Category, Course, Enrollment, Lesson
+from payment_system.approvals import approve_payments
+from payment_system.models import Payment, PaymentMethod
+
+
+class Command(BaseCommand):
+    help = 'Time approving a launch-day queue of pending payments (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--payments',
+            type=int,
+            default=1000,
+            help='Number of pending payments to approve per approach (default: 1000)'
+        )
+        parser.add_argument(
+            '--courses',
+            type=int,
+            default=5,
+            help='Number of courses the payments are spread over (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            admin_user = User.objects.create(username='benchmark-approver', is_staff=True)
+            method = PaymentMethod.objects.create(name='easypaisa', account_title='Benchmark')
+            courses = self.generate_courses(options['courses'], admin_user)
+
+            legacy = self.generate_payments('legacy', options['payments'], courses, method)
+            started = time.perf_counter()
+            for payment in Payment.objects.filter(pk__in=legacy).select_related('student', 'course'):
+                self.legacy_approve(payment, admin_user)
+            legacy_ms = (time.perf_counter() - started) * 1000
+
+            batch = self.generate_payments('batch', options['payments'], courses, method)
+            started = time.perf_counter()
+            approve_payments(batch, admin_user)
+            batch_ms = (time.perf_counter() - started) * 1000
+
+            self.stdout.write(f'{"approach":<28}{"total ms":>12}')
+            self.stdout.write(f'{"one payment at a time":<28}{legacy_ms:>12.1f}')
+            self.stdout.write(f'{"approve_payments()":<28}{batch_ms:>12.1f}')
+            self.stdout.write(self.style.SUCCESS(f'Speedup: {legacy_ms / max(batch_ms, 0.001):.1f}x'))
+
+            # Leave the database exactly as it was
+            transaction.set_rollback(True)
+
+    def generate_courses(self, count, instructor):
+        category = Category.objects.create(name='Benchmark')
+        courses = []
+        for i in range(count):
+            course = Course.objects.create(
+                title=f'Benchmark Launch {i}',
+                description='Benchmark course',
+                category=category,
+                instructor=instructor,
+                price=1000,
+                duration='1 hour',
+                is_published=True,
+            )
+            Lesson.objects.bulk_create([
+                Lesson(course=course, title=f'Lesson {n}', duration=10, order=n) for n in range(10)
+            ])
+            courses.append(course)
+        return courses
+
+    def generate_payments(self, prefix, count, courses, method):
+        User.objects.bulk_create(
+            [User(username=f'benchmark-{prefix}-{i}') for i in range(count)], batch_size=500
+        )
+        students = User.objects.filter(username__startswith=f'benchmark-{prefix}-').order_by('pk')
+        payments = Payment.objects.bulk_create([
+            Payment(student=student, course=courses[i % len(courses)], payment_method=method, amount=1000)
+            for i, student in enumerate(students)
+        ], batch_size=500)
+        return [payment.pk for payment in payments]
+
+    def legacy_approve(self, payment, admin_user):
+        """The previous Payment.approve_payment"""
+        payment.status = 'approved'
+        payment.screenshot_verified = True
+        payment.verified_by = admin_user
+        payment.verified_at = timezone.now()
+        payment.save()
+        Enrollment.objects.get_or_create(
+            student=payment.student, course=payment.course, defaults={'is_active': True}
+        )
+        payment.course.students_enrolled += 1
+        payment.course.save()
@@ -0,0 +1,110 @@
+import csv
+import os
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from courses.models import Category, Course
+from payment_system.models import Payment, PaymentMethod
+from payment_system.reconciliation import PendingPaymentIndex, reconcile_statement
+
+
+class Command(BaseCommand):
+    help = 'Time reconciling a generated CSV statement against pending payments (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1000000,
+            help='Number of rows in the generated statement (default: 1000000)'
+        )
+        parser.add_argument(
+            '--payments',
+            type=int,
+            default=5000,
+            help='Number of pending payments, each paid somewhere in the statement (default: 5000)'
+        )
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'statement.csv')
+            with transaction.atomic():
+                admin_user = self.generate_payments(options['payments'])
+                self.write_statement(path, options['rows'], options['payments'])
+
+                started = time.perf_counter()
+                index = PendingPaymentIndex()
+                index_s = time.perf_counter() - started
+
+                rss_before = self.peak_rss()
+                started = time.perf_counter()
+                with open(path, newline='') as statement:
+                    summary = reconcile_statement(statement, admin_user, index=index)
+                elapsed = time.perf_counter() - started
+                rss_after = self.peak_rss()
+
+                self.stdout.write(f'Indexed {len(index)} pending payments in {index_s * 1000:.0f} ms')
+                memory = ''
+                if rss_before is not None:
+                    # Peak resident size in KiB on Linux; unchanged if memory stayed flat
+                    memory = f', peak memory grew {(rss_after - rss_before) / 1024:.1f} MiB'
+                self.stdout.write(
+                    f'Reconciled {summary.rows} rows in {elapsed:.1f}s '
+                    f'({summary.rows / elapsed:,.0f} rows/s{memory})'
+                )
+                for outcome, count in sorted(summary.outcomes.items()):
+                    self.stdout.write(f'  {outcome:<16}{count:>10}')
+                self.stdout.write(self.style.SUCCESS(f'Approved {summary.approved} payments'))
+
+                # Leave the database exactly as it was
+                transaction.set_rollback(True)
+
+    def peak_rss(self):
+        """Peak resident set size of this process, or None where the platform cannot tell"""
+        if resource is None:
+            return None
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def generate_payments(self, count):
+        admin_user = User.objects.create(username='benchmark-reconciler', is_staff=True)
+        method = PaymentMethod.objects.create(name='jazzcash', account_title='Benchmark')
+        course = Course.objects.create(
+            title='Benchmark Reconciliation',
+            description='Benchmark course',
+            category=Category.objects.create(name='Benchmark'),
+            instructor=admin_user,
+            price=1500,
+            duration='1 hour',
+            is_published=True,
+        )
+        User.objects.bulk_create(
+            [User(username=f'benchmark-payer-{i}') for i in range(count)], batch_size=500
+        )
+        students = User.objects.filter(username__startswith='benchmark-payer-').order_by('pk')
+        Payment.objects.bulk_create([
+            Payment(student=student, course=course, payment_method=method, amount=1500,
+                    transaction_id=f'{900000000000 + i}')
+            for i, student in enumerate(students)
+        ], batch_size=500)
+        return admin_user
+
+    def write_statement(self, path, rows, payments):
+        """Unrelated transactions with each pending payment's row spread among them"""
+        every = max(rows // max(payments, 1), 1)
+        with open(path, 'w', newline='') as statement:
+            writer = csv.writer(statement)
+            writer.writerow(['Date', 'Transaction ID', 'Sender', 'Amount (PKR)'])
+            for i in range(rows):
+                paid = i // every
+                if i % every == 0 and paid < payments:
+                    writer.writerow(['2025-01-01', f'{900000000000 + paid}', f'Payer {paid}', '1,500.00'])
+                else:
+                    writer.writerow(['2025-01-01', f'{100000000000 + i}', f'Customer {i}', '250.00'])
@@ -0,0 +1,41 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from payment_system.models import Payment
+from payment_system.screenshots import process_screenshots
+
+
+class Command(BaseCommand):
+    help = 'Recompress payment screenshots and make their thumbnails, for uploads not processed yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Screenshots processed in parallel (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Also retry screenshots that could not be processed before'
+        )
+
+    def handle(self, *args, **options):
+        payments = (
+            Payment.objects.exclude(payment_screenshot='').exclude(payment_screenshot__isnull=True)
+            .filter(screenshot_thumbnail='')
+        )
+        if not options['retry_failed']:
+            payments = payments.filter(screenshot_processing_failed=False)
+        payment_ids = list(payments.order_by('pk').values_list('pk', flat=True))
+        self.stdout.write(f'Processing {len(payment_ids)} screenshots on {options["workers"]} workers...')
+        start = time.perf_counter()
+        processed = process_screenshots(payment_ids, max(options['workers'], 1))
+        elapsed = time.perf_counter() - start
+        skipped = len(payment_ids) - processed
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully processed {processed} screenshots in {elapsed:.1f}s'
+            + (f', {skipped} could not be processed (see the log)' if skipped else '')
+        ))
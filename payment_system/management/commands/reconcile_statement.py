@@ -0,0 +1,70 @@
+import csv
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from payment_system.reconciliation import MATCHED, StatementError, reconcile_statement
+
+
+class Command(BaseCommand):
+    help = 'Approve pending payments found in a CSV payment statement and report the rest'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Path of the CSV statement')
+        parser.add_argument(
+            '--approver',
+            help='Username recorded as the verifier of the approved payments'
+        )
+        parser.add_argument(
+            '--report',
+            help='Write unmatched and ambiguous rows to this CSV file'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Match the statement without approving anything'
+        )
+        parser.add_argument('--transaction-column', help='Header of the transaction ID column')
+        parser.add_argument('--reference-column', help='Header of the reference number column')
+        parser.add_argument('--amount-column', help='Header of the amount column')
+        parser.add_argument(
+            '--encoding',
+            default='utf-8-sig',
+            help='Text encoding of the statement (default: utf-8-sig)'
+        )
+
+    def handle(self, *args, **options):
+        approver = None
+        if options['approver']:
+            try:
+                approver = User.objects.get(username=options['approver'])
+            except User.DoesNotExist:
+                raise CommandError(f'User "{options["approver"]}" does not exist')
+
+        columns = {
+            'transaction': options['transaction_column'],
+            'reference': options['reference_column'],
+            'amount': options['amount_column'],
+        }
+        report_file = open(options['report'], 'w', newline='') if options['report'] else None
+        try:
+            report = None
+            if report_file:
+                writer = csv.writer(report_file)
+                writer.writerow(['line', 'outcome', 'row'])
+                report = lambda line, outcome, row: writer.writerow([line, outcome, *row])
+            with open(options['statement'], newline='', encoding=options['encoding']) as statement:
+                summary = reconcile_statement(
+                    statement, approver, report=report, dry_run=options['dry_run'], columns=columns
+                )
+        except (OSError, StatementError) as e:
+            raise CommandError(str(e))
+        finally:
+            if report_file:
+                report_file.close()
+
+        for outcome, count in sorted(summary.outcomes.items()):
+            self.stdout.write(f'{outcome:<16}{count:>10}')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run: {summary.outcomes[MATCHED]} payments would be approved'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Approved {summary.approved} payments from {summary.rows} rows'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from payment_system.models import Payment, PaymentStatusCount, normalized_reference
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-status payment counters and the normalized transaction/reference keys'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            PaymentStatusCount.recount()
+            updated = Payment.objects.update(
+                transaction_key=normalized_reference('transaction_id'),
+                reference_key=normalized_reference('reference_number'),
+            )
+        for status, count in PaymentStatusCount.get_counts().items():
+            self.stdout.write(f'{status:<12}{count:>10}')
+        self.stdout.write(self.style.SUCCESS(f'Successfully recounted {updated} payments'))
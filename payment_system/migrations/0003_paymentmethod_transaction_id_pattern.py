@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:11
+
+from django.db import migrations, models
+import payment_system.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_system', '0002_paymentsettings_bank_account_number_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentmethod',
+            name='transaction_id_pattern',
+            field=models.CharField(blank=True, help_text='Regular expression a transaction ID must fully match to be auto-approved, e.g. \\d{11}', max_length=200, validators=[payment_system.models.validate_regex]),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:18
+
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Replace, Trim, Upper
+
+
+def normalized_reference(field_name):
+    expression = Upper(Trim(F(field_name)))
+    for separator in (' ', '-'):
+        expression = Replace(expression, Value(separator), Value(''))
+    return expression
+
+
+def populate_keys_and_counts(apps, schema_editor):
+    Payment = apps.get_model('payment_system', 'Payment')
+    PaymentStatusCount = apps.get_model('payment_system', 'PaymentStatusCount')
+    Payment.objects.update(
+        transaction_key=normalized_reference('transaction_id'),
+        reference_key=normalized_reference('reference_number'),
+    )
+    counts = dict(
+        Payment.objects.order_by().values('status').annotate(n=models.Count('pk')).values_list('status', 'n')
+    )
+    PaymentStatusCount.objects.bulk_create([
+        PaymentStatusCount(status=status, count=counts.get(status, 0))
+        for status in ('pending', 'approved', 'rejected', 'cancelled')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_system', '0003_paymentmethod_transaction_id_pattern'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('cancelled', 'Cancelled')], max_length=20, unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='reference_key',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='transaction_key',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['-created_at', '-id'], name='payment_created'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='payment_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['student', 'course', 'status'], name='payment_student_course_status'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['transaction_key'], name='payment_transaction_key'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['reference_key'], name='payment_reference_key'),
+        ),
+        migrations.RunPython(populate_keys_and_counts, migrations.RunPython.noop),
+    ]
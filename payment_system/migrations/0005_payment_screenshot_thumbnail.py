@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_system', '0004_payment_queue_indexes_and_status_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='screenshot_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='payment_screenshots/'),
+        ),
+    ]
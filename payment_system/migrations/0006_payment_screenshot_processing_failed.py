@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_system', '0005_payment_screenshot_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='screenshot_processing_failed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment_system', '0006_payment_screenshot_processing_failed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='original_screenshot',
+            field=models.ImageField(blank=True, editable=False, upload_to='payment_screenshots/'),
+        ),
+    ]
@@ -1,8 +1,36 @@
+import re
+from collections import Counter
+
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Replace, Trim, Upper
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from courses.models import Course
 
+_SEPARATORS = str.maketrans('', '', ' -')
+
+def normalize_reference(value):
+    """Transaction or reference ID without spaces or dashes, in upper case"""
+    return (value or '').strip().translate(_SEPARATORS).upper()
+
+def normalized_reference(field_name):
+    """Database expression computing normalize_reference() of a column"""
+    expression = Upper(Trim(F(field_name)))
+    for separator in (' ', '-'):
+        expression = Replace(expression, Value(separator), Value(''))
+    return expression
+
+def validate_regex(value):
+    """Validate that a pattern compiles as a regular expression"""
+    try:
+        re.compile(value)
+    except re.error as e:
+        raise ValidationError(f'Invalid regular expression: {e}')
+
 class PaymentMethod(models.Model):
     PAYMENT_CHOICES = [
         ('easypaisa', 'EasyPaisa'),
@@ -14,6 +42,10 @@ class PaymentMethod(models.Model):
     name = models.CharField(max_length=50, choices=PAYMENT_CHOICES)
     account_number = models.CharField(max_length=100, blank=True)
     account_title = models.CharField(max_length=100, blank=True)
+    transaction_id_pattern = models.CharField(
+        max_length=200, blank=True, validators=[validate_regex],
+        help_text="Regular expression a transaction ID must fully match to be auto-approved, e.g. \\d{11}"
+    )
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -36,9 +68,18 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     transaction_id = models.CharField(max_length=100, blank=True, help_text="Transaction ID from payment provider")
     reference_number = models.CharField(max_length=100, blank=True, help_text="Reference number provided by student")
+    # normalize_reference() of the two IDs above, for indexed duplicate checks and prefix search
+    transaction_key = models.CharField(max_length=100, blank=True, editable=False)
+    reference_key = models.CharField(max_length=100, blank=True, editable=False)
     
     # Screenshot verification
     payment_screenshot = models.ImageField(upload_to='payment_screenshots/', blank=True, null=True)
+    # Written next to the screenshot by payment_system.screenshots once it is processed
+    screenshot_thumbnail = models.ImageField(upload_to='payment_screenshots/', blank=True, editable=False)
+    # The upload exactly as submitted, kept as evidence once payment_screenshot is recompressed
+    original_screenshot = models.ImageField(upload_to='payment_screenshots/', blank=True, editable=False)
+    # Set when the screenshot could not be read; list pages then link to the upload instead
+    screenshot_processing_failed = models.BooleanField(default=False, editable=False)
     screenshot_verified = models.BooleanField(default=False)
     verified_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='verified_payments')
     verified_at = models.DateTimeField(blank=True, null=True)
@@ -54,29 +95,64 @@ class Payment(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='payment_created'),
+            models.Index(fields=['status', '-created_at', '-id'], name='payment_status_created'),
+            models.Index(fields=['student', 'course', 'status'], name='payment_student_course_status'),
+            models.Index(fields=['transaction_key'], name='payment_transaction_key'),
+            models.Index(fields=['reference_key'], name='payment_reference_key'),
+        ]
     
     def __str__(self):
         return f"{self.student.username} - {self.course.title} - {self.amount}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The status this payment is counted under in PaymentStatusCount
+        instance._counted_status = None if 'status' in instance.get_deferred_fields() else instance.status
+        if 'payment_screenshot' not in instance.get_deferred_fields():
+            # The stored screenshot, to tell new uploads apart in save()
+            instance._loaded_screenshot = instance.payment_screenshot.name or None
+        return instance
+    
+    def save(self, *args, **kwargs):
+        self.transaction_key = normalize_reference(self.transaction_id)
+        self.reference_key = normalize_reference(self.reference_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'transaction_id', 'reference_number'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'transaction_key', 'reference_key'}
+        replaced = self._screenshot_replaced(update_fields)
+        if replaced:
+            self.screenshot_thumbnail = ''
+            self.original_screenshot = ''
+            self.screenshot_processing_failed = False
+            if update_fields is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {
+                    'screenshot_thumbnail', 'original_screenshot', 'screenshot_processing_failed'
+                }
+        super().save(*args, **kwargs)
+        if 'payment_screenshot' not in self.get_deferred_fields():
+            self._loaded_screenshot = self.payment_screenshot.name or None
+        if replaced and self.payment_screenshot:
+            from .screenshots import schedule_processing
+            schedule_processing(self.pk)
+    
+    def _screenshot_replaced(self, update_fields):
+        if update_fields is not None and 'payment_screenshot' not in update_fields:
+            return False
+        if not hasattr(self, '_loaded_screenshot'):
+            # New payments; ones loaded without the screenshot field cannot tell
+            return self._state.adding
+        return (self.payment_screenshot.name or None) != self._loaded_screenshot
+    
     def approve_payment(self, admin_user):
         """Approve the payment and enroll the student"""
-        self.status = 'approved'
-        self.screenshot_verified = True
-        self.verified_by = admin_user
-        self.verified_at = timezone.now()
-        self.save()
-        
-        # Create enrollment
-        from courses.models import Enrollment
-        enrollment, created = Enrollment.objects.get_or_create(
-            student=self.student,
-            course=self.course,
-            defaults={'is_active': True}
-        )
-        
-        # Update course enrollment count
-        self.course.students_enrolled += 1
-        self.course.save()
+        from .approvals import approve_payments
+        result, = approve_payments([self.pk], admin_user)
+        self.refresh_from_db(fields=['status', 'screenshot_verified', 'verified_by', 'verified_at', 'updated_at'])
+        self._counted_status = self.status
+        return result
     
     def reject_payment(self, admin_user, notes=""):
         """Reject the payment"""
@@ -86,6 +162,39 @@ class Payment(models.Model):
         self.verified_at = timezone.now()
         self.save()
 
+class PaymentStatusCount(models.Model):
+    """Number of payments in each status, adjusted on every status transition"""
+    # Maintained by the Payment signals and bulk updates; repair with `manage.py recount_payment_statuses`
+    status = models.CharField(max_length=20, choices=Payment.STATUS_CHOICES, unique=True)
+    count = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.get_status_display()}: {self.count}"
+    
+    @classmethod
+    def adjust(cls, deltas):
+        """Apply {status: +/-n} with one UPDATE per status"""
+        for status, n in deltas.items():
+            if n and not cls.objects.filter(status=status).update(count=F('count') + n):
+                cls.objects.create(status=status, count=n)
+    
+    @classmethod
+    def get_counts(cls):
+        """{status: count} for every status, plus the total under 'all'"""
+        counts = dict.fromkeys((status for status, _ in Payment.STATUS_CHOICES), 0)
+        counts.update(cls.objects.values_list('status', 'count'))
+        counts['all'] = sum(counts.values())
+        return counts
+    
+    @classmethod
+    def recount(cls):
+        """Recompute every counter from the Payment table"""
+        counts = Counter(dict(
+            Payment.objects.order_by().values('status').annotate(n=models.Count('pk')).values_list('status', 'n')
+        ))
+        for status, _ in Payment.STATUS_CHOICES:
+            cls.objects.update_or_create(status=status, defaults={'count': counts[status]})
+
 class PaymentSettings(models.Model):
     """Global payment settings"""
     platform_name = models.CharField(max_length=100, default="AI Course Platform")
@@ -137,3 +246,23 @@ class PaymentSettings(models.Model):
         """Get or create payment settings"""
         settings, created = cls.objects.get_or_create(pk=1)
         return settings
+
+@receiver(post_save, sender=Payment)
+def count_payment_status(sender, instance, created, raw=False, **kwargs):
+    """Move the payment between the per-status counters when its status changes"""
+    if raw:
+        return
+    old = None if created else getattr(instance, '_counted_status', None)
+    if old != instance.status:
+        deltas = Counter({instance.status: 1})
+        if old is not None:
+            deltas[old] -= 1
+        PaymentStatusCount.adjust(deltas)
+    instance._counted_status = instance.status
+
+@receiver(post_delete, sender=Payment)
+def uncount_payment_status(sender, instance, **kwargs):
+    """Take a deleted payment out of the per-status counters"""
+    counted = getattr(instance, '_counted_status', None)
+    if counted is not None:
+        PaymentStatusCount.adjust({counted: -1})
@@ -0,0 +1,169 @@
+"""Match provider and bank statements against pending payments.
+
+The pending payments are loaded once into an in-memory index keyed on their
+normalized transaction and reference IDs. The statement is then streamed row
+by row, so memory stays flat however long it is: each row is looked up in the
+index, matches are approved in batches through ``approvals.approve_payments``,
+and unmatched or ambiguous rows are passed to a report callback instead of
+being collected.
+"""
+import csv
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from .approvals import BATCH_SIZE, approve_payments
+from .models import Payment, normalize_reference
+
+RECONCILED_NOTE = 'Reconciled with statement'
+# Shorter IDs match too many payments by accident
+MIN_REFERENCE_LENGTH = 6
+
+# Header names recognised for each column, after normalize_header()
+TRANSACTION_COLUMNS = ('transaction_id', 'transaction', 'txn_id', 'trx_id', 'tid')
+REFERENCE_COLUMNS = ('reference_number', 'reference', 'reference_no', 'ref', 'ref_no')
+AMOUNT_COLUMNS = ('amount', 'credit', 'credit_amount', 'amount_pkr')
+
+MATCHED = 'matched'
+UNMATCHED = 'unmatched'
+AMBIGUOUS = 'ambiguous'
+AMOUNT_MISMATCH = 'amount_mismatch'
+DUPLICATE = 'duplicate'
+
+
+class StatementError(ValueError):
+    pass
+
+
+def normalize_header(name):
+    """'Transaction ID ' -> 'transaction_id'"""
+    return re.sub(r'[^a-z0-9]+', '_', (name or '').strip().lower()).strip('_')
+
+
+# The number in an amount cell, skipping currency tokens like "Rs." or "PKR-";
+# a minus only counts as a sign when it does not follow a word
+AMOUNT_PATTERN = re.compile(r'(?:(?<![\w.])-)?\d[\d,]*(?:\.\d+)?')
+
+
+def parse_amount(value):
+    """Statement amount as a Decimal, or None if it does not parse"""
+    match = AMOUNT_PATTERN.search(value or '')
+    if match is None:
+        return None
+    return Decimal(match.group().replace(',', ''))
+
+
+@dataclass
+class ReconciliationSummary:
+    """Row counts per outcome and how many payments were approved"""
+    outcomes: Counter = field(default_factory=Counter)
+    approved: int = 0
+
+    @property
+    def rows(self):
+        return sum(self.outcomes.values())
+
+
+class PendingPaymentIndex:
+    """Pending payments by normalized transaction and reference ID"""
+
+    def __init__(self, payments=None):
+        self._by_reference = defaultdict(set)
+        self._amounts = {}
+        self._claimed = set()
+        if payments is None:
+            payments = Payment.objects.filter(status='pending')
+        rows = payments.values_list('pk', 'transaction_id', 'reference_number', 'amount')
+        for pk, transaction_id, reference_number, amount in rows.iterator(chunk_size=2000):
+            self._amounts[pk] = amount
+            for value in (transaction_id, reference_number):
+                reference = normalize_reference(value)
+                if len(reference) >= MIN_REFERENCE_LENGTH:
+                    self._by_reference[reference].add(pk)
+
+    def __len__(self):
+        return len(self._amounts)
+
+    def match(self, references, amount=None):
+        """(outcome, payment_id) for a statement row; payment_id is set only for MATCHED
+
+        ``amount`` is the row's amount text, or None if the statement has no
+        amount column. It is only parsed for rows that match a payment.
+        """
+        candidates = set()
+        for value in references:
+            # IDs too short to index simply find nothing
+            candidates.update(self._by_reference.get(normalize_reference(value), ()))
+        if not candidates:
+            return UNMATCHED, None
+        if amount is not None:
+            amount = parse_amount(amount)
+            candidates = {pk for pk in candidates if self._amounts[pk] == amount}
+            if not candidates:
+                return AMOUNT_MISMATCH, None
+        if len(candidates) > 1:
+            return AMBIGUOUS, None
+        payment_id = candidates.pop()
+        if payment_id in self._claimed:
+            return DUPLICATE, None
+        self._claimed.add(payment_id)
+        return MATCHED, payment_id
+
+
+def _find_column(headers, override, aliases):
+    if override:
+        column = normalize_header(override)
+        if column not in headers:
+            raise StatementError(f'Column "{override}" is not in the statement')
+        return column
+    return next((alias for alias in aliases if alias in headers), None)
+
+
+def reconcile_statement(lines, approver, report=None, dry_run=False, columns=None, index=None):
+    """Approve the pending payments a CSV statement shows were paid
+
+    ``lines`` is any iterable of CSV text lines, e.g. an open file. Rows
+    that do not match exactly one pending payment are passed to
+    ``report(line_number, outcome, row)``. ``columns`` may name the
+    'transaction', 'reference' and 'amount' columns when the headers are not
+    recognised. With ``dry_run`` nothing is approved.
+    """
+    columns = columns or {}
+    reader = csv.reader(lines)
+    headers = [normalize_header(name) for name in next(reader, [])]
+    transaction_column = _find_column(headers, columns.get('transaction'), TRANSACTION_COLUMNS)
+    reference_column = _find_column(headers, columns.get('reference'), REFERENCE_COLUMNS)
+    amount_column = _find_column(headers, columns.get('amount'), AMOUNT_COLUMNS)
+    if not transaction_column and not reference_column:
+        raise StatementError('The statement has no transaction ID or reference column')
+    id_positions = [headers.index(column) for column in (transaction_column, reference_column) if column]
+    amount_position = headers.index(amount_column) if amount_column else None
+
+    index = index if index is not None else PendingPaymentIndex()
+    summary = ReconciliationSummary()
+    matched = []
+
+    def approve_matched():
+        if matched and not dry_run:
+            results = approve_payments(matched, approver, notes=RECONCILED_NOTE)
+            summary.approved += sum(result.approved for result in results)
+        matched.clear()
+
+    for row in reader:
+        if not any(row):
+            continue
+        references = [row[position] for position in id_positions if position < len(row)]
+        amount = None
+        if amount_position is not None:
+            amount = row[amount_position] if amount_position < len(row) else ''
+        outcome, payment_id = index.match(references, amount)
+        summary.outcomes[outcome] += 1
+        if outcome == MATCHED:
+            matched.append(payment_id)
+            if len(matched) >= BATCH_SIZE:
+                approve_matched()
+        elif report is not None:
+            report(reader.line_num, outcome, row)
+    approve_matched()
+    return summary
@@ -0,0 +1,137 @@
+"""Off-request processing of payment screenshots.
+
+Students upload phone screenshots of several megabytes. Once the upload is
+committed, a small in-process thread pool re-encodes each one: orientation is
+applied and metadata (EXIF, GPS) dropped, the image is recompressed to WebP
+(JPEG where Pillow lacks WebP) and a fixed-size thumbnail is written next to
+it. List pages then show the thumbnail instead of downloading originals. The
+upload itself is payment evidence and is kept as ``original_screenshot``.
+Set ``SCREENSHOT_WORKERS = 0`` to process inline instead of in the pool.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# Longest side kept for the recompressed screenshot; receipts stay legible
+MAX_DIMENSION = 2400
+THUMBNAIL_SIZE = (160, 160)
+QUALITY = 80
+THUMBNAIL_QUALITY = 70
+THUMBNAIL_SUFFIX = '_thumb'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _format():
+    return ('WEBP', '.webp') if features.check('webp') else ('JPEG', '.jpg')
+
+
+def _encode(image, quality):
+    image_format, _ = _format()
+    buffer = io.BytesIO()
+    # Saving without exif= leaves every metadata block behind
+    image.save(buffer, image_format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def render_screenshot(data):
+    """(recompressed screenshot bytes, thumbnail bytes) of an uploaded image"""
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION))
+    thumbnail = ImageOps.pad(image.copy(), THUMBNAIL_SIZE, color='white')
+    return _encode(image, QUALITY), _encode(thumbnail, THUMBNAIL_QUALITY)
+
+
+def process_screenshot(payment_id):
+    """Recompress one payment's screenshot and give it a thumbnail
+
+    Returns True if the payment was updated. A screenshot replaced while it
+    was being processed is left for its own run. One that cannot be read is
+    kept as uploaded and marked ``screenshot_processing_failed``; the original
+    file is never deleted.
+    """
+    from .models import Payment
+
+    payment = Payment.objects.filter(pk=payment_id).only('payment_screenshot', 'screenshot_thumbnail').first()
+    if payment is None or not payment.payment_screenshot or payment.screenshot_thumbnail:
+        return False
+
+    field = payment.payment_screenshot
+    storage = field.storage
+    original_name = field.name
+    try:
+        with storage.open(original_name, 'rb') as upload:
+            screenshot, thumbnail = render_screenshot(upload.read())
+    except Exception as e:
+        # Corrupt uploads raise far more than OSError from Pillow's decoders
+        logger.warning('Could not process screenshot %s of payment %s: %s', original_name, payment_id, e)
+        Payment.objects.filter(pk=payment_id, payment_screenshot=original_name).update(
+            screenshot_processing_failed=True
+        )
+        return False
+
+    _, extension = _format()
+    stem = os.path.splitext(original_name)[0]
+    screenshot_name = storage.save(stem + extension, ContentFile(screenshot))
+    thumbnail_name = storage.save(stem + THUMBNAIL_SUFFIX + extension, ContentFile(thumbnail))
+
+    updated = Payment.objects.filter(pk=payment_id, payment_screenshot=original_name).update(
+        payment_screenshot=screenshot_name,
+        screenshot_thumbnail=thumbnail_name,
+        original_screenshot=original_name,
+        screenshot_processing_failed=False,
+    )
+    if not updated:
+        storage.delete(screenshot_name)
+        storage.delete(thumbnail_name)
+        return False
+    return True
+
+
+def _run(payment_id):
+    close_old_connections()
+    try:
+        return process_screenshot(payment_id)
+    except Exception:
+        logger.exception('Failed to process screenshot of payment %s', payment_id)
+        return False
+    finally:
+        close_old_connections()
+
+
+def process_screenshots(payment_ids, workers):
+    """Process many payments' screenshots on ``workers`` threads; returns how many were updated"""
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='screenshots') as pool:
+        return sum(pool.map(_run, payment_ids))
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SCREENSHOT_WORKERS, thread_name_prefix='screenshots'
+            )
+        return _executor
+
+
+def schedule_processing(payment_id):
+    """Process the payment's screenshot once the current transaction commits"""
+    def submit():
+        if getattr(settings, 'SCREENSHOT_WORKERS', 0) <= 0:
+            process_screenshot(payment_id)
+        else:
+            _get_executor().submit(_run, payment_id)
+
+    transaction.on_commit(submit)
@@ -1,3 +1,520 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from courses.models import Category, Course, CourseProgress, Enrollment, Lesson
+from .approvals import APPROVED, ENROLLMENT_CREATED, ENROLLMENT_EXISTING, ENROLLMENT_REACTIVATED, NOT_FOUND, NOT_PENDING, approve_payments
+from .auto_approval import AUTO_APPROVAL_NOTE, auto_approve
+from .models import Payment, PaymentMethod, PaymentSettings, PaymentStatusCount
+from .reconciliation import AMBIGUOUS, AMOUNT_MISMATCH, DUPLICATE, MATCHED, UNMATCHED, parse_amount, reconcile_statement
+from .screenshots import MAX_DIMENSION, THUMBNAIL_SIZE
+
+# Smallest valid image, for upload tests
+GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+
+class PaymentApprovalTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.method = PaymentMethod.objects.create(name='easypaisa', account_title='Platform')
+        category = Category.objects.create(name='Programming')
+        self.courses = [
+            Course.objects.create(
+                title=f'Paid Course {i}',
+                description='Description',
+                category=category,
+                instructor=self.admin,
+                price=Decimal('1000.00'),
+                duration='1 hour',
+                is_published=True
+            )
+            for i in range(2)
+        ]
+        self.lessons = [
+            Lesson.objects.create(course=self.courses[0], title=f'Lesson {i}', duration=10, order=i) for i in range(3)
+        ]
+        self.students = [User.objects.create_user(username=f'student{i}', password='testpass123') for i in range(4)]
+
+    def _payment(self, student, course, **kwargs):
+        return Payment.objects.create(
+            student=student, course=course, payment_method=self.method, amount=Decimal('1000.00'), **kwargs
+        )
+
+    def test_batch_approval_enrolls_and_counts_once_per_course(self):
+        """Test that a batch approves, enrolls and bumps each course counter in one pass"""
+        payments = [self._payment(student, self.courses[0]) for student in self.students[:3]]
+        payments.append(self._payment(self.students[3], self.courses[1]))
+        CourseProgress.objects.create(student=self.students[0], lesson=self.lessons[0])
+
+        # Includes the two status counter updates
+        with self.assertNumQueries(12):
+            results = approve_payments([payment.pk for payment in payments], self.admin)
+
+        self.assertEqual([result.outcome for result in results], [APPROVED] * 4)
+        self.assertEqual({result.enrollment for result in results}, {ENROLLMENT_CREATED})
+        self.assertFalse(Payment.objects.exclude(status='approved').exists())
+        self.assertFalse(Payment.objects.exclude(verified_by=self.admin).exists())
+        first, second = (Course.objects.get(pk=course.pk) for course in self.courses)
+        self.assertEqual((first.students_enrolled, second.students_enrolled), (3, 1))
+        enrollment = Enrollment.objects.get(student=self.students[0], course=self.courses[0])
+        self.assertEqual((enrollment.total_lessons, enrollment.completed_lessons), (3, 1))
+
+    def test_report_covers_every_payment(self):
+        """Test that stale, missing and already-enrolled payments are reported, not recounted"""
+        rejected = self._payment(self.students[0], self.courses[0], status='rejected')
+        Enrollment.objects.create(student=self.students[1], course=self.courses[0])
+        Enrollment.objects.create(student=self.students[2], course=self.courses[0], is_active=False)
+        enrolled = self._payment(self.students[1], self.courses[0])
+        lapsed = self._payment(self.students[2], self.courses[0])
+
+        results = approve_payments([rejected.pk, enrolled.pk, lapsed.pk, 999999], self.admin)
+
+        self.assertEqual(
+            [(result.payment_id, result.outcome, result.enrollment) for result in results],
+            [(rejected.pk, NOT_PENDING, ''), (enrolled.pk, APPROVED, ENROLLMENT_EXISTING),
+             (lapsed.pk, APPROVED, ENROLLMENT_REACTIVATED), (999999, NOT_FOUND, '')]
+        )
+        self.assertTrue(Enrollment.objects.get(student=self.students[2], course=self.courses[0]).is_active)
+        self.assertEqual(Course.objects.get(pk=self.courses[0].pk).students_enrolled, 0)
+        # Approving again changes nothing
+        self.assertEqual(approve_payments([enrolled.pk], self.admin)[0].outcome, NOT_PENDING)
+
+    def test_payments_approved_by_someone_else_meanwhile_are_not_reported(self):
+        """Test that only payments this call moved to approved are reported and enrolled"""
+        first, second = (self._payment(student, self.courses[0]) for student in self.students[:2])
+        other_admin = User.objects.create_user(username='other-admin', password='testpass123', is_staff=True)
+        update = QuerySet.update
+        raced = []
+
+        def other_admin_first(queryset, **kwargs):
+            # Runs between reading the pending payments and approving them
+            if queryset.model is Payment and not raced:
+                raced.append(True)
+                approve_payments([first.pk], other_admin)
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=other_admin_first):
+            results = approve_payments([first.pk, second.pk], self.admin)
+
+        self.assertEqual([result.outcome for result in results], [NOT_PENDING, APPROVED])
+        self.assertEqual(Payment.objects.get(pk=first.pk).verified_by, other_admin)
+        self.assertEqual(Course.objects.get(pk=self.courses[0].pk).students_enrolled, 2)
+        self.assertEqual(PaymentStatusCount.objects.get(status='approved').count, 2)
+
+    def test_admin_queue_approves_selected_payments(self):
+        """Test that the payment queue approves every ticked payment"""
+        payments = [self._payment(student, self.courses[1]) for student in self.students]
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('payment_system:approve_payments'), {
+            'payment_ids': [payment.pk for payment in payments[:3]],
+        })
+        self.assertRedirects(response, reverse('payment_system:admin_payments'))
+        self.assertEqual(Payment.objects.filter(status='approved').count(), 3)
+        self.assertEqual(Course.objects.get(pk=self.courses[1].pk).students_enrolled, 3)
+
+        payments[3].approve_payment(self.admin)
+        self.assertEqual(payments[3].status, 'approved')
+        self.assertEqual(Course.objects.get(pk=self.courses[1].pk).students_enrolled, 4)
+
+
+class AutoApprovalTestCase(TestCase):
+    def setUp(self):
+        self.settings = PaymentSettings.get_settings()
+        self.settings.auto_approve_payments = True
+        self.settings.auto_approve_amount_limit = Decimal('1500.00')
+        self.settings.save()
+        self.method = PaymentMethod.objects.create(
+            name='easypaisa', account_title='Platform', transaction_id_pattern=r'\d{11}'
+        )
+        instructor = User.objects.create_user(username='instructor', password='testpass123')
+        self.course = Course.objects.create(
+            title='Cheap Course',
+            description='Description',
+            category=Category.objects.create(name='Programming'),
+            instructor=instructor,
+            price=Decimal('1000.00'),
+            duration='1 hour',
+            is_published=True
+        )
+        self.students = [User.objects.create_user(username=f'student{i}', password='testpass123') for i in range(6)]
+
+    def _payment(self, student, transaction_id='12345678901', amount='1000.00',
+                 screenshot='payment_screenshots/receipt.png'):
+        return Payment.objects.create(
+            student=student, course=self.course, payment_method=self.method, amount=Decimal(amount),
+            transaction_id=transaction_id, payment_screenshot=screenshot,
+        )
+
+    def test_rules_hold_payments_with_reasons(self):
+        """Test that only payments passing every rule are approved and the rest say why"""
+        eligible = self._payment(self.students[0], transaction_id='123-4567-8901')
+        expensive = self._payment(self.students[1], transaction_id='22222222222', amount='2000.00')
+        malformed = self._payment(self.students[2], transaction_id='TX-1')
+        no_screenshot = self._payment(self.students[3], transaction_id='33333333333', screenshot=None)
+        first_copy = self._payment(self.students[4], transaction_id='44444444444')
+        second_copy = self._payment(self.students[5], transaction_id='4444 4444 444')
+
+        results, held = auto_approve(Payment.objects.all())
+
+        self.assertEqual([result.payment_id for result in results if result.approved], [eligible.pk])
+        eligible.refresh_from_db()
+        self.assertEqual((eligible.status, eligible.admin_notes), ('approved', AUTO_APPROVAL_NOTE))
+        self.assertTrue(Enrollment.objects.filter(student=self.students[0], course=self.course).exists())
+        self.assertEqual(set(held), {expensive.pk, malformed.pk, no_screenshot.pk, first_copy.pk, second_copy.pk})
+        self.assertIn('Transaction ID does not match the EasyPaisa format', held[malformed.pk])
+        self.assertEqual(held[no_screenshot.pk], ['No payment screenshot'])
+        self.assertEqual(held[second_copy.pk], ['Transaction ID is used by another payment'])
+
+    def test_switched_off_approves_nothing(self):
+        """Test that the sweep leaves the queue alone while auto-approval is off"""
+        self.settings.auto_approve_payments = False
+        self.settings.save()
+        payment = self._payment(self.students[0])
+        call_command('auto_approve_payments', stdout=StringIO())
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'pending')
+
+    def test_submission_is_approved_on_the_spot(self):
+        """Test that an eligible payment enrolls the student as soon as it is submitted"""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.client.force_login(self.students[0])
+        with override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post(reverse('payment_system:payment_page', args=[self.course.slug]), {
+                'payment_method': self.method.pk,
+                'transaction_id': '12345678901',
+                'payment_screenshot': SimpleUploadedFile('receipt.gif', GIF, content_type='image/gif'),
+            })
+        self.assertRedirects(response, reverse('courses:course_detail', args=[self.course.slug]),
+                             fetch_redirect_response=False)
+        self.assertEqual(Payment.objects.get().status, 'approved')
+        self.assertTrue(Enrollment.objects.filter(student=self.students[0], course=self.course, is_active=True).exists())
+
+
+class ReconciliationTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.method = PaymentMethod.objects.create(name='jazzcash', account_title='Platform')
+        self.course = Course.objects.create(
+            title='Reconciled Course',
+            description='Description',
+            category=Category.objects.create(name='Programming'),
+            instructor=self.admin,
+            price=Decimal('1500.00'),
+            duration='1 hour',
+            is_published=True
+        )
+        self.students = [User.objects.create_user(username=f'student{i}', password='testpass123') for i in range(5)]
+        self.paid = self._payment(self.students[0], transaction_id='JC-1001-2001')
+        self.by_reference = self._payment(self.students[1], reference_number='REF778899')
+        self.underpaid = self._payment(self.students[2], transaction_id='JC10012002')
+        self.twins = [self._payment(student, transaction_id='JC10012003') for student in self.students[3:]]
+        self.statement = [
+            'Date,Transaction ID,Reference,Amount (PKR)\n',
+            '2025-01-01,jc 1001 2001,,"1,500.00"\n',
+            '2025-01-01,,ref-778899,1500\n',
+            '2025-01-01,JC10012002,,500.00\n',
+            '2025-01-01,JC10012003,,1500.00\n',
+            '2025-01-01,JC10012001,,1500.00\n',
+            '2025-01-01,JC99999999,,1500.00\n',
+        ]
+
+    def _payment(self, student, **kwargs):
+        return Payment.objects.create(
+            student=student, course=self.course, payment_method=self.method, amount=Decimal('1500.00'), **kwargs
+        )
+
+    def test_statement_approves_matches_and_reports_the_rest(self):
+        """Test that matched rows are approved and every other row is reported with its outcome"""
+        reported = []
+        summary = reconcile_statement(self.statement, self.admin,
+                                      report=lambda line, outcome, row: reported.append((line, outcome)))
+
+        self.assertEqual(summary.approved, 2)
+        self.assertEqual(summary.outcomes, {MATCHED: 2, AMOUNT_MISMATCH: 1, AMBIGUOUS: 1, DUPLICATE: 1, UNMATCHED: 1})
+        self.assertEqual(reported, [(4, AMOUNT_MISMATCH), (5, AMBIGUOUS), (6, DUPLICATE), (7, UNMATCHED)])
+        self.assertEqual(
+            set(Payment.objects.filter(status='approved').values_list('pk', flat=True)),
+            {self.paid.pk, self.by_reference.pk}
+        )
+        self.assertTrue(Enrollment.objects.filter(student=self.students[0], course=self.course).exists())
+
+    def test_amounts_with_currency_prefixes(self):
+        """Test that amounts written with a currency token parse to the amount paid"""
+        self.assertEqual(parse_amount('Rs. 1,500'), Decimal('1500'))
+        self.assertEqual(parse_amount('PKR 1,500.00'), Decimal('1500.00'))
+        self.assertEqual(parse_amount('PKR-1,500'), Decimal('1500'))
+        self.assertEqual(parse_amount('-1,500'), Decimal('-1500'))
+        self.assertIsNone(parse_amount('n/a'))
+
+        statement = ['Transaction ID,Amount\n', 'JC-1001-2001,"Rs. 1,500"\n', 'JC10012002,"PKR 1,500.00"\n']
+        summary = reconcile_statement(statement, self.admin, dry_run=True)
+        self.assertEqual(summary.outcomes, {MATCHED: 2})
+
+    def test_dry_run_approves_nothing(self):
+        """Test that a dry run only counts the matches"""
+        summary = reconcile_statement(self.statement, self.admin, dry_run=True)
+        self.assertEqual((summary.outcomes[MATCHED], summary.approved), (2, 0))
+        self.assertFalse(Payment.objects.exclude(status='pending').exists())
+
+    def test_staff_upload(self):
+        """Test that staff can reconcile an uploaded statement from the payment pages"""
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('payment_system:reconcile_statement'), {
+            'statement': SimpleUploadedFile('statement.csv', ''.join(self.statement).encode('utf-8-sig')),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['summary'].approved, 2)
+        self.assertEqual(len(response.context['problems']), 4)
+        self.paid.refresh_from_db()
+        self.assertEqual((self.paid.status, self.paid.verified_by), ('approved', self.admin))
+
+
+class PaymentQueueTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.method = PaymentMethod.objects.create(name='easypaisa', account_title='Platform')
+        self.course = Course.objects.create(
+            title='Queued Course',
+            description='Description',
+            category=Category.objects.create(name='Programming'),
+            instructor=self.admin,
+            price=Decimal('1000.00'),
+            duration='1 hour',
+            is_published=True
+        )
+        self.students = [User.objects.create_user(username=f'student{i}', password='testpass123') for i in range(25)]
+        self.payments = [
+            Payment.objects.create(student=student, course=self.course, payment_method=self.method,
+                                   amount=Decimal('1000.00'), transaction_id=f'ep-{i:04d}-77')
+            for i, student in enumerate(self.students)
+        ]
+        self.client.force_login(self.admin)
+
+    def _counts(self):
+        counts = PaymentStatusCount.get_counts()
+        PaymentStatusCount.recount()
+        self.assertEqual(counts, PaymentStatusCount.get_counts())
+        return counts
+
+    def test_status_counters_follow_transitions(self):
+        """Test that the counters match a recount after every kind of status change"""
+        from django.contrib.admin.sites import site
+        from django.contrib.messages.storage.cookie import CookieStorage
+        from django.test import RequestFactory
+        from .admin import PaymentAdmin
+
+        self.assertEqual(self._counts()['pending'], 25)
+        approve_payments([payment.pk for payment in self.payments[:5]], self.admin)
+        Payment.objects.get(pk=self.payments[5].pk).reject_payment(self.admin, 'Blurry screenshot')
+        request = RequestFactory().post('/')
+        request.user = self.admin
+        request._messages = CookieStorage(request)
+        PaymentAdmin(Payment, site).reject_payments(request, Payment.objects.filter(pk__in=[self.payments[6].pk]))
+        Payment.objects.filter(pk=self.payments[7].pk).delete()
+
+        self.assertEqual(self._counts(), {'pending': 17, 'approved': 5, 'rejected': 2, 'cancelled': 0, 'all': 24})
+
+    def test_queue_pages_by_cursor(self):
+        """Test that following the cursors visits every payment once, newest first"""
+        url = reverse('payment_system:admin_payments')
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(url, {'status': 'pending', **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.context['queue_count'], 25)
+            page = response.context['page_obj']
+            seen.extend(payment.pk for payment in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, [payment.pk for payment in reversed(self.payments)])
+
+    def test_search_matches_id_prefix(self):
+        """Test that searching finds payments by normalized transaction ID prefix or username"""
+        url = reverse('payment_system:admin_payments')
+        response = self.client.get(url, {'q': 'EP 0001'})
+        self.assertEqual([payment.pk for payment in response.context['page_obj']], [self.payments[1].pk])
+        response = self.client.get(url, {'q': 'student3'})
+        self.assertEqual([payment.pk for payment in response.context['page_obj']], [self.payments[3].pk])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'q': 'ep-00'})
+        self.assertFalse([q['sql'] for q in queries if 'COUNT(' in q['sql']])
+
+    def test_search_matches_student_name_and_course_title(self):
+        """Test that searching finds payments by any part of the student name or course title"""
+        User.objects.filter(pk=self.students[4].pk).update(first_name='Ayesha', last_name='Siddiqui')
+        other_course = Course.objects.create(
+            title='Python Basics', description='Description', category=self.course.category,
+            instructor=self.admin, price=Decimal('500.00'), duration='1 hour', is_published=True
+        )
+        other = Payment.objects.create(student=self.students[0], course=other_course, payment_method=self.method,
+                                       amount=Decimal('500.00'), transaction_id='jc-9999')
+        url = reverse('payment_system:admin_payments')
+
+        def found(query):
+            response = self.client.get(url, {'q': query})
+            return [payment.pk for payment in response.context['page_obj']]
+
+        self.assertEqual(found('ayesha'), [self.payments[4].pk])
+        self.assertEqual(found('SIDD'), [self.payments[4].pk])
+        self.assertEqual(found('Ayesha Sidd'), [self.payments[4].pk])
+        self.assertEqual(found('python'), [other.pk])
+        self.assertEqual(found('basics'), [other.pk])
+        self.assertEqual(found('iddiq'), [self.payments[4].pk])
+        self.assertEqual(found('student1'), [payment.pk for payment in reversed(self.payments[10:20])] + [self.payments[1].pk])
+
+
+def phone_screenshot(size=(1200, 3000)):
+    """A JPEG as phones upload it: large, rotated by EXIF and carrying GPS metadata"""
+    from PIL import Image
+    image = Image.new('RGB', size, 'teal')
+    exif = image.getexif()
+    exif[0x0112] = 6  # Orientation: rotate 90 degrees
+    exif[0x8825] = {1: 'N', 2: (31.0, 30.0, 0.0)}  # GPSInfo
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', exif=exif, quality=95)
+    return buffer.getvalue()
+
+
+@override_settings(SCREENSHOT_WORKERS=0)
+class ScreenshotPipelineTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.admin = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.student = User.objects.create_user(username='student', password='testpass123')
+        self.method = PaymentMethod.objects.create(name='easypaisa', account_title='Platform')
+        self.course = Course.objects.create(
+            title='Screenshot Course',
+            description='Description',
+            category=Category.objects.create(name='Programming'),
+            instructor=self.admin,
+            price=Decimal('1000.00'),
+            duration='1 hour',
+            is_published=True
+        )
+
+    def _upload(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.objects.create(
+                student=self.student, course=self.course, payment_method=self.method, amount=Decimal('1000.00'),
+                payment_screenshot=SimpleUploadedFile('receipt.jpg', data, content_type='image/jpeg'),
+            )
+
+    def test_upload_is_recompressed_with_thumbnail(self):
+        """Test that a committed upload is re-encoded upright without metadata and gets a thumbnail"""
+        from PIL import Image
+        payment = self._upload(phone_screenshot())
+        original = Payment.objects.get(pk=payment.pk)
+        storage = original.payment_screenshot.storage
+
+        self.assertTrue(original.payment_screenshot.name.endswith('.webp'))
+        # The upload is kept as evidence
+        self.assertEqual(original.original_screenshot.name, 'payment_screenshots/receipt.jpg')
+        self.assertTrue(storage.exists('payment_screenshots/receipt.jpg'))
+        with Image.open(original.payment_screenshot.path) as image:
+            self.assertEqual(image.size, (MAX_DIMENSION, 960))
+            self.assertFalse(image.getexif())
+        self.assertEqual(original.screenshot_thumbnail.name, 'payment_screenshots/receipt_thumb.webp')
+        with Image.open(original.screenshot_thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size, THUMBNAIL_SIZE)
+
+        # Saving the payment again leaves the processed screenshot alone
+        original.student_notes = 'Paid from my brother\'s account'
+        with self.captureOnCommitCallbacks() as callbacks:
+            original.save()
+        self.assertEqual(callbacks, [])
+
+    def test_unreadable_upload_is_marked_failed(self):
+        """Test that a corrupt image keeps its upload, is marked failed and is linked instead of previewed"""
+        truncated = phone_screenshot()[:2000]
+        for data in (b'not an image', truncated):
+            with self.assertLogs('payment_system.screenshots', 'WARNING'):
+                payment = self._upload(data)
+            payment = Payment.objects.get(pk=payment.pk)
+            self.assertTrue(payment.payment_screenshot.name.startswith('payment_screenshots/receipt'))
+            self.assertFalse(payment.screenshot_thumbnail)
+            self.assertTrue(payment.screenshot_processing_failed)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('payment_system:admin_payments'))
+        self.assertContains(response, 'View (no preview)', count=2)
+        self.assertNotContains(response, 'Processing')
+
+        # A new upload clears the failure
+        payment.payment_screenshot = SimpleUploadedFile('receipt.jpg', phone_screenshot(), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.save()
+        payment = Payment.objects.get(pk=payment.pk)
+        self.assertFalse(payment.screenshot_processing_failed)
+        self.assertTrue(payment.screenshot_thumbnail)
+
+    def test_any_decoder_error_marks_the_upload_failed(self):
+        """Test that errors Pillow raises besides OSError still mark the payment failed"""
+        for error in (SyntaxError('broken PNG file'), ValueError('bad transpose')):
+            with mock.patch('payment_system.screenshots.render_screenshot', side_effect=error):
+                with self.assertLogs('payment_system.screenshots', 'WARNING'):
+                    payment = self._upload(phone_screenshot((60, 80)))
+            payment = Payment.objects.get(pk=payment.pk)
+            self.assertTrue(payment.screenshot_processing_failed)
+            self.assertTrue(payment.payment_screenshot.storage.exists(payment.payment_screenshot.name))
+
+    def test_payment_list_serves_thumbnails_only(self):
+        """Test that the payment queue shows the thumbnail and only links to the full screenshot"""
+        payment = Payment.objects.get(pk=self._upload(phone_screenshot()).pk)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('payment_system:admin_payments'))
+        self.assertContains(response, f'src="{payment.screenshot_thumbnail.url}"')
+        self.assertNotContains(response, f'src="{payment.payment_screenshot.url}"')
+
+
+class ScreenshotBackfillTestCase(TransactionTestCase):
+    def test_backfill_processes_existing_screenshots(self):
+        """Test that the backfill command processes every unprocessed screenshot on worker threads"""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        instructor = User.objects.create_user(username='instructor', password='testpass123')
+        method = PaymentMethod.objects.create(name='easypaisa', account_title='Platform')
+        course = Course.objects.create(
+            title='Backfill Course',
+            description='Description',
+            category=Category.objects.create(name='Programming'),
+            instructor=instructor,
+            price=Decimal('1000.00'),
+            duration='1 hour',
+            is_published=True
+        )
+        with override_settings(MEDIA_ROOT=media_root):
+            for i in range(4):
+                name = default_storage.save(f'payment_screenshots/old{i}.jpg', ContentFile(phone_screenshot((600, 800))))
+                student = User.objects.create_user(username=f'student{i}', password='testpass123')
+                # Stored before the pipeline existed, so nothing was scheduled
+                Payment.objects.bulk_create([Payment(
+                    student=student, course=course, payment_method=method,
+                    amount=Decimal('1000.00'), payment_screenshot=name,
+                )])
+            out = StringIO()
+            call_command('process_screenshots', workers=2, stdout=out)
+
+        self.assertIn('Successfully processed 4 screenshots', out.getvalue())
+        self.assertFalse(Payment.objects.filter(screenshot_thumbnail='').exists())
 
-# Create your tests here.
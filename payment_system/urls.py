@@ -12,8 +12,10 @@ urlpatterns = [
     
     # Admin URLs
     path('admin/payments/', views.admin_payments, name='admin_payments'),
+    path('admin/payments/approve/', views.approve_payments, name='approve_payments'),
     path('admin/payment/<int:payment_id>/approve/', views.approve_payment, name='approve_payment'),
     path('admin/payment/<int:payment_id>/reject/', views.reject_payment, name='reject_payment'),
+    path('admin/reconcile/', views.reconcile_statement, name='reconcile_statement'),
     path('admin/methods/', views.payment_methods_admin, name='payment_methods_admin'),
     path('admin/method/<int:method_id>/toggle/', views.toggle_payment_method, name='toggle_payment_method'),
 ]
@@ -2,13 +2,32 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
+from django.contrib.auth.models import User
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from django.core.paginator import Paginator
-from .models import Payment, PaymentMethod, PaymentSettings
+from .models import Payment, PaymentMethod, PaymentSettings, PaymentStatusCount, normalize_reference
+from . import approvals, reconciliation
+from .auto_approval import auto_approve
 from courses.models import Course, Enrollment
+from courses.pagination import CursorPaginator, InvalidCursor
+from courses.pricing import get_pricing_context
 from django.db.models import Q
+import io
+from urllib.parse import urlencode
+
+PAYMENTS_PER_PAGE = 20
+# Unmatched statement rows listed on the reconciliation page
+RECONCILIATION_REPORT_ROWS = 200
+
+def _auto_approve(request, payment, payment_settings=None):
+    """Approve a just-submitted payment on the spot if the auto-approval rules allow it"""
+    results, _ = auto_approve(Payment.objects.filter(pk=payment.pk), payment_settings)
+    if results and results[0].approved:
+        messages.success(request, f'Payment verified! You are now enrolled in {payment.course.title}.')
+        return True
+    return False
 
 @login_required
 def payment_page(request, slug):
@@ -53,7 +72,7 @@ def payment_page(request, slug):
                 student=request.user,
                 course=course,
                 payment_method=payment_method,
-                amount=course.get_current_price(),
+                amount=course.get_current_price(get_pricing_context(request)),
                 transaction_id=transaction_id,
                 reference_number=reference_number,
                 student_notes=student_notes,
@@ -64,6 +83,10 @@ def payment_page(request, slug):
             if payment_screenshot:
                 payment.payment_screenshot = payment_screenshot
                 payment.save()
+            
+            if _auto_approve(request, payment, payment_settings):
+                return redirect('courses:course_detail', slug=course.slug)
+            if payment_screenshot:
                 messages.success(request, 'Payment submitted successfully with screenshot! Admin will verify it soon.')
             else:
                 messages.success(request, 'Payment submitted successfully! Please upload your payment screenshot.')
@@ -94,6 +117,8 @@ def payment_detail(request, payment_id):
         if payment_screenshot:
             payment.payment_screenshot = payment_screenshot
             payment.save()
+            if _auto_approve(request, payment):
+                return redirect('courses:course_detail', slug=payment.course.slug)
             messages.success(request, 'Payment screenshot uploaded successfully! Admin will verify it soon.')
             # Stay on the same page instead of redirecting
             return redirect('payment_system:payment_detail', payment_id=payment.id)
@@ -134,10 +159,15 @@ def my_payments(request):
     }
     return render(request, 'payment_system/my_payments.html', context)
 
+def _prefix_filter(field, prefix):
+    """Rows whose ``field`` starts with ``prefix``, as a range the column's index can seek"""
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper_bound})
+
 @staff_member_required
 def admin_payments(request):
     """Admin view for managing payments"""
-    payments = Payment.objects.all().select_related('student', 'course', 'payment_method').order_by('-created_at')
+    payments = Payment.objects.select_related('student', 'course', 'payment_method')
     
     # Filter by status
     status_filter = request.GET.get('status')
@@ -149,28 +179,53 @@ def admin_payments(request):
     if method_filter:
         payments = payments.filter(payment_method__name=method_filter)
     
-    # Search
-    search_query = request.GET.get('q')
+    # Search by student name or course title anywhere in them, or transaction/reference ID prefix
+    search_query = request.GET.get('q', '').strip()
     if search_query:
-        payments = payments.filter(
-            Q(student__username__icontains=search_query) |
-            Q(student__first_name__icontains=search_query) |
-            Q(student__last_name__icontains=search_query) |
-            Q(course__title__icontains=search_query) |
-            Q(transaction_id__icontains=search_query) |
-            Q(reference_number__icontains=search_query)
+        # Students and courses are matched in subqueries over their own, much
+        # smaller tables, so every branch of the OR seeks an index on Payment
+        first, _, rest = search_query.partition(' ')
+        students = (
+            Q(username__icontains=search_query)
+            | Q(first_name__icontains=search_query)
+            | Q(last_name__icontains=search_query)
+        )
+        if rest:
+            students |= Q(first_name__icontains=first, last_name__icontains=rest.strip())
+        search = (
+            Q(student__in=User.objects.filter(students).values('pk'))
+            | Q(course__in=Course.objects.filter(title__icontains=search_query).values('pk'))
         )
+        key = normalize_reference(search_query)
+        if key:
+            search |= _prefix_filter('transaction_key', key) | _prefix_filter('reference_key', key)
+        payments = payments.filter(search)
     
-    # Pagination
-    paginator = Paginator(payments, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination: no OFFSET or COUNT over the whole table
+    paginator = CursorPaginator(payments, ('-created_at', '-id'), PAYMENTS_PER_PAGE)
+    cursor = request.GET.get('cursor')
+    try:
+        page_obj = paginator.page(cursor)
+    except InvalidCursor:
+        cursor = None
+        page_obj = paginator.page()
     
     # Get payment methods for filter
     payment_methods = PaymentMethod.objects.all()
     
+    # The counters cover whole statuses, not method or search filters
+    status_counts = PaymentStatusCount.get_counts()
+    queue_count = None
+    if not method_filter and not search_query:
+        queue_count = status_counts.get(status_filter or 'all')
+    filters = {'status': status_filter, 'method': method_filter, 'q': search_query}
+    
     context = {
         'page_obj': page_obj,
+        'is_first_page': not cursor,
+        'status_counts': status_counts,
+        'queue_count': queue_count,
+        'filter_query': urlencode({name: value for name, value in filters.items() if value}),
         'payment_methods': payment_methods,
         'current_status': status_filter,
         'current_method': method_filter,
@@ -195,6 +250,25 @@ def approve_payment(request, payment_id):
     
     return redirect('payment_system:admin_payments')
 
+@staff_member_required
+@require_POST
+def approve_payments(request):
+    """Approve every selected payment in one batch"""
+    payment_ids = [pk for pk in request.POST.getlist('payment_ids') if pk.isdigit()]
+    if not payment_ids:
+        messages.error(request, 'Please select at least one payment.')
+        return redirect('payment_system:admin_payments')
+    
+    results = approvals.approve_payments(payment_ids, request.user)
+    approved = sum(result.approved for result in results)
+    
+    if approved:
+        messages.success(request, f'{approved} payment(s) approved.')
+    if approved < len(results):
+        messages.warning(request, f'{len(results) - approved} selected payment(s) were no longer pending.')
+    
+    return redirect('payment_system:admin_payments')
+
 @staff_member_required
 @require_POST
 def reject_payment(request, payment_id):
@@ -213,6 +287,44 @@ def reject_payment(request, payment_id):
     
     return redirect('payment_system:admin_payments')
 
+@staff_member_required
+def reconcile_statement(request):
+    """Approve the pending payments found in an uploaded CSV statement"""
+    context = {}
+    
+    if request.method == 'POST':
+        statement = request.FILES.get('statement')
+        if statement:
+            problems = []
+            
+            def report(line, outcome, row):
+                if len(problems) < RECONCILIATION_REPORT_ROWS:
+                    problems.append({'line': line, 'outcome': outcome, 'row': row})
+            
+            try:
+                summary = reconciliation.reconcile_statement(
+                    io.TextIOWrapper(statement.file, encoding='utf-8-sig', newline=''),
+                    request.user,
+                    report=report,
+                    dry_run=bool(request.POST.get('dry_run')),
+                )
+            except (reconciliation.StatementError, UnicodeDecodeError) as e:
+                messages.error(request, f'Could not read the statement: {e}')
+            else:
+                context.update(
+                    summary=summary,
+                    outcomes=sorted(summary.outcomes.items()),
+                    problems=problems,
+                    report_limit=RECONCILIATION_REPORT_ROWS,
+                    dry_run=bool(request.POST.get('dry_run')),
+                )
+                if not context['dry_run']:
+                    messages.success(request, f'Approved {summary.approved} payments from {summary.rows} statement rows.')
+        else:
+            messages.error(request, 'Please upload a CSV statement.')
+    
+    return render(request, 'payment_system/reconcile_statement.html', context)
+
 @staff_member_required
 def payment_methods_admin(request):
     """Admin view for managing payment methods"""
@@ -114,16 +114,17 @@ document.addEventListener('DOMContentLoaded', function() {
 
 // Lazy loading for courses
 function initCourseLazyLoading() {
-    let currentPage = 1;
+    // The server hands out an opaque cursor for the page after the one rendered
+    const container = document.querySelector('.course-container');
+    let nextCursor = container ? container.dataset.nextCursor : '';
     let isLoading = false;
-    let hasMorePages = true;
+    let hasMorePages = Boolean(nextCursor);
     
     // Load more courses when user scrolls near bottom
     function loadMoreCourses() {
         if (isLoading || !hasMorePages) return;
         
         isLoading = true;
-        currentPage++;
         
         // Show loading indicator
         const loadingHtml = `
@@ -146,9 +147,10 @@ function initCourseLazyLoading() {
         const difficulty = urlParams.get('difficulty') || '';
         const sort = urlParams.get('sort') || '';
         const query = urlParams.get('q') || '';
+        const price = urlParams.get('price') || '';
         
         // Make AJAX request
-        fetch(`/courses/lazy-load/?page=${currentPage}&category=${category}&difficulty=${difficulty}&sort=${sort}&q=${query}`, {
+        fetch(`/courses/lazy-load/?cursor=${encodeURIComponent(nextCursor)}&category=${category}&difficulty=${difficulty}&sort=${sort}&q=${encodeURIComponent(query)}&price=${price}`, {
             headers: {
                 'X-Requested-With': 'XMLHttpRequest'
             }
@@ -166,6 +168,7 @@ function initCourseLazyLoading() {
                 courseContainer.insertAdjacentHTML('beforeend', data.html);
                 
                 // Update pagination state
+                nextCursor = data.next_cursor;
                 hasMorePages = data.has_next;
                 
                 // Initialize animations for new content
@@ -242,19 +245,52 @@ function debounce(func, wait) {
     };
 }
 
-// Apply debouncing to search inputs
+// Typeahead suggestions for search inputs that declare an autocomplete endpoint
 document.addEventListener('DOMContentLoaded', function() {
-    const searchInputs = document.querySelectorAll('input[type="search"], input[name="q"]');
+    const searchInputs = document.querySelectorAll('input[data-autocomplete-url]');
     
     searchInputs.forEach(input => {
+        const list = document.createElement('div');
+        list.className = 'list-group position-absolute shadow-sm autocomplete-results';
+        list.hidden = true;
+        input.insertAdjacentElement('afterend', list);
+        
         const debouncedSearch = debounce(function() {
-            // Trigger search after user stops typing
-            if (this.value.length >= 2) {
-                // You can add AJAX search here if needed
-                console.log('Searching for:', this.value);
+            const query = input.value.trim();
+            if (query.length < 2) {
+                list.hidden = true;
+                return;
             }
-        }, 300);
+            
+            fetch(`${input.dataset.autocompleteUrl}?q=${encodeURIComponent(query)}`)
+                .then(response => response.json())
+                .then(data => {
+                    // Ignore answers to queries the user has typed past
+                    if (data.query !== input.value.trim()) {
+                        return;
+                    }
+                    list.replaceChildren(...data.results.map(result => {
+                        const item = document.createElement('a');
+                        item.className = 'list-group-item list-group-item-action';
+                        item.href = result.url;
+                        item.textContent = result.title;
+                        const meta = document.createElement('small');
+                        meta.className = 'd-block text-muted';
+                        meta.textContent = `${result.category} · ${result.instructor}`;
+                        item.appendChild(meta);
+                        return item;
+                    }));
+                    list.hidden = data.results.length === 0;
+                })
+                .catch(() => {
+                    list.hidden = true;
+                });
+        }, 150);
         
         input.addEventListener('input', debouncedSearch);
+        input.addEventListener('blur', () => {
+            // Let a click on a suggestion land before hiding the list
+            setTimeout(() => { list.hidden = true; }, 150);
+        });
     });
 });